@@ -0,0 +1,52 @@
+"""Compare the memory footprint and speed of the anytree and compact argument trees.
+
+Run from the root of the repository with `python -m benchmark.compactTree`.
+"""
+import os, time, tempfile, tracemalloc, random, argparse
+from tool.parseDebate import rawKialo2Json, rawKialo2CompactTree
+from tool.processTree import argumentTree2argumentPairTree, rootIsOnlyCommonAncestor, distanceBetweenPair
+from tool.syntheticDebate import writeSyntheticDebate
+
+def measure(function, *args):
+    """Run `function` twice: once to time it, once to measure the memory still allocated by its result (tracing slows it down)."""
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = function(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, size
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the anytree and compact argument trees on synthetic debates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--checks", type=int, default=10000, help="number of random node pairs checked for their common ancestors and distance")
+    args = parser.parse_args()
+
+    print(f"{'arguments':>10} {'tree':>8} {'memory (MB)':>12} {'parse (s)':>10} {'pairs (s)':>10} {'checks (s)':>11}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            path = os.path.join(folder, f"debate-{size}.txt")
+            writeSyntheticDebate(path, size, seed=size)
+
+            for name, parse in [("anytree", rawKialo2Json), ("compact", rawKialo2CompactTree)]:
+                tree, parseTime, memory = measure(parse, path)
+
+                start = time.perf_counter()
+                argumentTree2argumentPairTree(tree['1.'], "domain")
+                pairsTime = time.perf_counter() - start
+
+                rng = random.Random(0)
+                names = list(tree)[1:]
+                nodePairs = [rng.sample(names, 2) for _ in range(args.checks)]
+                start = time.perf_counter()
+                for n1, n2 in nodePairs:
+                    if rootIsOnlyCommonAncestor(tree, n1, n2):
+                        distanceBetweenPair(tree, n1, n2)
+                checksTime = time.perf_counter() - start
+
+                print(f"{size:>10} {name:>8} {memory/1e6:>12.2f} {parseTime:>10.3f} {pairsTime:>10.3f} {checksTime:>11.3f}")
+                del tree
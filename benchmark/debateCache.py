@@ -0,0 +1,37 @@
+"""Compare the time to parse synthetic debates without cache, on a cold cache (parse and store) and on a warm cache (load only).
+
+Run from the root of the repository with `python -m benchmark.debateCache`.
+"""
+import os, time, tempfile, argparse
+from tool.parseDebate import rawKialo2CompactTree
+from tool.debateCache import DebateCache
+from tool.syntheticDebate import writeSyntheticDebate
+
+def timeParsing(parse, paths):
+    start = time.perf_counter()
+    trees = [parse(path) for path in paths]
+    return trees, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsed debate cache on synthetic debates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--debates", type=int, default=10, help="number of debates of each size")
+    args = parser.parse_args()
+
+    print(f"{'arguments':>10} {'debates':>8} {'no cache (s)':>13} {'cold (s)':>9} {'warm (s)':>9} {'speedup':>8} {'cache (MB)':>11}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            paths = []
+            for seed in range(args.debates):
+                path = os.path.join(folder, f"debate-{size}-{seed}.txt")
+                writeSyntheticDebate(path, size, seed=seed)
+                paths.append(path)
+
+            cache = DebateCache(os.path.join(folder, f"cache-{size}"))
+            parsed, noCacheTime = timeParsing(rawKialo2CompactTree, paths)
+            _, coldTime = timeParsing(cache.load, paths)
+            loaded, warmTime = timeParsing(cache.load, paths)
+            assert all(t1.names == t2.names and t1.text(len(t1)-1) == t2.text(len(t2)-1) for t1, t2 in zip(parsed, loaded))
+
+            cacheSize = sum(entry["size"] for entry in cache.entries())
+            print(f"{size:>10} {args.debates:>8} {noCacheTime:>13.3f} {coldTime:>9.3f} {warmTime:>9.3f} {noCacheTime/warmTime:>7.1f}x {cacheSize/1e6:>11.2f}")
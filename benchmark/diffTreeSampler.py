@@ -0,0 +1,45 @@
+"""Measure the time and peak memory of sampling neutral pairs between two debates as the debates grow.
+
+Run from the root of the repository with `python -m benchmark.diffTreeSampler`.
+"""
+import os, time, tempfile, tracemalloc, random, argparse
+from tool.parseDebate import rawKialo2CompactTree
+from tool.processTree import getNNeutralPairsFromDiffTrees, getAllNeutralPairsFromDiffTrees
+from tool.syntheticDebate import writeSyntheticDebate
+
+def legacyNNeutralPairsFromDiffTrees(t1, t2, n, rng):
+    """Previous sampler, materializing every pair of nodes before sampling."""
+    return rng.sample(getAllNeutralPairsFromDiffTrees(t1, t2), n)
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(*args)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sampling of neutral pairs between two synthetic debates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--legacy-max-size", type=int, default=2000, help="largest size also run with the previous, product-based sampler")
+    args = parser.parse_args()
+
+    print(f"{'arguments':>10} {'sampler':>8} {'time (s)':>10} {'peak memory (MB)':>17}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            trees = []
+            for seed in range(2):
+                path = os.path.join(folder, f"debate-{size}-{seed}.txt")
+                writeSyntheticDebate(path, size, seed=seed)
+                trees.append(rawKialo2CompactTree(path))
+            t1, t2 = trees
+            n = max(len(t1), len(t2))
+
+            samplers = [("indices", getNNeutralPairsFromDiffTrees)]
+            if size <= args.legacy_max_size:
+                samplers.append(("product", legacyNNeutralPairsFromDiffTrees))
+            for name, sampler in samplers:
+                duration, peak = measure(sampler, t1, t2, n, random.Random(0))
+                print(f"{size:>10} {name:>8} {duration:>10.3f} {peak/1e6:>17.2f}")
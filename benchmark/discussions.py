@@ -0,0 +1,79 @@
+"""Run the discussion listing against a local stand-in for the Kialo API, offline.
+
+The server answers `/api/v1/discussions` with pages of fake discussions after a delay. The script compares sequential and concurrent listings, checks that the stream matches the fake catalog in order, and that a second listing is served from the on-disk cache without any request.
+
+Run from the root of the repository with `python -m benchmark.discussions`.
+"""
+import time, tempfile, threading, argparse, json
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tool.kialoTools import KialoFilter, KialoSort, iterDiscussions, discussions2urlID
+
+class DiscussionsHandler(BaseHTTPRequestHandler):
+    """Serve pages of the server's fake discussions, honoring `limit` and `skip`."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != "/api/v1/discussions":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        skip, limit = int(query["skip"][0]), int(query["limit"][0])
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+        body = json.dumps({"discussions": server.discussions[skip:skip+limit]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def startServer(discussions, latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiscussionsHandler)
+    server.discussions = discussions
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the discussion listing against a local fake API.")
+    parser.add_argument("--discussions", type=int, default=2500, help="number of discussions of the fake API")
+    parser.add_argument("--limit", type=int, default=3000, help="maximum number of discussions requested")
+    parser.add_argument("--page-size", type=int, default=100, help="number of discussions per page")
+    parser.add_argument("--latency", type=float, default=0.2, help="delay of the server before each answer, in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="numbers of pages requested concurrently")
+    args = parser.parse_args()
+
+    discussions = [{"id": i, "title": f"Is discussion {i} a good idea?", "tags": [f"Tag{i % 7}"]} for i in range(args.discussions)]
+    expected = discussions[:args.limit]
+    server = startServer(discussions, args.latency)
+    baseUrl = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{'workers':>8} {'time (s)':>9} {'requests':>9} {'cached (s)':>11} {'cached requests':>16}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as cachePath:
+            listing = lambda: list(iterDiscussions(KialoFilter.TAG, KialoSort.RANK_ACTIVITY, limit=args.limit, pageSize=args.page_size, workers=workers, cachePath=cachePath, baseUrl=baseUrl))
+
+            server.requests = 0
+            start = time.perf_counter()
+            result = listing()
+            duration = time.perf_counter() - start
+            nbRequests = server.requests
+            assert result == expected, "the listing does not match the fake API"
+
+            server.requests = 0
+            start = time.perf_counter()
+            cached = listing()
+            cachedDuration = time.perf_counter() - start
+            assert cached == expected and discussions2urlID(iter(cached)) == discussions2urlID(expected)
+
+            print(f"{workers:>8} {duration:>9.2f} {nbRequests:>9} {cachedDuration:>11.3f} {server.requests:>16}")
+    server.shutdown()
@@ -0,0 +1,91 @@
+"""Run the debate downloader against a local stand-in for the Kialo export server, offline.
+
+The server answers `/export/<urlId>.txt` with a synthetic debate after a delay, and randomly fails some requests (503 or a connection dropped mid-body) to exercise the retries.
+The script checks that every debate is downloaded intact, that no partial file is left behind and that a second run skips everything.
+
+Run from the root of the repository with `python -m benchmark.download`.
+"""
+import os, time, random, tempfile, threading, argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tool.download import downloadDiscussions
+from tool.syntheticDebate import generateSyntheticDebate
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """Serve synthetic debates, with the latency and failure rate set on the server."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        urlId = self.path.rsplit("/", 1)[-1][:-len(".txt")]
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            failure = server.rng.random()
+        body = server.debates.get(urlId)
+        if body is None:
+            self.send_error(404)
+            return
+        if failure < server.failureRate / 2:
+            self.send_error(503)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if failure < server.failureRate:
+            # Drop the connection halfway through the body
+            self.wfile.write(body[:len(body)//2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def startServer(debates, latency, failureRate, seed=0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ExportHandler)
+    server.debates = debates
+    server.latency = latency
+    server.failureRate = failureRate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the debate downloader against a local server.")
+    parser.add_argument("--debates", type=int, default=200, help="number of debates to download")
+    parser.add_argument("--arguments", type=int, default=500, help="number of arguments of each debate")
+    parser.add_argument("--latency", type=float, default=0.2, help="delay of the server before each answer, in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of requests failing with a 503 or a dropped connection")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 16], help="numbers of concurrent downloads to compare")
+    parser.add_argument("--rate", type=float, default=50, help="maximum number of requests per second")
+    args = parser.parse_args()
+
+    debates = {f"debate-{i}": "\n".join(generateSyntheticDebate(args.arguments, seed=i)).encode("utf-8") for i in range(args.debates)}
+    server = startServer(debates, args.latency, args.failure_rate)
+    baseUrl = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{'workers':>8} {'time (s)':>9} {'debates/s':>10} {'requests':>9} {'failed':>7} {'rerun (s)':>10}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as folder:
+            server.requests = 0
+            start = time.perf_counter()
+            report = downloadDiscussions(list(debates), downloadPath=folder, workers=workers, rate=args.rate, cookies={}, baseUrl=baseUrl)
+            duration = time.perf_counter() - start
+            nbRequests = server.requests
+
+            for urlId in report["downloaded"]:
+                with open(os.path.join(folder, urlId + ".txt"), "rb") as f:
+                    assert f.read() == debates[urlId], f"{urlId} was not downloaded intact"
+            assert not [x for x in os.listdir(folder) if x.endswith(".part")], "partial downloads were left behind"
+
+            start = time.perf_counter()
+            rerun = downloadDiscussions(list(debates), downloadPath=folder, workers=workers, cookies={}, baseUrl=baseUrl)
+            rerunDuration = time.perf_counter() - start
+            # Only the debates that failed the first time are requested again
+            assert set(rerun["skipped"]) == set(report["downloaded"]), rerun
+
+            print(f"{workers:>8} {duration:>9.2f} {len(debates)/duration:>10.1f} {nbRequests:>9} {len(report['failed']):>7} {rerunDuration:>10.3f}")
+    server.shutdown()
@@ -0,0 +1,120 @@
+"""Compare the throughput of the CPU encoder backends of `tool/pairEmbedding.py`, and the drift of their embeddings and similarities from the fp32 model.
+
+The variants, each encoding the same arguments:
+- `torch`: the fp32 model in one process, the reference (what `processData.py` runs by default)
+- `quantized`, `onnx`: the other backends of `loadEncoder`, skipped if their dependencies are missing
+- `pool`: the fp32 model in `--workers` processes (see `EncodePool`), whose embeddings should not drift
+- `max<N>`: the fp32 model with arguments truncated to N tokens (`--max-seq-lengths`)
+
+For each variant, the script reports the time to load the model and to encode the arguments, and against the reference:
+- the mean and maximum cosine distance between the embeddings of each argument
+- the mean and maximum absolute difference of the similarity of random pairs of arguments
+- the share of the `--selected` most dissimilar pairs of the reference that are also the most dissimilar pairs of the variant, as the selection of neutral pairs would keep them
+
+The arguments are the unique arguments of a pairs file (e.g. `--pairs processedData/kialoPairsUnscored.csv`), or of synthetic debates by default.
+Needs `sentence_transformers` and the model. Run from the root of the repository with `python -m benchmark.encoders`.
+"""
+import os, time, json, tempfile, argparse
+import numpy as np
+import pandas as pd
+from tool.pairEmbedding import loadEncoder
+from tool.pairSelection import smallestIndices
+from tool.parseDebate import rawKialo2CompactTree
+from tool.syntheticDebate import writeSyntheticDebate
+
+def loadTexts(pairsPath, nbTexts, seed):
+    """Unique arguments of a pairs file, or of synthetic debates if `pairsPath` is None, at most `nbTexts` of them."""
+    if pairsPath is not None:
+        pairs = pd.read_csv(pairsPath, usecols=["argSrc", "argTrg"])
+        texts = list(dict.fromkeys(pd.concat([pairs["argSrc"], pairs["argTrg"]]).astype(str)))
+    else:
+        texts = []
+        with tempfile.TemporaryDirectory() as folder:
+            while len(texts) < nbTexts:
+                path = os.path.join(folder, "debate.txt")
+                writeSyntheticDebate(path, 1000, seed=seed + len(texts), textLength=(5, 80))
+                tree = rawKialo2CompactTree(path)
+                texts.extend(tree.cleanText(idx) for idx in range(1, len(tree)))
+    rng = np.random.default_rng(seed)
+    return [texts[i] for i in rng.permutation(len(texts))[:nbTexts]]
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def drift(reference, embeddings, pairs, nbSelected):
+    """Drift of `embeddings` from `reference` (both normalized), on the arguments and on the similarity of `pairs`."""
+    distances = 1 - np.einsum("ij,ij->i", reference, embeddings)
+    referenceSimilarities = np.einsum("ij,ij->i", reference[pairs[0]], reference[pairs[1]])
+    similarities = np.einsum("ij,ij->i", embeddings[pairs[0]], embeddings[pairs[1]])
+    differences = np.abs(similarities - referenceSimilarities)
+    selected = np.intersect1d(smallestIndices(referenceSimilarities, nbSelected), smallestIndices(similarities, nbSelected))
+    return {
+        "meanDistance"        : float(distances.mean()),
+        "maxDistance"         : float(distances.max()),
+        "meanSimilarityDiff"  : float(differences.mean()),
+        "maxSimilarityDiff"   : float(differences.max()),
+        "selectionAgreement"  : len(selected) / nbSelected if nbSelected else None,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CPU encoder backends against the fp32 model.")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="name of the model")
+    parser.add_argument("--pairs", default=None, help="CSV file of pairs whose unique arguments are encoded, synthetic arguments by default")
+    parser.add_argument("--texts", type=int, default=5000, help="number of arguments encoded")
+    parser.add_argument("--backends", nargs="+", default=["quantized", "onnx"], help="backends compared with the fp32 torch model")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes of the pool variant, 1 to skip it")
+    parser.add_argument("--max-seq-lengths", type=int, nargs="*", default=[128], help="truncations compared with the fp32 model")
+    parser.add_argument("--batch-size", type=int, default=256, help="number of arguments encoded per batch")
+    parser.add_argument("--random-pairs", type=int, default=100_000, help="number of random pairs of arguments the similarity drift is measured on")
+    parser.add_argument("--selected", type=float, default=0.1, help="share of the random pairs selected as the most dissimilar ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    texts = loadTexts(args.pairs, args.texts, args.seed)
+    rng = np.random.default_rng(args.seed)
+    pairs = rng.integers(len(texts), size=(2, args.random_pairs))
+    nbSelected = int(args.random_pairs * args.selected)
+    print(f"{len(texts)} arguments, {np.mean([len(text) for text in texts]):.0f} characters on average")
+
+    variants = [("torch", {})]
+    variants += [(backend, {"backend": backend}) for backend in args.backends]
+    if args.workers > 1:
+        variants.append((f"pool{args.workers}", {"workers": args.workers}))
+    variants += [(f"max{length}", {"maxSeqLength": length}) for length in args.max_seq_lengths]
+
+    results = []
+    reference = None
+    print(f"{'variant':>10} {'load (s)':>9} {'encode (s)':>11} {'texts/s':>9} {'speedup':>8} {'mean dist':>10} {'max dist':>9} {'mean dsim':>10} {'max dsim':>9} {'selection':>10}")
+    for name, options in variants:
+        start = time.perf_counter()
+        try:
+            encoder = loadEncoder(args.model, **options)
+        except Exception as e:
+            # e.g. torch without quantization support, or the ONNX backend without optimum and onnxruntime
+            print(f"{name:>10} skipped: {type(e).__name__}: {e}")
+            continue
+        loadSeconds = time.perf_counter() - start
+        # Warm up, so that lazy initializations are not timed
+        encoder.encode(texts[:args.batch_size], batch_size=args.batch_size, show_progress_bar=False)
+        start = time.perf_counter()
+        embeddings = normalize(encoder.encode(texts, batch_size=args.batch_size, show_progress_bar=False))
+        seconds = time.perf_counter() - start
+        if hasattr(encoder, "close"):
+            encoder.close()
+
+        result = {"variant": name, "options": options, "loadSeconds": loadSeconds, "seconds": seconds, "textsPerSecond": len(texts) / seconds}
+        if reference is None:
+            reference = result
+            referenceEmbeddings = embeddings
+        result["speedup"] = reference["seconds"] / seconds
+        result.update(drift(referenceEmbeddings, embeddings, pairs, nbSelected))
+        results.append(result)
+        print(f"{name:>10} {loadSeconds:>9.2f} {seconds:>11.2f} {result['textsPerSecond']:>9.0f} {result['speedup']:>8.2f} {result['meanDistance']:>10.2e} {result['maxDistance']:>9.2e} "
+              f"{result['meanSimilarityDiff']:>10.2e} {result['maxSimilarityDiff']:>9.2e} {result['selectionAgreement']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": vars(args), "texts": len(texts), "results": results}, f, indent=1)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,94 @@
+"""Measure the clustering of near-duplicate arguments of `tool/nearDuplicates.py` on synthetic arguments with injected near duplicates.
+
+For each number of arguments, the script takes the arguments of synthetic debates, replaces a share of them (`--duplicates`) by lightly edited copies of others
+(case, punctuation, a word dropped or repeated), then times the MinHash signatures and the LSH clustering, and reports:
+- the recall: share of the edited copies clustered with their original
+- the number of clusters and of arguments clustered
+For the smallest sizes (up to `--exact`), the clusters are also compared with an exact pairwise comparison of the shingles (Jaccard similarity at least the threshold), whose time grows with the square of the number of arguments.
+
+Run from the root of the repository with `python -m benchmark.nearDuplicates`.
+"""
+import os, time, tempfile, argparse
+from itertools import combinations
+import numpy as np
+from tool.nearDuplicates import NearDuplicateIndex, normalizeForShingles
+from tool.parseDebate import rawKialo2CompactTree
+from tool.syntheticDebate import writeSyntheticDebate
+
+def syntheticArguments(nbArguments, seed):
+    """Arguments of synthetic debates, at least `nbArguments` of them."""
+    texts = []
+    with tempfile.TemporaryDirectory() as folder:
+        while len(texts) < nbArguments:
+            path = os.path.join(folder, "debate.txt")
+            writeSyntheticDebate(path, 1000, seed=seed + len(texts), textLength=(8, 40))
+            tree = rawKialo2CompactTree(path)
+            texts.extend(tree.cleanText(idx) for idx in range(1, len(tree)) if not tree.isSee[idx])
+    return texts[:nbArguments]
+
+def edit(text, rng):
+    """Light edit of a text: case, punctuation, or one word dropped or repeated."""
+    words = text.split()
+    kind = rng.integers(4)
+    if kind == 0:
+        return text.upper()
+    if kind == 1:
+        return text.rstrip(".!?") + "!"
+    position = int(rng.integers(len(words))) if words else 0
+    if kind == 2 and len(words) > 8:
+        return " ".join(words[:position] + words[position + 1:])
+    return " ".join(words[:position + 1] + words[position:])
+
+def shingleSet(text, size):
+    text = normalizeForShingles(text).encode("utf-8").ljust(size)
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def exactClusters(texts, threshold, size):
+    """Pairs of arguments whose shingles have a Jaccard similarity of at least `threshold`, compared pairwise."""
+    shingles = [shingleSet(text, size) for text in texts]
+    return {(i, j) for i, j in combinations(range(len(texts)), 2) if len(shingles[i] & shingles[j]) >= threshold * len(shingles[i] | shingles[j])}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the MinHash/LSH clustering of near-duplicate arguments.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 20_000, 200_000], help="numbers of arguments")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of the arguments replaced by an edited copy of another one")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument("--exact", type=int, default=2000, help="largest size also clustered by an exact pairwise comparison")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = syntheticArguments(max(args.sizes), args.seed)
+    print(f"{'arguments':>10} {'signatures (s)':>15} {'clusters (s)':>13} {'clusters':>9} {'clustered':>10} {'recall':>7} {'exact (s)':>10} {'exact pairs':>12} {'found':>6}")
+    for size in args.sizes:
+        texts = list(corpus[:size])
+        copies = rng.choice(size, size=int(size * args.duplicates), replace=False)
+        originals = rng.integers(size, size=len(copies))
+        for copy, original in zip(copies, originals):
+            texts[copy] = edit(texts[original], rng)
+
+        index = NearDuplicateIndex(args.threshold, args.num_perm, args.shingle_size, args.seed)
+        start = time.perf_counter()
+        index.add("corpus", [str(i) for i in range(size)], texts)
+        signatureSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        duplicates = index.clusters()
+        clusterSeconds = time.perf_counter() - start
+
+        cluster = {}
+        for i, members in enumerate(duplicates.clusters):
+            for _, node, _ in members:
+                cluster[int(node)] = i
+        injected = [(copy, original) for copy, original in zip(copies, originals) if copy != original and original not in copies]
+        recall = np.mean([copy in cluster and cluster.get(original) == cluster[copy] for copy, original in injected]) if injected else float("nan")
+
+        exact = ""
+        if size <= args.exact:
+            start = time.perf_counter()
+            pairs = exactClusters(texts, args.threshold, args.shingle_size)
+            exactSeconds = time.perf_counter() - start
+            found = np.mean([i in cluster and cluster.get(j) == cluster[i] for i, j in pairs]) if pairs else float("nan")
+            exact = f"{exactSeconds:>10.2f} {len(pairs):>12} {found:>6.3f}"
+        print(f"{size:>10} {signatureSeconds:>15.2f} {clusterSeconds:>13.2f} {len(duplicates):>9} {len(cluster):>10} {recall:>7.3f} {exact}")
@@ -0,0 +1,69 @@
+"""Compare the random sampling of neutral pairs from a debate, scored afterwards, with the similarity-driven mining of `tool/processTree.py`, on synthetic debates.
+
+Both strategies are given the same embeddings, from a stub encoder drawing a random vector per argument, so that no model is needed. For each debate size, the script reports the time, the peak memory and the mean similarity of the pairs kept:
+- `sample`: `len(tree)` pairs drawn at random, scored, of which the `k` most dissimilar are kept, as `processData.py` does by default
+- `mine`: the `k` most dissimilar valid pairs, computed block by block
+
+Run from the root of the repository with `python -m benchmark.neutralMining`.
+"""
+import os, time, random, tempfile, tracemalloc, argparse, zlib
+import numpy as np
+from tool.parseDebate import rawKialo2CompactTree
+from tool.processTree import getNNeutralPairsFromSameTrees, embedTreeArguments, mineNeutralPairsFromSameTree
+from tool.pairSelection import smallestIndices
+from tool.syntheticDebate import writeSyntheticDebate
+
+def stubEncoder(dimension, seed):
+    """Encoder returning the same random vector for a text every time."""
+    def embed(texts):
+        return np.stack([np.random.default_rng([seed, zlib.crc32(text.encode("utf-8"))]).standard_normal(dimension, dtype=np.float32) for text in texts])
+    return embed
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak, result
+
+def samplePairs(tree, embedded, k, threshold, seed):
+    names, embeddings = embedded
+    rows = {name: i for i, name in enumerate(names)}
+    pairs = getNNeutralPairsFromSameTrees(tree, threshold, len(tree), rng=random.Random(seed))
+    src = embeddings[[rows[name1] for name1, _ in pairs]]
+    trg = embeddings[[rows[name2] for _, name2 in pairs]]
+    similarities = np.einsum("ij,ij->i", src, trg)
+    return [pairs[i] for i in smallestIndices(similarities, k)]
+
+def meanSimilarity(pairs, embedded):
+    names, embeddings = embedded
+    rows = {name: i for i, name in enumerate(names)}
+    return float(np.mean([embeddings[rows[name1]] @ embeddings[rows[name2]] for name1, name2 in pairs])) if pairs else float("nan")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark random sampling against similarity-driven mining of neutral pairs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--ratio", type=float, default=0.15, help="pairs kept per argument of the debate")
+    parser.add_argument("--threshold", type=int, default=10, help="minimum distance between the nodes of a pair")
+    parser.add_argument("--dimension", type=int, default=384, help="dimension of the stub embeddings")
+    parser.add_argument("--block-size", type=int, default=1024, help="number of arguments per block of the similarity matrix")
+    args = parser.parse_args()
+
+    print(f"{'arguments':>10} {'pairs':>7} {'strategy':>9} {'time (s)':>9} {'peak memory (MB)':>17} {'mean similarity':>16}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            path = os.path.join(folder, f"debate-{size}.txt")
+            writeSyntheticDebate(path, size, seed=size)
+            tree = rawKialo2CompactTree(path)
+            embedded = embedTreeArguments(tree, stubEncoder(args.dimension, seed=size))
+            k = int(size * args.ratio)
+
+            strategies = [
+                ("sample", lambda: samplePairs(tree, embedded, k, args.threshold, seed=size)),
+                ("mine", lambda: mineNeutralPairsFromSameTree(tree, args.threshold, k, embedded, blockSize=args.block_size)),
+            ]
+            for name, strategy in strategies:
+                duration, peak, pairs = measure(strategy)
+                print(f"{size:>10} {len(pairs):>7} {name:>9} {duration:>9.2f} {peak / 2**20:>17.1f} {meanSimilarity(pairs, embedded):>16.3f}")
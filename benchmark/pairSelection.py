@@ -0,0 +1,57 @@
+"""Compare the selection of the most dissimilar neutral pairs by a full sort with the partial selections of `tool/pairSelection.py`, on random similarities.
+
+For each number of candidates, the script times:
+- `sort`: the previous selection, sorting the whole frame by similarity and keeping the first rows
+- `partition`: `smallestIndices` on the similarity array
+- `stream`: `SmallestRows`, fed by chunks, with the number of rows to keep known upfront
+and checks that the three select the same rows.
+
+Run from the root of the repository with `python -m benchmark.pairSelection`.
+"""
+import time, argparse
+import numpy as np
+import pandas as pd
+from tool.pairSelection import smallestIndices, SmallestRows
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def sortSelection(frame, k):
+    return frame.sort_values("similarity", kind="stable")[:k]
+
+def partitionSelection(frame, k):
+    return frame.iloc[smallestIndices(frame["similarity"].to_numpy(), k)]
+
+def streamSelection(frame, k, chunkSize):
+    selector = SmallestRows(k)
+    for start in range(0, len(frame), chunkSize):
+        selector.add(frame.iloc[start:start+chunkSize])
+    return selector.result()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the selection of the k most dissimilar neutral pairs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 30_000_000], help="numbers of neutral candidates")
+    parser.add_argument("--fraction", type=float, default=0.01, help="fraction of the candidates kept")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="number of candidates per chunk of the stream")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'candidates':>11} {'kept':>9} {'sort (s)':>9} {'partition (s)':>14} {'stream (s)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        k = max(1, int(size * args.fraction))
+        # Similarities are rounded so that there are ties, like the duplicated pairs of the real data
+        frame = pd.DataFrame({
+            "similarity" : np.round(rng.uniform(-1, 1, size), 4).astype(np.float32),
+            "row"        : np.arange(size, dtype=np.int64),
+        })
+
+        sortTime, expected = timed(sortSelection, frame, k)
+        partitionTime, partitioned = timed(partitionSelection, frame, k)
+        streamTime, streamed = timed(streamSelection, frame, k, args.chunk_size)
+        assert np.array_equal(partitioned["row"].to_numpy(), expected["row"].to_numpy()), "partial selection differs from the sort"
+        assert np.array_equal(streamed["row"].to_numpy(), expected["row"].to_numpy()), "streamed selection differs from the sort"
+
+        print(f"{size:>11} {k:>9} {sortTime:>9.2f} {partitionTime:>14.2f} {streamTime:>11.2f} {sortTime / partitionTime:>7.1f}x")
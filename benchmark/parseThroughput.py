@@ -0,0 +1,30 @@
+"""Measure the throughput of `rawKialo2Json` on large synthetic debates.
+
+Run from the root of the repository with `python -m benchmark.parseThroughput`.
+"""
+import os, sys, time, tempfile, argparse
+from tool.parseDebate import rawKialo2Json
+from tool.syntheticDebate import writeSyntheticDebate
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Kialo debate parser on synthetic debates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per debate, the best one is kept")
+    args = parser.parse_args()
+
+    print(f"Recursion limit: {sys.getrecursionlimit()}")
+    print(f"{'arguments':>10} {'size (MB)':>10} {'time (s)':>10} {'args/s':>12} {'MB/s':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            path = os.path.join(folder, f"debate-{size}.txt")
+            writeSyntheticDebate(path, size, seed=size)
+            megabytes = os.path.getsize(path) / 1e6
+
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                tree = rawKialo2Json(path)
+                best = min(best, time.perf_counter() - start)
+            assert len(tree) == size + 1
+
+            print(f"{size:>10} {megabytes:>10.2f} {best:>10.3f} {size/best:>12.0f} {megabytes/best:>8.2f}")
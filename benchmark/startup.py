@@ -0,0 +1,110 @@
+"""Measure the startup time of the entry points, and check that the parse/pairs-only runs never import the heavy dependencies.
+
+Each entry point runs in a fresh interpreter, `--repeat` times, and the script reports the best wall time (the time of an empty interpreter is shown for reference),
+along with the modules taking the longest to import (`python -X importtime`). The entry points:
+- `processData --help`: importing `processData.py` and parsing its options
+- `processData --to pair`: parsing and generating the pairs of small synthetic debates (see `tool/syntheticDebate.py`), without loading the model
+- `import getDebatesData`: importing the download script, whose run needs Kialo credentials
+
+The script exits with status 1 if one of them imports a module of `FORBIDDEN` (torch, the encoders, selenium, langdetect), or takes longer than `--max-seconds`, so it can guard against regressions in CI.
+Run from the root of the repository with `python -m benchmark.startup`.
+"""
+import os, sys, json, time, tempfile, argparse, subprocess
+from tool.syntheticDebate import writeSyntheticDataset
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Heavy dependencies, only needed by the stages encoding arguments, by the download and by the sorting of debates by language
+FORBIDDEN = ["torch", "sentence_transformers", "transformers", "onnxruntime", "optimum", "selenium", "langdetect"]
+
+# Runs a script or imports a module like `python script.py args`, then writes the modules imported to a JSON file
+WRAPPER = """
+import sys, json, runpy
+outputPath, kind, target, *args = sys.argv[1:]
+sys.argv = [target] + args
+try:
+    if kind == "script":
+        runpy.run_path(target, run_name="__main__")
+    else:
+        __import__(target)
+except SystemExit as e:
+    if e.code not in (None, 0):
+        raise
+finally:
+    with open(outputPath, "w") as f:
+        json.dump(sorted(sys.modules), f)
+"""
+
+def runEntryPoint(kind, target, args, cwd, importTime=False):
+    """Run an entry point in a fresh interpreter.
+
+    Returns:
+        tuple(float, list[str], str): Wall time, modules imported and standard error (with the import times if `importTime`)
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        outputPath = os.path.join(folder, "modules.json")
+        command = [sys.executable] + (["-X", "importtime"] if importTime else []) + ["-c", WRAPPER, outputPath, kind, target] + args
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join([REPOSITORY_PATH] + ([os.environ["PYTHONPATH"]] if os.environ.get("PYTHONPATH") else [])))
+        start = time.perf_counter()
+        process = subprocess.run(command, cwd=cwd, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        seconds = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(f"{target} {' '.join(args)} failed:\n{process.stderr[-2000:]}")
+        with open(outputPath, "r") as f:
+            modules = json.load(f)
+    return seconds, modules, process.stderr
+
+def slowestImports(importTimes, n, target=None):
+    """Modules imported at the top level (or by `target` itself) with the longest cumulative import time, from the output of `python -X importtime`."""
+    entries = []
+    for line in importTimes.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            # Nested imports are indented by two spaces per level, after the space following the separator
+            entries.append(((len(name) - len(name.lstrip()) - 1) // 2, int(cumulative) / 1e6, name.strip()))
+    level = 1 if any(depth == 0 and name == target for depth, _, name in entries) else 0
+    return sorted(((seconds, name) for depth, seconds, name in entries if depth == level), reverse=True)[:n]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the startup time of the entry points and check that they do not import heavy dependencies.")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each entry point, the best time is reported")
+    parser.add_argument("--debates", type=int, default=5, help="number of synthetic debates of the parse/pairs-only run")
+    parser.add_argument("--arguments", type=int, default=200, help="number of arguments per synthetic debate")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if an entry point takes longer than this")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest imports shown per entry point")
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        writeSyntheticDataset(os.path.join(folder, "rawData"), args.debates, args.arguments, seed=0)
+        processData = os.path.join(REPOSITORY_PATH, "processData.py")
+        entryPoints = [
+            ("processData --help", "script", processData, ["--help"]),
+            ("processData --to pair", "script", processData, ["--to", "pair", "--seed", "0"]),
+            ("import getDebatesData", "module", "getDebatesData", []),
+        ]
+        baseline = min(runEntryPoint("module", "os", [], folder)[0] for _ in range(args.repeat))
+        print(f"Empty interpreter: {baseline:.3f}s")
+
+        results, failures = [], []
+        for name, kind, target, entryArgs in entryPoints:
+            seconds = min(runEntryPoint(kind, target, entryArgs, folder)[0] for _ in range(args.repeat))
+            _, modules, importTimes = runEntryPoint(kind, target, entryArgs, folder, importTime=True)
+            heavy = sorted({module.split(".")[0] for module in modules} & set(FORBIDDEN))
+            slowest = slowestImports(importTimes, args.top, target if kind == "module" else None)
+            results.append({"entryPoint": name, "seconds": seconds, "modules": len(modules), "heavyModules": heavy, "slowestImports": slowest})
+            print(f"{name:>24}: {seconds:.3f}s, {len(modules)} modules" + (f", imports {', '.join(heavy)}" if heavy else ""))
+            print("    slowest imports: " + ", ".join(f"{module} {importSeconds:.3f}s" for importSeconds, module in slowest))
+            if heavy:
+                failures.append(f"{name} imports {', '.join(heavy)}")
+            if args.max_seconds is not None and seconds > args.max_seconds:
+                failures.append(f"{name} took {seconds:.3f}s, more than {args.max_seconds}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": vars(args), "baselineSeconds": baseline, "results": results}, f, indent=1)
+        print(f"Results written to {args.output}")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,168 @@
+"""Time and memory-profile each stage of the dataset generation on synthetic debates, and write the results as JSON so that regressions can be tracked.
+
+The stages, run for each debate size:
+- `parse`: `rawKialo2Json` and `rawKialo2CompactTree`
+- `pairs`: `argumentTree2argumentPairTree` on both trees
+- `samplers`: the random neutral samplers from the same tree and between two debates
+- `cleanup`: `normalizeArgument` on the raw text of every argument
+- `embedding`: `computePairCosineSimilarities` on the support/attack pairs, with a stub encoder instead of a model
+- `endToEnd`: `processData.py` on a synthetic `rawData` folder, in a separate process (needs `sentence_transformers` and the model)
+
+Each in-process stage is run `--repeat` times untraced, keeping the best time, then once under `tracemalloc` for its peak memory.
+
+Run from the root of the repository with `python -m benchmark.suite`, e.g. `python -m benchmark.suite --sizes 1000 10000 --stages parse pairs --output results.json`.
+"""
+import os, io, sys, time, json, random, tempfile, tracemalloc, platform, subprocess, resource, argparse, zlib
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from tool.parseDebate import rawKialo2Json, rawKialo2CompactTree
+from tool.processTree import argumentTree2argumentPairTree, getNNeutralPairsFromSameTrees, getNNeutralPairsFromDiffTrees
+from tool.pairCleanup import normalizeArgument
+from tool.pairEmbedding import computePairCosineSimilarities
+from tool.syntheticDebate import writeSyntheticDebate, writeSyntheticDataset
+
+STAGES = ["parse", "pairs", "samplers", "cleanup", "embedding", "endToEnd"]
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StubEncoder:
+    """Stands in for a `SentenceTransformer`: each text is encoded as a random vector seeded by its content, at a cost independent of any model."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False):
+        return np.stack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension, dtype=np.float32) for text in sentences])
+
+def measure(function, repeat):
+    """Best time of `repeat` runs of `function`, then its peak memory and result on one traced run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def record(results, stage, variant, arguments, seconds, peak, items):
+    results.append({
+        "stage"          : stage,
+        "variant"        : variant,
+        "arguments"      : arguments,
+        "seconds"        : seconds,
+        "peakMemoryMB"   : peak / 2**20 if peak is not None else None,
+        "items"          : items,
+        "itemsPerSecond" : items / seconds if seconds else None,
+    })
+    peakText = f"{peak / 2**20:>10.1f}" if peak is not None else f"{'-':>10}"
+    print(f"{stage:>10} {variant:>10} {arguments:>10} {seconds:>10.3f} {peakText} {items:>10}")
+
+def benchmarkDebate(results, folder, size, options, stages, repeat):
+    """Run the in-process stages on synthetic debates of `size` arguments."""
+    paths = []
+    for seed in range(2):
+        paths.append(os.path.join(folder, f"debate-{size}-{seed}.txt"))
+        writeSyntheticDebate(paths[-1], size, seed=size + seed, **options)
+    trees = {"anytree": rawKialo2Json(paths[0]), "compact": rawKialo2CompactTree(paths[0])}
+    other = rawKialo2CompactTree(paths[1])
+
+    if "parse" in stages:
+        for variant, parse in [("anytree", rawKialo2Json), ("compact", rawKialo2CompactTree)]:
+            seconds, peak, tree = measure(lambda: parse(paths[0]), repeat)
+            record(results, "parse", variant, size, seconds, peak, len(tree))
+    if "pairs" in stages:
+        for variant, tree in trees.items():
+            seconds, peak, pairs = measure(lambda: argumentTree2argumentPairTree(tree['1.'], "Tag", "debate"), repeat)
+            record(results, "pairs", variant, size, seconds, peak, len(pairs))
+    if "samplers" in stages:
+        tree = trees["compact"]
+        samplers = [
+            ("sameTree", lambda: getNNeutralPairsFromSameTrees(tree, 10, len(tree), rng=random.Random(0))),
+            ("diffTree", lambda: getNNeutralPairsFromDiffTrees(tree, other, max(len(tree), len(other)), rng=random.Random(0))),
+        ]
+        for variant, sampler in samplers:
+            seconds, peak, pairs = measure(sampler, repeat)
+            record(results, "samplers", variant, size, seconds, peak, len(pairs))
+    if "cleanup" in stages:
+        tree = trees["compact"]
+        texts = [tree.text(idx) for idx in range(1, len(tree))]
+        seconds, peak, cleaned = measure(lambda: [normalizeArgument(text) for text in texts], repeat)
+        record(results, "cleanup", "normalize", size, seconds, peak, len(cleaned))
+    if "embedding" in stages:
+        pairs = argumentTree2argumentPairTree(trees["compact"]['1.'], "Tag", "debate")
+        argSrc, argTrg = [pair["subArgument"] for pair in pairs], [pair["topArgument"] for pair in pairs]
+        model = StubEncoder()
+        with redirect_stdout(io.StringIO()):
+            seconds, peak, similarities = measure(lambda: computePairCosineSimilarities(argSrc, argTrg, model, showProgress=False), repeat)
+        record(results, "embedding", "stub", size, seconds, peak, len(similarities))
+
+def benchmarkEndToEnd(results, folder, nbDebates, size, options, workers):
+    """Run `processData.py` on a synthetic dataset, in a separate process, reporting its peak resident memory."""
+    workFolder = os.path.join(folder, f"endToEnd-{nbDebates}-{size}")
+    writeSyntheticDataset(os.path.join(workFolder, "rawData"), nbDebates, size, **options)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPOSITORY_PATH, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, os.path.join(REPOSITORY_PATH, "processData.py"), "--seed", "0", "--workers", str(workers)],
+                             cwd=workFolder, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        print(f"processData.py failed: {process.stderr.strip().splitlines()[-1] if process.stderr.strip() else process.returncode}")
+        results.append({"stage": "endToEnd", "variant": f"workers={workers}", "arguments": nbDebates * size, "error": process.stderr[-2000:]})
+        return
+    # Peak resident memory of the largest child process so far, in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    nbPairs = len(pd.read_csv(os.path.join(workFolder, "processedData", "kialoPairs.csv"), usecols=["relation"]))
+    record(results, "endToEnd", f"workers={workers}", nbDebates * size, seconds, peak, nbPairs)
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the dataset generation on synthetic debates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="number of arguments of each synthetic debate")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="number of untraced runs per stage, the best one is kept")
+    parser.add_argument("--depth", type=int, default=None, help="maximum level of the arguments")
+    parser.add_argument("--branching", type=int, default=None, help="maximum number of children of a node")
+    parser.add_argument("--text-length", type=int, nargs=2, default=[5, 40], metavar=("MIN", "MAX"), help="minimum and maximum number of words of an argument")
+    parser.add_argument("--artifacts", type=float, default=0.1, help="fraction of the arguments with source and page annotations")
+    parser.add_argument("--see", type=float, default=0.02, help="fraction of \"See\" arguments")
+    parser.add_argument("--debates", type=int, default=20, help="number of debates of the end-to-end run")
+    parser.add_argument("--debate-size", type=int, default=500, help="number of arguments of each debate of the end-to-end run")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes of the end-to-end run")
+    parser.add_argument("--output", default="benchmark/results.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    options = {"maxDepth": args.depth, "branching": args.branching, "textLength": tuple(args.text_length), "artifactRatio": args.artifacts, "seeRatio": args.see}
+    results = []
+    print(f"{'stage':>10} {'variant':>10} {'arguments':>10} {'time (s)':>10} {'peak (MB)':>10} {'items':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            benchmarkDebate(results, folder, size, options, args.stages, args.repeat)
+        if "endToEnd" in args.stages:
+            benchmarkEndToEnd(results, folder, args.debates, args.debate_size, options, args.workers)
+
+    report = {
+        "meta": {
+            "date"     : datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit"   : gitCommit(),
+            "python"   : platform.python_version(),
+            "platform" : platform.platform(),
+            "cpus"     : os.cpu_count(),
+            "numpy"    : np.__version__,
+            "pandas"   : pd.__version__,
+            "options"  : vars(args),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.output}")
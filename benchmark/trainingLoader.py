@@ -0,0 +1,96 @@
+"""Compare an epoch over the pairs read from the CSV dataset with an epoch over the memory-mapped arrays of `tool/trainingLoader.py`, on a synthetic dataset.
+
+For each number of pairs, the script writes a columnar dataset (random arguments and pairs) with its CSV export and its training arrays, then times:
+- `csv`: an epoch as training jobs ran it, reading `kialoPairs.csv` with pandas, shuffling each relation and gathering balanced batches with `iloc`
+- `memmap`: opening the training arrays and iterating over `TrainingData.iterBatches`, the first epoch (pages read from disk or the page cache) and the next ones
+Each epoch touches the ids, relations and similarities of every pair of its batches, so that both variants read the same data.
+
+Needs `pyarrow`. Run from the root of the repository with `python -m benchmark.trainingLoader`.
+"""
+import os, time, tempfile, argparse
+import numpy as np
+import pandas as pd
+from tool.columnarDataset import ARGUMENTS_TABLE, RELATIONS, tablePath, writeTable, exportCsv
+from tool.trainingLoader import TrainingData, exportTrainingData
+
+def writeSyntheticDataset(folderPath, nbPairs, nbArguments, nbDebates, seed):
+    """Columnar dataset with `nbArguments` random arguments spread over `nbDebates` debates, and `nbPairs` random pairs within debates."""
+    rng = np.random.default_rng(seed)
+    debates = np.sort(rng.integers(nbDebates, size=nbArguments))
+    arguments = pd.DataFrame({
+        "id"     : np.arange(nbArguments, dtype=np.int32),
+        "text"   : [f"Argument {i} " + "word " * int(n) for i, n in enumerate(rng.integers(5, 40, size=nbArguments))],
+        "debate" : pd.Categorical([f"debate-{d}" for d in debates]),
+        "node"   : [f"1.{i}." for i in range(nbArguments)],
+        "level"  : np.ones(nbArguments, dtype=np.int16),
+        "stance" : pd.Categorical(rng.choice(["Pro", "Con"], size=nbArguments)),
+    })
+    writeTable(arguments, tablePath(folderPath, ARGUMENTS_TABLE))
+    # Both arguments of a pair from the same debate, debates being contiguous ranges of ids
+    starts = np.searchsorted(debates, np.arange(nbDebates))
+    ends = np.searchsorted(debates, np.arange(nbDebates), side="right")
+    srcId = rng.integers(nbArguments, size=nbPairs)
+    pairDebates = debates[srcId]
+    trgId = starts[pairDebates] + (rng.random(nbPairs) * (ends - starts)[pairDebates]).astype(np.int64)
+    pairs = pd.DataFrame({
+        "srcId"      : srcId.astype(np.int32),
+        "trgId"      : trgId.astype(np.int32),
+        "topic"      : pd.Categorical(["Tag"] * nbPairs),
+        "relation"   : pd.Categorical.from_codes(rng.integers(len(RELATIONS), size=nbPairs), RELATIONS),
+        "sameTree"   : np.ones(nbPairs, dtype=bool),
+        "similarity" : rng.random(nbPairs, dtype=np.float32),
+    })
+    writeTable(pairs, tablePath(folderPath, "kialoPairs"))
+
+def csvEpoch(csvPath, batchSize, rng):
+    """One epoch over the CSV dataset, returning a checksum of the batches."""
+    pairs = pd.read_csv(csvPath)
+    perRelation = batchSize // len(RELATIONS)
+    byRelation = [rng.permutation(np.flatnonzero(pairs["relation"].to_numpy() == relation)) for relation in RELATIONS]
+    nbBatches = min(len(indices) for indices in byRelation) // perRelation
+    checksum = 0.0
+    for i in range(nbBatches):
+        batch = pairs.iloc[np.concatenate([indices[i*perRelation:(i+1)*perRelation] for indices in byRelation])]
+        checksum += batch["similarity"].to_numpy().sum() + len(batch["argSrc"]) + len(batch["relation"])
+    return nbBatches, checksum
+
+def memmapEpoch(data, batchSize, epoch):
+    """One epoch over the training arrays, returning a checksum of the batches."""
+    nbBatches, checksum = 0, 0.0
+    for batch in data.iterBatches("train", batchSize, epoch=epoch):
+        checksum += batch.similarity.sum() + len(batch.srcId) + len(batch.relation)
+        nbBatches += 1
+    return nbBatches, checksum
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare training epochs over the CSV dataset and over the memory-mapped training arrays.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="numbers of pairs")
+    parser.add_argument("--arguments-per-pair", type=float, default=0.5, help="number of arguments per pair")
+    parser.add_argument("--debates", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=96)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>10} {'variant':>8} {'prepare (s)':>12} {'1st epoch (s)':>14} {'next epochs (s)':>16} {'batches':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            writeSyntheticDataset(folder, size, max(int(size * args.arguments_per_pair), args.debates), args.debates, args.seed)
+            csvPath = os.path.join(folder, "kialoPairs.csv")
+            prepareSeconds, _ = timed(exportCsv, folder, "kialoPairs", csvPath)
+            rng = np.random.default_rng(args.seed)
+            seconds = [timed(csvEpoch, csvPath, args.batch_size, rng) for _ in range(args.epochs)]
+            print(f"{size:>10} {'csv':>8} {prepareSeconds:>12.2f} {seconds[0][0]:>14.3f} {np.mean([s for s, _ in seconds[1:]] or [np.nan]):>16.3f} {seconds[0][1][0]:>8}")
+
+            trainingPath = os.path.join(folder, "training")
+            prepareSeconds, _ = timed(exportTrainingData, folder, trainingPath, "parquet", "kialoPairs", (1.0, 0.0, 0.0), args.seed)
+            start = time.perf_counter()
+            data = TrainingData(trainingPath)
+            seconds = [timed(memmapEpoch, data, args.batch_size, epoch) for epoch in range(args.epochs)]
+            firstSeconds = time.perf_counter() - start - sum(s for s, _ in seconds[1:])
+            print(f"{size:>10} {'memmap':>8} {prepareSeconds:>12.2f} {firstSeconds:>14.3f} {np.mean([s for s, _ in seconds[1:]] or [np.nan]):>16.3f} {seconds[0][1][0]:>8}")
@@ -1,4 +1,4 @@
-from tool.kialoTools import KialoSort, KialoFilter, getDiscussions, discussions2urlID
+from tool.kialoTools import KialoSort, KialoFilter, iterDiscussions, discussions2urlID
 from tool.download import downloadDiscussions
 from tool.sortFiles import classifyFilesByLanguage
 import os
@@ -7,22 +7,30 @@ kialoUsername  = "PLACEHOLDER"
 secret              = "PLACEHOLDER"
 
 downloadPath = os.path.abspath("rawData/debates")
+# Responses of the Kialo API are cached for `discussionsCacheTtl` seconds, set to None to disable the cache
+discussionsCachePath = os.path.abspath("rawData/discussionsCache")
+discussionsCacheTtl = 24*3600
+# Sorted debates are hard linked into their language folder ("hardlink", "symlink" or "copy")
+sortLinkMode = "hardlink"
 
 if __name__ == "__main__":
     downloadPathParent = os.path.abspath(os.path.join(downloadPath, os.pardir))
 
     # Export most active and high ranked kialo discussions
-    getDiscussions(filter=KialoFilter.TAG, sort=KialoSort.RANK_ACTIVITY)
-    debateIDs = discussions2urlID(getDiscussions(filter=KialoFilter.TAG, sort=KialoSort.RANK_ACTIVITY), export=True, exportPath=downloadPathParent)
+    discussions = iterDiscussions(filter=KialoFilter.TAG, sort=KialoSort.RANK_ACTIVITY, cachePath=discussionsCachePath, ttl=discussionsCacheTtl)
+    debateIDs = discussions2urlID(discussions, export=True, exportPath=downloadPathParent)
     
     # Download the aforementioned discussions as text files
     print("Downloading discussions...")
-    downloadDiscussions(debateIDs, kialoUsername, secret, downloadPath)
-    print("Download complete.\n")
+    report = downloadDiscussions(debateIDs, kialoUsername, secret, downloadPath)
+    print(f"Download complete: {len(report['downloaded'])} downloaded, {len(report['skipped'])} already on disk, {len(report['failed'])} failed.\n")
+    for urlId, error in report["failed"].items():
+        print(f"Failed to download {urlId}: {error}")
 
     # Sort the downloaded debates by language
     print("Sorting discussions by language...")
-    classifyFilesByLanguage(downloadPath)
+    sortReport = classifyFilesByLanguage(downloadPath, linkMode=sortLinkMode)
+    print(f"{sortReport['classified']} discussions classified, {sortReport['skipped']} already classified, {sortReport['failed']} failed.\n")
 
     # Print number of debates in each language
     languageFolders = [
@@ -1,140 +1,802 @@
-import sys, os
+import sys, os, argparse, random, math
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from tool.processTree import argumentTree2argumentPairTree, getNNeutralPairsFromSameTrees, getNNeutralPairsFromDiffTrees, namePairs2NeutralArgPairs
-from tool.parseDebate import rawKialo2Json
-from tool.pairEmbedding import computeRowCosineSimilarity
-
-sys.setrecursionlimit(100000)
+from tool.crossDebateSampler import CrossDebateSampler, argumentIndices
+from tool.processTree import iterArgumentPairs, getNNeutralPairsFromSameTrees, getNNeutralPairsFromDiffTrees, iterNeutralArgPairs, embedTreeArguments, mineNeutralPairsFromSameTree, mineNeutralPairsFromDiffTrees
+from tool.parseDebate import PARSER_VERSION, rawKialo2CompactTree
+from tool.pairEmbedding import ENCODER_BACKENDS, loadEncoder, encoderName, EncodePool, embedUniqueArgs, embedArguments, pairwiseCosineSimilarity
+from tool.embeddingCache import EmbeddingCache
+from tool.debateCache import DebateCache
+from tool.fileHash import hashFile
+from tool.buildManifest import BuildManifest
+from tool.pairStream import PAIR_COLUMNS, ARGUMENT_REF_COLUMNS, pair2Row, writeCsvInChunks, teeCsvChunks, readCsvInChunks
+from tool.pairSelection import countRelations, selectPairs, selectPairChunks
+from tool.runReport import RunReport, measureDebate
+from tool.stageCheckpoints import StageCheckpoints
+from tool.columnarDataset import FORMATS, ARGUMENTS_TABLE, ColumnarDatasetBuilder, tablePath, writeTable, exportCsv
+from tool.nearDuplicates import DEDUP_MODES, NearDuplicateIndex, NearDuplicates, DuplicateFilter
 
 urlIdPath = os.path.abspath("rawData/kialo-url-ids.csv")
-debatesFolderPath = os.path.abspath(os.path.join(urlIdPath, os.pardir, "debates", "en")) 
+debatesFolderPath = os.path.abspath(os.path.join(urlIdPath, os.pardir, "debates", "en"))
 outputPath = os.path.abspath("processedData/")
-
-for path in [outputPath, urlIdPath, debatesFolderPath]:
-  if not os.path.exists(path):
-    if path == outputPath:
-      os.makedirs(path)
-    else:
-      raise FileNotFoundError(f"File or folder not found at {path}. Please check the path and try again.")
-
-kialoUrlIds = pd.read_csv(urlIdPath, index_col=0)
-pairs = []
-
-prev_d = None
-prev_kialoUrlId = None
-prev_t = None
-
-for i, x in tqdm(kialoUrlIds.iterrows(), total=kialoUrlIds.shape[0]):
+# Number of pairs held in memory at once while writing and reading the pair files
+chunkSize = 100_000
+embeddingBatchSize = 256
+# Embeddings are cached on disk (one folder per model), set to None to disable the cache
+embeddingCachePath = os.path.abspath("processedData/embeddingCache/")
+embeddingCacheMaxEntries = 2_000_000
+# Arguments encoded between two flushes of the embedding cache, an interrupted embed stage only encodes again the arguments since the last flush
+embeddingCheckpointSize = 20_000
+# Parsed debates are cached on disk, keyed by the hash of their file, set to None to disable the cache
+debateCachePath = os.path.abspath("processedData/debateCache/")
+# Manifest and per-debate pairs of the incremental builds (`--incremental`)
+incrementalBuildPath = os.path.abspath("processedData/incremental/")
+# With `--neutral-mining`, neutral pairs mined per support/attack pair of a debate, both from its own tree and with the previous debate (each mined pair also gives its reverse pair)
+# Slightly more than the 0.25 kept per support/attack pair, so that the final selection still keeps the most dissimilar ones across debates
+neutralMiningRatio = 0.3
+# Number of arguments per block of the similarity matrices computed by the neutral mining
+neutralMiningBlockSize = 1024
+# Neutral pairs between debates: "previous" pairs each debate with the previous one of `kialo-url-ids.csv`, "corpus" draws the pairs across all debates,
+# and "tags" also balances them across pairs of tags (see tool/crossDebateSampler.py). With "corpus" and "tags", pairs of nodes drawn per argument of the corpus (each also gives its reverse pair)
+crossDebateSampling = "previous"
+crossDebateRatio = 1.0
+# Near-duplicate arguments (`--dedup`, see tool/nearDuplicates.py): estimated Jaccard similarity of the character shingles above which two arguments are clustered,
+# number of bytes of each shingle and length of the MinHash signatures
+dedupThreshold = 0.8
+dedupShingleSize = 5
+dedupNumPerm = 64
+modelName = "sentence-transformers/all-MiniLM-L6-v2"
+# Backend running the model on CPU ("torch", "quantized" or "onnx", see `loadEncoder` in tool/pairEmbedding.py), number of processes encoding the arguments,
+# and number of tokens arguments are truncated to (None for the default of the model). The backend and the truncation change the embeddings, which are cached apart
+encoderBackend = "torch"
+encoderWorkers = 1
+encoderMaxSeqLength = None
+# Run reports (`runReport.json` and `runReportDebates.csv`) are written to this folder, set to None to disable them
+runReportPath = os.path.abspath("processedData/")
+# Checkpoints of the stages of the pipeline (`--from STAGE`, `--only STAGE`) and similarities of the pairs computed by the embed stage
+checkpointsPath = os.path.abspath("processedData/checkpoints/")
+# Stages of the pipeline, in order, each one resuming from the checkpoint of the previous one
+STAGES = ["parse", "dedup", "pair", "embed", "select"]
+
+def debateRng(seed, kialoUrlId, step):
+  """Random number generator dedicated to one step of one debate, so that the pairs only depend on the seed and not on the order debates are processed in."""
+  return random.Random(f"{seed}:{kialoUrlId}:{step}")
+
+def parseDebatePairs(task):
+  """Parse a debate file and generate its cleaned support/attack pairs and neutral pairs from the same tree.
+  Runs inside the worker processes.
+
+  Args:
+      task (tuple): Debate file path, kialoUrlId, debate tags, seed, debate cache folder (None to always parse the debate), whether to sample the neutral pairs (False when they are mined afterwards) and whether to trace the memory of each stage
+
+  Returns:
+      tuple(CompactTree, list[dict], list[dict]): Parsed tree and list of dataset rows (both None if the debate could not be processed), and the records of the "parse" and "pairs" stages (see `measureDebate`)
+  """
+  debatePath, kialoUrlId, d, seed, cachePath, sampleNeutrals, traceMemory = task
+  records = []
   try:
-    d = x.tags
-    kialoUrlId = x.kialoUrlId
-
-    t = rawKialo2Json(os.path.join(debatesFolderPath, kialoUrlId +".txt"))
-    
-    pairs = pairs + argumentTree2argumentPairTree(t['1.'], d)
-    
-    neutralPairsSameTree = getNNeutralPairsFromSameTrees(t, 10, len(t))
-
-    pairs = pairs + namePairs2NeutralArgPairs(t, neutralPairsSameTree, d)
-    
-    if prev_d is not None and prev_t is not None:
-      neutralPairsDiffTree = getNNeutralPairsFromDiffTrees(t, prev_t, max(len(t), len(prev_t)))
-      
-      pairs = pairs + namePairs2NeutralArgPairs(t, neutralPairsDiffTree, d, prev_t, prev_d, same_tree=False)
-
-    prev_d = d
-    prev_kialoUrlId = kialoUrlId
-    prev_t = t
-  except Exception as e:
-    continue
-
-
-argSrc = [x["subArgument"] for x in pairs]
-argTrg = [x["topArgument"] for x in pairs]
-topic = [x["domain"] for x in pairs]
-relations = [x["relation"] for x in pairs]
-sameTree = [x["sameTree"] for x in pairs]
-
-pairsDf = pd.DataFrame.from_dict({
-  "topic": topic,
-  "relation" : relations,
-  "argSrc" : argSrc,
-  "argTrg" : argTrg,
-  "sameTree" : sameTree,
-})
-
-# Clean up 
-# The arguments still contain some sources, noted by `[124]` for example. We want to remove those.  
-# Ideally, we should also remove leftover artifacts like mentions of a page number or stuff like `(p. i.)` but that is another hassle for another day. 
-
-# Remove rows with "See" in either argument
-pattern = r"-> See (\d\.)*"
-pairsDf = pairsDf[~pairsDf['argSrc'].str.contains(pattern)]
-pairsDf = pairsDf[~pairsDf['argTrg'].str.contains(pattern)]
-
-# Remove sources from argSrc and argTrg
-pattern = r"\s*\[\d+\]"
-pairsDf['argSrc'] = pairsDf['argSrc'].str.replace(pattern, "", regex=True)
-pairsDf['argTrg'] = pairsDf['argTrg'].str.replace(pattern, "", regex=True)
-
-# Remove artifacts like (p. 1), (p. i), (p. ii), (p. 65-66), etc.
-pattern = r"\(\s*p\.\s*[\di]+(-\d+)*\s*\)"
-pairsDf['argSrc'] = pairsDf['argSrc'].str.replace(pattern, "", regex=True)
-pairsDf['argTrg'] = pairsDf['argTrg'].str.replace(pattern, "", regex=True)
-
-# Compute Cosine similarity from embeddings
-# The intuition being that neutral arguments would tend to have orthogonal embeddings, and thus a cosine similarity of 0.
-
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", trust_remote_code=True)
-
-tqdm.pandas(desc="Computing similarity for all pairs")
-
-pairsDf['similarity'] = pairsDf.progress_apply(lambda row: computeRowCosineSimilarity(row, model), axis=1)
+    with measureDebate(records, kialoUrlId, "parse", traceMemory) as record:
+      t = DebateCache(cachePath).load(debatePath) if cachePath else rawKialo2CompactTree(debatePath)
+      record["nodes"] = len(t)
 
-supp = pairsDf[pairsDf['relation'] == 'support']
-att = pairsDf[pairsDf['relation'] == 'attack']
-neut_sameTree = pairsDf[(pairsDf['relation'] == 'neutral') & (pairsDf['sameTree'] == True)]
-neut_diffTree = pairsDf[(pairsDf['relation'] == 'neutral') & (pairsDf['sameTree'] == False)]
-neut = pd.concat([neut_sameTree, neut_diffTree], ignore_index=True)
+    with measureDebate(records, kialoUrlId, "pairs", traceMemory) as record:
+      neutralPairsSameTree = getNNeutralPairsFromSameTrees(t, 10, len(t), rng=debateRng(seed, kialoUrlId, "sameTree")) if sampleNeutrals else []
 
-pairsDf.to_csv(os.path.join(outputPath, "kialoPairsRaw.csv"), index=False)
-
-# # Post processing
-# The idea here is to keep only the pairs of neutral arguments that are most neutral, by using the computed Cosine similarity between their embeddings.
-
-kp = pd.read_csv(os.path.join(outputPath, "kialoPairsRaw.csv"))
-
-kp_neut_sameTree= kp[(kp['relation'] == 'neutral') & (kp['sameTree'] == True)]
-kp_neut_diffTree= kp[(kp['relation'] == 'neutral') & (kp['sameTree'] == False)]
-
-# ### Filter out neutral rows
-# 
-# The objective is to have roughly 100k neutrals with a 50:50 split between sameTree and !sameTree in order to have a balanced dataset to sample from.  
-# Using the conclusion from the previous exploration, we can determine that it is safe to keep only the most dissimilar pairs (i.e. based on the similarity score in ascending order).
-
-nb_supp = kp.value_counts('relation')['support']
-nb_att = kp.value_counts('relation')['attack']
-
-target_nb_neut = (nb_supp + nb_att)//2
-
-# Sort by similarity and keep enough rows to reach target_nb_neut
-kp_neut_sameTree.sort_values('similarity', inplace=True)
-kp_neut_sameTree = kp_neut_sameTree[:target_nb_neut//2]
-
-kp_neut_diffTree.sort_values('similarity', inplace=True)
-kp_neut_diffTree = kp_neut_diffTree[:target_nb_neut//2]
-
-# Concatenate enough neutrals to create a balanced dataset
-
-kp_supp = kp[kp['relation'] == 'support']
-kp_att = kp[kp['relation'] == 'attack']
-
-kp_final = pd.concat([kp_supp, kp_att, kp_neut_sameTree, kp_neut_diffTree], ignore_index=True)
+      pairs = chain(iterArgumentPairs(t['1.'], d, kialoUrlId), iterNeutralArgPairs(t, neutralPairsSameTree, d, debate_n1=kialoUrlId))
+      rows = list(map(pair2Row, pairs))
+      record["nodes"] = len(t)
+      record["pairs"] = len(rows)
+  except Exception as e:
+    return None, None, records
+  return t, rows, records
 
-kp_final.value_counts('relation')
+def parseDebate(task):
+  """Parse a debate file into the debate cache.
+  Runs inside the worker processes.
 
-# Save the final Dataset
+  Args:
+      task (tuple): Debate file path, kialoUrlId, debate cache folder and whether to trace the memory of the stage
 
-kp_final.to_csv(os.path.join(outputPath, "kialoPairs.csv"), index=False)
+  Returns:
+      tuple(bool, list[dict]): Whether the debate could be parsed, and the record of the "parse" stage (see `measureDebate`)
+  """
+  debatePath, kialoUrlId, cachePath, traceMemory = task
+  records = []
+  try:
+    with measureDebate(records, kialoUrlId, "parse", traceMemory) as record:
+      record["nodes"] = len(DebateCache(cachePath).load(debatePath))
+  except Exception as e:
+    return False, records
+  return True, records
+
+def imapBounded(pool, function, tasks, maxPending):
+  """Ordered equivalent of `pool.imap`, with at most `maxPending` tasks submitted ahead of the consumer so that results do not pile up in memory."""
+  pending = deque()
+  for task in tasks:
+    pending.append(pool.apply_async(function, (task,)))
+    if len(pending) >= maxPending:
+      yield pending.popleft().get()
+  while pending:
+    yield pending.popleft().get()
+
+def loadDebate(debatePath):
+  """Parse a debate file, or load its tree from the debate cache."""
+  return DebateCache(debateCachePath).load(debatePath) if debateCachePath else rawKialo2CompactTree(debatePath)
+
+def diffTreeRows(t, prev_t, kialoUrlId, prev_kialoUrlId, d, prev_d, seed):
+  """Generate the cleaned neutral pairs between a debate and the previous one.
+
+  Args:
+      t (CompactTree): Tree of the debate
+      prev_t (CompactTree): Tree of the previous debate
+      kialoUrlId (str): kialoUrlId of the debate, which seeds the sampling with `seed`
+      prev_kialoUrlId (str): kialoUrlId of the previous debate
+      d (str): Tags of the debate
+      prev_d (str): Tags of the previous debate
+      seed (int): Seed of the neutral pair sampling
+
+  Returns:
+      list[dict]: Rows of the dataset, without similarity
+  """
+  neutralPairsDiffTree = getNNeutralPairsFromDiffTrees(t, prev_t, max(len(t), len(prev_t)), rng=debateRng(seed, kialoUrlId, "diffTree"))
+  return list(map(pair2Row, iterNeutralArgPairs(t, neutralPairsDiffTree, d, prev_t, prev_d, same_tree=False, debate_n1=kialoUrlId, debate_n2=prev_kialoUrlId)))
+
+def nbMinedPairs(nbArgumentPairs):
+  """Number of neutral pairs of nodes mined for a debate with `nbArgumentPairs` support and attack pairs."""
+  return math.ceil(nbArgumentPairs * neutralMiningRatio / 2)
+
+def minedSameTreeRows(t, embedded, kialoUrlId, d, k):
+  """Generate the `k` most dissimilar pairs of nodes of a debate, as neutral rows (with their reverse pairs)."""
+  neutralPairsSameTree = mineNeutralPairsFromSameTree(t, 10, k, embedded, blockSize=neutralMiningBlockSize)
+  return list(map(pair2Row, iterNeutralArgPairs(t, neutralPairsSameTree, d, debate_n1=kialoUrlId)))
+
+def minedDiffTreeRows(t, embedded, prev_t, prev_embedded, kialoUrlId, prev_kialoUrlId, d, prev_d, k):
+  """Generate the `k` most dissimilar pairs of nodes between a debate and the previous one, as neutral rows (with their reverse pairs)."""
+  neutralPairsDiffTree = mineNeutralPairsFromDiffTrees(embedded, prev_embedded, k, blockSize=neutralMiningBlockSize)
+  return list(map(pair2Row, iterNeutralArgPairs(t, neutralPairsDiffTree, d, prev_t, prev_d, same_tree=False, debate_n1=kialoUrlId, debate_n2=prev_kialoUrlId)))
+
+def generatePairs(kialoUrlIds, workers=1, seed=None, onDebate=None, embed=None, report=None, loadStage="parse", crossDebate=None):
+  """Parse every debate and generate all its cleaned pairs, including neutral pairs with the previous debate.
+  Debates are parsed by `workers` processes, the neutral pairs between debates are then generated in order, so that each debate is paired with the previous one that was processed successfully.
+  Pairs are generated lazily, debate by debate.
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates to process, with their kialoUrlId and tags
+      workers (int, optional): Number of worker processes. Defaults to 1.
+      seed (int, optional): Seed of the neutral pair sampling, the pairs are identical for any number of workers. Defaults to None (random seed).
+      onDebate (callable, optional): Called with the kialoUrlId and the tree of each debate processed successfully, before its pairs are generated. Defaults to None.
+      embed (callable, optional): Returns the embeddings of a list of texts. If set, the neutral pairs are mined instead of sampled: the arguments of each debate are embedded once, and the most dissimilar valid pairs are kept (`neutralMiningRatio` per support/attack pair). Defaults to None.
+      report (RunReport, optional): Report receiving the measurements and failures of each debate and stage. Defaults to None.
+      loadStage (str, optional): Name of the debate stage recording how the tree of each debate was obtained, "load" when the debates were already parsed into the debate cache by the parse stage. Defaults to "parse".
+      crossDebate (CrossDebateSampler, optional): If set, the neutral pairs between debates are drawn across the whole corpus once every debate was processed (`crossDebateRatio` per argument), instead of between each debate and the previous one. Defaults to None.
+
+  Yields:
+      dict: Each row of the dataset, without similarity
+  """
+  if seed is None:
+    seed = random.randrange(2**32)
+
+  traceMemory = report is not None and report.traceMemory
+  debateRecords = report.debates if report is not None else []
+  tasks = [
+    (os.path.join(debatesFolderPath, x.kialoUrlId + ".txt"), x.kialoUrlId, x.tags, seed, debateCachePath, embed is None, traceMemory)
+    for _, x in kialoUrlIds.iterrows()
+    ]
+
+  prev_d = None
+  prev_kialoUrlId = None
+  prev_t = None
+  prev_embedded = None
+
+  pool = Pool(workers) if workers > 1 else None
+  try:
+    results = imapBounded(pool, parseDebatePairs, tasks, maxPending=4*workers) if pool else map(parseDebatePairs, tasks)
+
+    for (_, kialoUrlId, d, _, _, _, _), (t, rows, records) in tqdm(zip(tasks, results), total=len(tasks)):
+      for record in records:
+        if record["stage"] == "parse":
+          record["stage"] = loadStage
+      debateRecords.extend(records)
+      if t is None:
+        continue
+      embedded = None
+      if embed is not None:
+        try:
+          with measureDebate(debateRecords, kialoUrlId, "mining", traceMemory) as record:
+            embedded = embedTreeArguments(t, embed)
+            k = nbMinedPairs(len(rows))
+            minedRows = minedSameTreeRows(t, embedded, kialoUrlId, d, k)
+            record["nodes"] = len(t)
+            record["pairs"] = len(minedRows)
+          rows = rows + minedRows
+        except Exception as e:
+          continue
+      if onDebate is not None:
+        onDebate(kialoUrlId, t)
+      yield from rows
+      if crossDebate is not None:
+        crossDebate.add(kialoUrlId, len(argumentIndices(t)), d)
+        continue
+      try:
+        if prev_d is not None and prev_t is not None:
+          with measureDebate(debateRecords, kialoUrlId, "diffTree", traceMemory) as record:
+            if embed is not None:
+              diffRows = minedDiffTreeRows(t, embedded, prev_t, prev_embedded, kialoUrlId, prev_kialoUrlId, d, prev_d, k)
+            else:
+              diffRows = diffTreeRows(t, prev_t, kialoUrlId, prev_kialoUrlId, d, prev_d, seed)
+            record["nodes"] = len(t) + len(prev_t)
+            record["pairs"] = len(diffRows)
+          yield from diffRows
+
+        prev_d = d
+        prev_kialoUrlId = kialoUrlId
+        prev_t = t
+        prev_embedded = embedded
+      except Exception as e:
+        continue
+
+    if crossDebate is not None:
+      # Only the number of arguments of each debate is kept meanwhile, the trees are loaded again one by one to read the arguments drawn.
+      # A failure is raised rather than skipped like the failure of a debate, as it would drop the neutral pairs between debates of the whole corpus
+      with measureDebate(debateRecords, "corpus", "crossDebate", traceMemory) as record:
+        samples = crossDebate.sample(math.ceil(crossDebate.nbArguments() * crossDebateRatio), rng=debateRng(seed, "corpus", "crossDebate"))
+        nodes = crossDebate.resolve(samples, lambda kialoUrlId: loadDebate(os.path.join(debatesFolderPath, kialoUrlId + ".txt")))
+        record["nodes"] = crossDebate.nbArguments()
+        record["pairs"] = 2 * len(samples)
+      yield from map(pair2Row, crossDebate.iterNeutralArgPairs(samples, nodes))
+  finally:
+    if pool:
+      pool.terminate()
+
+def generateChangedPairs(kialoUrlIds, manifest, plans, workers=1, report=None):
+  """Generate the pairs of the debates that were added or changed since the last incremental build, in the same order as `generatePairs`.
+  A debate is processed again when its file or tags changed. Its neutral pairs with the previous debate are also generated again when that previous debate is another one or changed.
+  The records of `manifest` are updated (but not saved) to describe the new build.
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates to process, with their kialoUrlId and tags
+      manifest (BuildManifest): Manifest of the last build, with the seed of the neutral pair sampling
+      plans (dict): Filled with, for each debate processed successfully, whether its stored pairs from the same tree ("keepSameTree") and with the previous debate ("keepDiffTree") are kept
+      workers (int, optional): Number of worker processes parsing the changed debates. Defaults to 1.
+      report (RunReport, optional): Report receiving the measurements and failures of each debate and stage. Defaults to None.
+
+  Yields:
+      dict: Each new row of the dataset, without similarity, with the kialoUrlId of the debate it belongs to ("owner")
+  """
+  seed = manifest.seed
+  traceMemory = report is not None and report.traceMemory
+  debateRecords = report.debates if report is not None else []
+  debates = []
+  for _, x in kialoUrlIds.iterrows():
+    debatePath = os.path.join(debatesFolderPath, x.kialoUrlId + ".txt")
+    contentHash = hashFile(debatePath) if os.path.exists(debatePath) else None
+    record = manifest.debates.get(x.kialoUrlId)
+    changed = record is None or record["hash"] != contentHash or record["tags"] != str(x.tags) \
+      or (record["status"] == "ok" and not os.path.exists(manifest.pairsPath(x.kialoUrlId)))
+    debates.append((debatePath, x.kialoUrlId, x.tags, contentHash, record, changed))
+
+  tasks = [(debatePath, kialoUrlId, d, seed, debateCachePath, True, traceMemory) for debatePath, kialoUrlId, d, _, _, changed in debates if changed]
+  records = {}
+  # kialoUrlId, hash, path, tags and tree (loaded when needed) of the previous debate
+  prev = None
+
+  pool = Pool(workers) if workers > 1 and tasks else None
+  try:
+    results = imapBounded(pool, parseDebatePairs, tasks, maxPending=4*workers) if pool else map(parseDebatePairs, tasks)
+
+    for debatePath, kialoUrlId, d, contentHash, record, changed in tqdm(debates):
+      t = None
+      if changed:
+        t, rows, debateStages = next(results)
+        debateRecords.extend(debateStages)
+        if t is None:
+          records[kialoUrlId] = {"hash": contentHash, "tags": str(d), "status": "failed"}
+          continue
+        for row in rows:
+          row["owner"] = kialoUrlId
+          yield row
+      elif record["status"] == "failed":
+        records[kialoUrlId] = record
+        continue
+
+      newPrev = prev is not None and (record is None or [record.get("prev"), record.get("prevHash"), record.get("prevTags")] != [prev[0], prev[1], str(prev[3])])
+      chainable = record["chainable"] if not changed and not newPrev else True
+      if prev is not None and (changed or newPrev):
+        try:
+          if t is None:
+            t = loadDebate(debatePath)
+          if prev[4] is None:
+            prev[4] = loadDebate(prev[2])
+          with measureDebate(debateRecords, kialoUrlId, "diffTree", traceMemory) as stats:
+            diffRows = diffTreeRows(t, prev[4], kialoUrlId, prev[0], d, prev[3], seed)
+            stats["nodes"] = len(t) + len(prev[4])
+            stats["pairs"] = len(diffRows)
+          for row in diffRows:
+            row["owner"] = kialoUrlId
+            yield row
+        except Exception as e:
+          chainable = False
+
+      records[kialoUrlId] = {
+        "hash"      : contentHash,
+        "tags"      : str(d),
+        "status"    : "ok",
+        "prev"      : prev[0] if prev is not None else None,
+        "prevHash"  : prev[1] if prev is not None else None,
+        "prevTags"  : str(prev[3]) if prev is not None else None,
+        "chainable" : chainable,
+      }
+      plans[kialoUrlId] = {"keepSameTree": not changed, "keepDiffTree": not changed and not newPrev}
+      # Like in `generatePairs`, a debate whose neutral pairs with the previous one failed is not paired with the next one
+      if chainable:
+        prev = [kialoUrlId, contentHash, debatePath, d, t]
+  finally:
+    if pool:
+      pool.terminate()
+
+  for kialoUrlId in set(manifest.debates) - set(records):
+    manifest.remove(kialoUrlId)
+  manifest.debates = records
+
+def mergeDebatePairs(manifest, plans, scoredPairs):
+  """Merge the new scored pairs of each debate with the pairs it keeps from the last build, and store them.
+
+  Args:
+      manifest (BuildManifest): Manifest of the build, see `generateChangedPairs`
+      plans (dict): Pairs kept by each debate, see `generateChangedPairs`
+      scoredPairs (Iterable[pd.DataFrame]): New pairs with their similarity and owner, in the order they were generated
+  """
+  columns = PAIR_COLUMNS + ARGUMENT_REF_COLUMNS + ["similarity"]
+  for chunk in scoredPairs:
+    for owner, rows in chunk.groupby("owner", sort=False):
+      newPath = manifest.pairsPath(owner) + ".new"
+      rows[columns].to_csv(newPath, mode="a", header=not os.path.exists(newPath), index=False)
+
+  for kialoUrlId, plan in plans.items():
+    if plan["keepSameTree"] and plan["keepDiffTree"]:
+      continue
+    path = manifest.pairsPath(kialoUrlId)
+    parts = []
+    if plan["keepSameTree"]:
+      stored = readStoredPairs(path)
+      parts.append(stored[stored["sameTree"] == True])
+    if os.path.exists(path + ".new"):
+      parts.append(readStoredPairs(path + ".new"))
+    pairs = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    pairs[columns].to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    if os.path.exists(path + ".new"):
+      os.remove(path + ".new")
+
+def readStoredPairs(path):
+  """Read all the pairs stored for a debate by an incremental build."""
+  return pd.concat(readCsvInChunks(path, chunkSize, dtype={c: str for c in ARGUMENT_REF_COLUMNS}), ignore_index=True)
+
+def iterStoredPairs(kialoUrlIds, manifest, onDebate=None):
+  """Read the stored pairs of every debate of an incremental build, in the order of `kialoUrlIds`.
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates of the build, with their kialoUrlId
+      manifest (BuildManifest): Manifest of the build
+      onDebate (callable, optional): Called with the kialoUrlId and the tree of each debate before its pairs are read. Defaults to None.
+
+  Yields:
+      pd.DataFrame: Chunks of pairs with their similarity
+  """
+  for kialoUrlId in kialoUrlIds.kialoUrlId:
+    if manifest.debates[kialoUrlId]["status"] != "ok":
+      continue
+    if onDebate is not None:
+      onDebate(kialoUrlId, loadDebate(os.path.join(debatesFolderPath, kialoUrlId + ".txt")))
+    for chunk in readCsvInChunks(manifest.pairsPath(kialoUrlId), chunkSize, dtype={c: str for c in ARGUMENT_REF_COLUMNS}):
+      if not chunk.empty:
+        yield chunk
+
+def scorePairs(unscoredPath, model, cache=None):
+  """Compute the cosine similarity of every pair of `unscoredPath`.
+  The file is read by chunks, each unique argument is encoded once.
+
+  Args:
+      unscoredPath (os.path): CSV file of pairs without similarity
+      model (SentenceTransformer): Encoder of the arguments, see `loadEncoder`
+      cache (EmbeddingCache, optional): Cache of previously computed embeddings. Defaults to None.
+
+  Yields:
+      pd.DataFrame: Each chunk of pairs, with their similarity
+  """
+  text2Idx = {}
+  nbPairs = 0
+  for chunk in readCsvInChunks(unscoredPath, chunkSize):
+    for text in chain(chunk['argSrc'], chunk['argTrg']):
+      text2Idx.setdefault(text, len(text2Idx))
+    nbPairs += len(chunk)
+  print(f"Found {len(text2Idx)} unique arguments for {nbPairs} pairs ({2*nbPairs - len(text2Idx)} encodes saved)")
+
+  if not text2Idx:
+    return
+  embeddings, rows = embedUniqueArgs(list(text2Idx), model, batchSize=embeddingBatchSize, cache=cache, checkpointSize=embeddingCheckpointSize)
+
+  for chunk in readCsvInChunks(unscoredPath, chunkSize, dtype={c: str for c in ARGUMENT_REF_COLUMNS + ["owner"]}):
+    if chunk.empty:
+      continue
+    srcIdx = rows[np.fromiter((text2Idx[x] for x in chunk['argSrc']), dtype=np.int64, count=len(chunk))]
+    trgIdx = rows[np.fromiter((text2Idx[x] for x in chunk['argTrg']), dtype=np.int64, count=len(chunk))]
+    chunk['similarity'] = pairwiseCosineSimilarity(embeddings, srcIdx, trgIdx)
+    yield chunk
+
+def writeDataset(scoredPairs, nbArgumentPairs=None, columnar=None, outputFormat="csv", raw=True, exportCsvFiles=False):
+  """Select the final dataset from the scored pairs and write it, along with the raw dataset.
+  The neutral pairs are selected straight from the scored pairs, without sorting them all (see tool/pairSelection.py).
+
+  Args:
+      scoredPairs (Iterable[pd.DataFrame]): Chunks of pairs with their similarity
+      nbArgumentPairs (int, optional): Number of support and attack pairs, if known upfront. Defaults to None.
+      columnar (ColumnarDatasetBuilder, optional): Builder holding the arguments of the debates, to write the dataset in a columnar format. Defaults to None (CSV files).
+      outputFormat (str, optional): Columnar format of the dataset, see `FORMATS`. Defaults to "csv".
+      raw (bool, optional): Whether to write kialoPairsRaw, the scored pairs before the selection of neutral pairs. Defaults to True.
+      exportCsvFiles (bool, optional): With a columnar format, whether to also export the pairs tables to CSV files. Defaults to False.
+
+  Returns:
+      pd.DataFrame: Pairs of the final dataset
+  """
+  if columnar is None:
+    if raw:
+      scoredPairs = teeCsvChunks(scoredPairs, os.path.join(outputPath, "kialoPairsRaw.csv"), columns=PAIR_COLUMNS + ["similarity"])
+    kp_final = selectPairChunks(scoredPairs, nbArgumentPairs)
+
+    # Save the final Dataset
+    kp_final.reindex(columns=PAIR_COLUMNS + ["similarity"]).to_csv(os.path.join(outputPath, "kialoPairs.csv"), index=False)
+    return kp_final
+
+  # Arguments are stored once in their own table, the pairs only hold their ids
+  for chunk in scoredPairs:
+    columnar.addPairs(chunk)
+  writeTable(columnar.arguments(), tablePath(outputPath, ARGUMENTS_TABLE, outputFormat), outputFormat)
+
+  kp = columnar.pairs()
+  if raw:
+    writeTable(kp, tablePath(outputPath, "kialoPairsRaw", outputFormat), outputFormat)
+  kp_final = selectPairs(kp)
+
+  # Save the final Dataset
+  writeTable(kp_final, tablePath(outputPath, "kialoPairs", outputFormat), outputFormat)
+
+  if exportCsvFiles:
+    for name in ["kialoPairsRaw", "kialoPairs"] if raw else ["kialoPairs"]:
+      exportCsv(outputPath, name, os.path.join(outputPath, name + ".csv"), outputFormat, chunkSize)
+  return kp_final
+
+def runParseStage(kialoUrlIds, checkpoints, report, workers=1):
+  """Parse every debate into the debate cache, from which the pair stage then loads their trees.
+  Without debate cache (`debateCachePath` set to None), there is nothing to keep: the stage only writes its checkpoint and the pair stage parses the debates.
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates to process, with their kialoUrlId
+      checkpoints (StageCheckpoints): Checkpoints of the run
+      report (RunReport): Report receiving the measurements and failures of each debate
+      workers (int, optional): Number of worker processes. Defaults to 1.
+
+  Returns:
+      dict: Checkpoint of the stage
+  """
+  checkpoints.invalidate("parse")
+  failed = []
+  if debateCachePath:
+    tasks = [(os.path.join(debatesFolderPath, kialoUrlId + ".txt"), kialoUrlId, debateCachePath, report.traceMemory) for kialoUrlId in kialoUrlIds.kialoUrlId]
+    pool = Pool(workers) if workers > 1 else None
+    try:
+      with report.stage("parse") as stage:
+        results = pool.imap(parseDebate, tasks) if pool else map(parseDebate, tasks)
+        for (_, kialoUrlId, _, _), (parsed, records) in tqdm(zip(tasks, results), total=len(tasks)):
+          report.debates.extend(records)
+          if not parsed:
+            failed.append(kialoUrlId)
+        stage["debates"] = len(tasks) - len(failed)
+    finally:
+      if pool:
+        pool.terminate()
+  return checkpoints.save("parse", parserVersion=PARSER_VERSION, debateCachePath=debateCachePath, debates=len(kialoUrlIds) - len(failed), failed=failed)
+
+def runDedupStage(kialoUrlIds, checkpoints, report, threshold=dedupThreshold):
+  """Cluster the near-duplicate arguments of all debates, within and across debates, into `nearDuplicates.csv` inside the checkpoints folder (see tool/nearDuplicates.py).
+  The arguments of each debate are hashed into MinHash signatures of their shingles, and an LSH index groups the similar signatures, so the stage runs in roughly linear time in the number of arguments.
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates to process, with their kialoUrlId
+      checkpoints (StageCheckpoints): Checkpoints of the run
+      report (RunReport): Report receiving the measurements and failures of each debate
+      threshold (float, optional): Estimated Jaccard similarity above which two arguments are near duplicates. Defaults to `dedupThreshold`.
+
+  Returns:
+      dict: Checkpoint of the stage, with the number of arguments indexed, of clusters and of arguments that are not the first argument of their cluster
+  """
+  checkpoints.invalidate("dedup")
+  parse = checkpoints.load("parse")
+  duplicatesPath = checkpoints.artifactPath("nearDuplicates.csv")
+  index = NearDuplicateIndex(threshold, numPerm=dedupNumPerm, shingleSize=dedupShingleSize)
+  with report.stage("dedup") as stage:
+    for kialoUrlId in tqdm(kialoUrlIds.kialoUrlId):
+      try:
+        with measureDebate(report.debates, kialoUrlId, "dedup", report.traceMemory) as record:
+          t = loadDebate(os.path.join(debatesFolderPath, kialoUrlId + ".txt"))
+          nbIndexed = len(index)
+          index.addTree(kialoUrlId, t)
+          record["nodes"] = len(index) - nbIndexed
+      except Exception as e:
+        continue
+    duplicates = index.clusters()
+    duplicates.save(duplicatesPath)
+    stage["arguments"] = len(index)
+    stage["duplicates"] = duplicates.nbDuplicates()
+  print(f"Found {duplicates.nbDuplicates()} near-duplicate arguments in {len(duplicates)} clusters, out of {len(index)} arguments")
+  return checkpoints.save("dedup", parseId=parse["id"] if parse is not None else None, parserVersion=PARSER_VERSION, threshold=threshold, shingleSize=dedupShingleSize, numPerm=dedupNumPerm,
+                          duplicatesPath=duplicatesPath, arguments=len(index), clusters=len(duplicates), duplicates=duplicates.nbDuplicates())
+
+def runPairStage(kialoUrlIds, checkpoints, report, workers=1, seed=None, embed=None, crossDebate="previous", dedup=None):
+  """Generate the pairs of every debate into `kialoPairsUnscored.csv`, the artifact of the stage.
+  The arguments are cleaned up once when their debate is parsed: sources like `[124]` and page artifacts like `(p. 12)` are removed,
+  and "See" arguments, which only repeat another argument, are flagged and never paired (see tool/pairCleanup.py).
+
+  Args:
+      kialoUrlIds (pd.DataFrame): Debates to process, with their kialoUrlId and tags
+      checkpoints (StageCheckpoints): Checkpoints of the run
+      report (RunReport): Report receiving the measurements and failures of each debate
+      workers (int, optional): Number of worker processes. Defaults to 1.
+      seed (int, optional): Seed of the neutral pair sampling, recorded in the checkpoint. Defaults to None (random seed).
+      embed (callable, optional): Returns the embeddings of a list of texts, to mine the neutral pairs (see `generatePairs`). Defaults to None.
+      crossDebate (str, optional): Sampling of the neutral pairs between debates, see `crossDebateSampling`. Defaults to "previous".
+      dedup (dict, optional): Mode ("skip" or "collapse", see `DuplicateFilter`) and checkpoint of the dedup stage, to drop the pairs repeating another one up to near-duplicate arguments. Defaults to None.
+
+  Returns:
+      dict: Checkpoint of the stage, with the number of pairs of each relation and the debates processed successfully, in order
+  """
+  checkpoints.invalidate("pair")
+  if seed is None:
+    seed = random.randrange(2**32)
+  parse = checkpoints.load("parse")
+  parsed = parse is not None and parse["parserVersion"] == PARSER_VERSION and parse["debateCachePath"] == debateCachePath and debateCachePath is not None
+  unscoredPath = os.path.join(outputPath, "kialoPairsUnscored.csv")
+  relationCounts, debates = {}, []
+  duplicateFilter = DuplicateFilter(NearDuplicates.load(dedup["checkpoint"]["duplicatesPath"]), dedup["mode"]) if dedup is not None else None
+  with report.stage("pair") as stage:
+    sampler = CrossDebateSampler(stratify=crossDebate == "tags") if crossDebate != "previous" else None
+    pairs = generatePairs(kialoUrlIds, workers=workers, seed=seed, onDebate=lambda kialoUrlId, t: debates.append(kialoUrlId), embed=embed, report=report, loadStage="load" if parsed else "parse", crossDebate=sampler)
+    if duplicateFilter is not None:
+      pairs = duplicateFilter.filter(pairs)
+    nbPairs = writeCsvInChunks(countRelations(pairs, relationCounts), unscoredPath, chunkSize, columns=PAIR_COLUMNS + ARGUMENT_REF_COLUMNS)
+    stage["pairs"] = nbPairs
+    if duplicateFilter is not None:
+      stage.update({name: value for name, value in duplicateFilter.stats().items() if name in ["pairsSaved", "embeddingsSaved"]})
+  print(f"Generated {nbPairs} pairs")
+  dedupStats = None
+  if duplicateFilter is not None:
+    dedupStats = duplicateFilter.stats()
+    print(f"Near duplicates: {dedupStats['pairsSaved']} pairs dropped ({dedupStats['duplicatePairs']} repeated pairs, {dedupStats['selfPairs']} pairs of near duplicates), {dedupStats['embeddingsSaved']} fewer unique arguments to embed")
+  return checkpoints.save("pair", parseId=parse["id"] if parse is not None else None, parserVersion=PARSER_VERSION, seed=seed, neutralMining=embed is not None, crossDebate=crossDebate,
+                          dedup=dedup["mode"] if dedup is not None else "off", dedupId=dedup["checkpoint"]["id"] if dedup is not None else None, dedupStats=dedupStats,
+                          unscoredPath=unscoredPath, pairs=nbPairs, relations=relationCounts, debates=debates)
+
+def runEmbedStage(checkpoints, pair, model, report, cache=None, encoder=modelName):
+  """Compute the cosine similarity of every pair generated by the pair stage, into `similarities.npy` (one float32 per pair, in the order of `kialoPairsUnscored.csv`) inside the checkpoints folder.
+  With the embedding cache, the embeddings are flushed to the cache every `embeddingCheckpointSize` arguments, so an interrupted stage only encodes again the arguments since the last flush when it is run again.
+
+  Args:
+      checkpoints (StageCheckpoints): Checkpoints of the run
+      pair (dict): Checkpoint of the pair stage
+      model (SentenceTransformer): Encoder of the arguments, see `loadEncoder`
+      report (RunReport): Report receiving the measurements of the stage
+      cache (EmbeddingCache, optional): Cache of previously computed embeddings. Defaults to None.
+      encoder (str, optional): Name of the encoder recorded in the checkpoint, see `encoderName`. Defaults to `modelName`.
+
+  Returns:
+      dict: Checkpoint of the stage
+  """
+  checkpoints.invalidate("embed")
+  similaritiesPath = checkpoints.artifactPath("similarities.npy")
+  with report.stage("embed") as stage:
+    similarities = np.lib.format.open_memmap(similaritiesPath + ".tmp", mode="w+", dtype=np.float32, shape=(pair["pairs"],))
+    nbPairs = 0
+    for chunk in scorePairs(pair["unscoredPath"], model, cache=cache):
+      similarities[nbPairs:nbPairs+len(chunk)] = chunk["similarity"].to_numpy()
+      nbPairs += len(chunk)
+    if nbPairs != pair["pairs"]:
+      raise ValueError(f"Expected {pair['pairs']} pairs in {pair['unscoredPath']}, found {nbPairs}. Run the pair stage again.")
+    similarities.flush()
+    del similarities
+    os.replace(similaritiesPath + ".tmp", similaritiesPath)
+    stage["pairs"] = nbPairs
+  return checkpoints.save("embed", pairId=pair["id"], encoder=encoder, similaritiesPath=similaritiesPath, pairs=nbPairs)
+
+def iterScoredPairs(pair, embed):
+  """Read the pairs generated by the pair stage by chunks, with the similarities computed by the embed stage.
+
+  Args:
+      pair (dict): Checkpoint of the pair stage
+      embed (dict): Checkpoint of the embed stage
+
+  Yields:
+      pd.DataFrame: Chunks of pairs with their similarity
+  """
+  similarities = np.load(embed["similaritiesPath"], mmap_mode="r")
+  start = 0
+  for chunk in readCsvInChunks(pair["unscoredPath"], chunkSize, dtype={c: str for c in ARGUMENT_REF_COLUMNS}):
+    if chunk.empty:
+      continue
+    chunk["similarity"] = np.array(similarities[start:start+len(chunk)])
+    start += len(chunk)
+    yield chunk
+
+def runSelectStage(checkpoints, pair, embed, report, outputFormat="csv", raw=True, exportCsvFiles=False):
+  """Select the final dataset from the scored pairs and write it (see `writeDataset`).
+
+  Args:
+      checkpoints (StageCheckpoints): Checkpoints of the run
+      pair (dict): Checkpoint of the pair stage
+      embed (dict): Checkpoint of the embed stage
+      report (RunReport): Report receiving the measurements of the stage
+      outputFormat (str, optional): Output format, "csv" or a columnar format (see `FORMATS`). Defaults to "csv".
+      raw (bool, optional): Whether to write kialoPairsRaw. Defaults to True.
+      exportCsvFiles (bool, optional): With a columnar format, whether to also export the pairs tables to CSV files. Defaults to False.
+
+  Returns:
+      dict: Checkpoint of the stage
+  """
+  checkpoints.invalidate("select")
+  with report.stage("select") as stage:
+    columnar = None
+    if outputFormat != "csv":
+      columnar = ColumnarDatasetBuilder()
+      for kialoUrlId in pair["debates"]:
+        columnar.addDebate(kialoUrlId, loadDebate(os.path.join(debatesFolderPath, kialoUrlId + ".txt")))
+      if pair.get("dedup") == "collapse":
+        # Collapsed arguments were embedded with the text of their cluster, which the arguments table holds as well
+        dedup = checkpoints.require("dedup")
+        if dedup["id"] != pair["dedupId"]:
+          raise ValueError("The pairs were not generated from the current checkpoint of the dedup stage. Run the pair stage again.")
+        columnar.replaceTexts(NearDuplicates.load(dedup["duplicatesPath"]).collapsedTexts())
+    nbArgumentPairs = pair["relations"].get("support", 0) + pair["relations"].get("attack", 0)
+    kp_final = writeDataset(iterScoredPairs(pair, embed), nbArgumentPairs, columnar, outputFormat, raw, exportCsvFiles)
+    stage["pairs"] = len(kp_final)
+  return checkpoints.save("select", embedId=embed["id"], format=outputFormat, raw=raw, pairs=len(kp_final))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Parse the Kialo debates and generate the TK-RbAM dataset.",
+                                   epilog=f"Stages, in order: {', '.join(STAGES)}. Each stage writes a checkpoint, so that a run can resume from a stage with --from or rerun a single stage with --only.")
+  parser.add_argument("--workers", type=int, default=1, help="number of processes used to parse debates and generate pairs")
+  parser.add_argument("--seed", type=int, default=None, help="seed for the neutral pair sampling, the output is identical for any number of workers")
+  parser.add_argument("--chunk-size", type=int, default=chunkSize, help="number of pairs held in memory at once while writing and reading the pair files")
+  parser.add_argument("--format", choices=["csv"] + list(FORMATS), default="csv", help="output format of the dataset: CSV files, or an arguments table and pairs tables referencing arguments by id (needs pyarrow)")
+  parser.add_argument("--export-csv", action="store_true", help="with a columnar format, also export the pairs tables to CSV files")
+  parser.add_argument("--no-raw", action="store_true", help="do not write kialoPairsRaw, the scored pairs before the selection of neutral pairs")
+  parser.add_argument("--incremental", action="store_true", help="only process the debates added, removed or changed since the last incremental build, and reuse the stored pairs and similarities of the others")
+  parser.add_argument("--neutral-mining", action="store_true", help="mine the most dissimilar neutral pairs of each debate from the embeddings of its arguments, instead of sampling them at random")
+  parser.add_argument("--cross-debate", choices=["previous", "corpus", "tags"], default=crossDebateSampling, help="neutral pairs between debates: between each debate and the previous one, drawn across all debates, or drawn across all debates and balanced across pairs of tags")
+  parser.add_argument("--dedup", choices=["off"] + DEDUP_MODES, default=None, help="cluster near-duplicate arguments (dedup stage) and drop the pairs repeating another one up to near duplicates, also replacing each argument by the representative of its cluster in its debate with collapse (off by default)")
+  parser.add_argument("--dedup-threshold", type=float, default=dedupThreshold, help="estimated Jaccard similarity of the character shingles above which two arguments are near duplicates")
+  parser.add_argument("--encoder", choices=ENCODER_BACKENDS, default=encoderBackend, help="backend running the model on CPU: fp32 torch, torch with int8 dynamically quantized linear layers, or ONNX runtime")
+  parser.add_argument("--encoder-workers", type=int, default=encoderWorkers, help="number of processes encoding the arguments, each with its own copy of the model")
+  parser.add_argument("--max-seq-length", type=int, default=encoderMaxSeqLength, help="number of tokens the arguments are truncated to when encoded")
+  parser.add_argument("--trace-memory", action="store_true", help="measure the peak memory of each stage of each debate in the run report (slower)")
+  parser.add_argument("--profile", choices=STAGES, default=None, help="profile a stage with cProfile, the statistics are written next to the run report")
+  stageGroup = parser.add_mutually_exclusive_group()
+  stageGroup.add_argument("--from", dest="from_stage", choices=STAGES, default=None, help="run the pipeline from this stage, resuming from the checkpoints of the previous stages")
+  stageGroup.add_argument("--only", choices=STAGES, default=None, help="only run this stage, from the checkpoints of the previous stages")
+  parser.add_argument("--to", dest="to_stage", choices=STAGES, default=None, help="stop the pipeline after this stage, e.g. --to pair only parses the debates and generates the pairs, without loading the model")
+  args = parser.parse_args()
+  if args.neutral_mining and args.incremental:
+    parser.error("--neutral-mining cannot be combined with --incremental")
+  if args.incremental and args.cross_debate != "previous":
+    parser.error("--cross-debate corpus and tags cannot be combined with --incremental")
+  if args.incremental and (args.from_stage or args.only or args.to_stage):
+    parser.error("--from, --only and --to cannot be combined with --incremental")
+  if args.only and args.to_stage:
+    parser.error("--to cannot be combined with --only")
+  if args.from_stage and args.to_stage and STAGES.index(args.to_stage) < STAGES.index(args.from_stage):
+    parser.error("--to must not come before --from")
+  if args.incremental and args.dedup not in [None, "off"]:
+    parser.error("--dedup cannot be combined with --incremental")
+  dedupMode = args.dedup or "off"
+  chunkSize = args.chunk_size
+  stages = [args.only] if args.only else STAGES[STAGES.index(args.from_stage) if args.from_stage else 0:STAGES.index(args.to_stage) + 1 if args.to_stage else len(STAGES)]
+
+  for path in [outputPath, urlIdPath, debatesFolderPath]:
+    if not os.path.exists(path):
+      if path == outputPath:
+        os.makedirs(path)
+      else:
+        raise FileNotFoundError(f"File or folder not found at {path}. Please check the path and try again.")
+
+  kialoUrlIds = pd.read_csv(urlIdPath, index_col=0)
+  # Time, memory, nodes, pairs and failures of each stage of each debate, and totals of the pipeline stages
+  report = RunReport(traceMemory=args.trace_memory, profileStage=args.profile)
+
+  # Compute Cosine similarity from embeddings
+  # The intuition being that neutral arguments would tend to have orthogonal embeddings, and thus a cosine similarity of 0.
+  # Each unique argument is encoded once (or read from the cache), then the similarities are computed chunk by chunk
+  # The embeddings of another backend or truncation differ slightly, they are cached and checkpointed under the name of the encoder
+  encoder = encoderName(modelName, args.encoder, args.max_seq_length)
+  # The model (and torch) is only loaded by the stages encoding arguments, so that e.g. `--to pair` starts fast
+  loadModel = lambda: loadEncoder(modelName, backend=args.encoder, maxSeqLength=args.max_seq_length, workers=args.encoder_workers)
+  needsModel = args.incremental or "embed" in stages or ("pair" in stages and args.neutral_mining)
+  embeddingCache = EmbeddingCache(embeddingCachePath, encoder, maxEntries=embeddingCacheMaxEntries) if embeddingCachePath and needsModel else None
+
+  if args.incremental:
+    # Only the pairs of added or changed debates are generated and scored, then merged with the stored pairs of the other debates
+    unscoredPath = os.path.join(outputPath, "kialoPairsUnscored.csv")
+    manifest = BuildManifest(incrementalBuildPath)
+    seed = args.seed if args.seed is not None else manifest.seed if manifest.seed is not None else random.randrange(2**32)
+    if not manifest.isCompatible(seed, encoder):
+      manifest.reset(seed, encoder)
+    plans = {}
+    with report.stage("pair") as stage:
+      pairs = generateChangedPairs(kialoUrlIds, manifest, plans, workers=args.workers, report=report)
+      nbPairs = writeCsvInChunks(pairs, unscoredPath, chunkSize, columns=PAIR_COLUMNS + ARGUMENT_REF_COLUMNS + ["owner"])
+      stage["pairs"] = nbPairs
+    nbUpdated = sum(not (plan["keepSameTree"] and plan["keepDiffTree"]) for plan in plans.values())
+    print(f"Generated {nbPairs} new pairs, updated {nbUpdated} of {len(plans)} debates")
+
+    manifest.dirty = True
+    manifest.save()
+    model = loadModel() if nbPairs else None
+    mergeDebatePairs(manifest, plans, report.timedIter(scorePairs(unscoredPath, model, cache=embeddingCache), "embed", lambda chunk: {"pairs": len(chunk)}))
+    manifest.dirty = False
+    manifest.save()
+
+    # # Post processing
+    # The idea here is to keep only the pairs of neutral arguments that are most neutral, by using the computed Cosine similarity between their embeddings.
+    with report.stage("select") as stage:
+      columnar = ColumnarDatasetBuilder() if args.format != "csv" else None
+      scoredPairs = iterStoredPairs(kialoUrlIds, manifest, onDebate=columnar.addDebate if columnar is not None else None)
+      kp_final = writeDataset(scoredPairs, None, columnar, args.format, not args.no_raw, args.export_csv)
+      stage["pairs"] = len(kp_final)
+  else:
+    # Each stage writes a checkpoint once it completed, the following stages resume from it (see tool/stageCheckpoints.py)
+    checkpoints = StageCheckpoints(checkpointsPath)
+    model = loadModel() if needsModel else None
+
+    if "parse" in stages:
+      runParseStage(kialoUrlIds, checkpoints, report, workers=args.workers)
+    # Near duplicates are only clustered when they are dropped from the pairs, or when the stage is run alone
+    if "dedup" in stages and (dedupMode != "off" or args.only == "dedup"):
+      dedupCheckpoint = runDedupStage(kialoUrlIds, checkpoints, report, threshold=args.dedup_threshold)
+    elif "pair" in stages and dedupMode != "off":
+      parseCheckpoint = checkpoints.load("parse")
+      dedupCheckpoint = checkpoints.require("dedup", previous=parseCheckpoint, parserVersion=PARSER_VERSION,
+                                            threshold=args.dedup_threshold, shingleSize=dedupShingleSize, numPerm=dedupNumPerm)
+    if "pair" in stages:
+      # Arguments embedded to mine the neutral pairs are cached, so they are not encoded again when the pairs are scored.
+      # The cache is flushed every `embeddingCheckpointSize` new embeddings and once the stage is done, rather than after each debate
+      embed = (lambda texts: embedArguments(texts, model, batchSize=embeddingBatchSize, cache=embeddingCache, checkpointSize=embeddingCheckpointSize)) if args.neutral_mining else None
+      dedup = {"mode": dedupMode, "checkpoint": dedupCheckpoint} if dedupMode != "off" else None
+      pairCheckpoint = runPairStage(kialoUrlIds, checkpoints, report, workers=args.workers, seed=args.seed, embed=embed, crossDebate=args.cross_debate, dedup=dedup)
+      if embed is not None and embeddingCache is not None:
+        embeddingCache.flush()
+    elif "embed" in stages or "select" in stages:
+      # Options given explicitly must match the ones the pairs were generated with
+      options = {"seed": args.seed, "neutralMining": args.neutral_mining or None, "crossDebate": args.cross_debate if args.cross_debate != crossDebateSampling else None, "dedup": args.dedup}
+      # The pairs must also come from the current checkpoints of the parse and dedup stages, which another run of these stages replaces
+      parseCheckpoint = checkpoints.load("parse")
+      pairCheckpoint = checkpoints.require("pair", previous=parseCheckpoint, parserVersion=PARSER_VERSION, **{name: value for name, value in options.items() if value is not None})
+      if pairCheckpoint.get("dedup", "off") != "off":
+        checkpoints.require("pair", previous=checkpoints.require("dedup", previous=parseCheckpoint))
+    if "embed" in stages:
+      embedCheckpoint = runEmbedStage(checkpoints, pairCheckpoint, model, report, cache=embeddingCache, encoder=encoder)
+    elif "select" in stages:
+      embedCheckpoint = checkpoints.require("embed", previous=pairCheckpoint, encoder=encoder)
+
+    # # Post processing
+    # The idea here is to keep only the pairs of neutral arguments that are most neutral, by using the computed Cosine similarity between their embeddings.
+    if "select" in stages:
+      runSelectStage(checkpoints, pairCheckpoint, embedCheckpoint, report, args.format, not args.no_raw, args.export_csv)
+
+  if isinstance(model, EncodePool):
+    model.close()
+
+  if runReportPath:
+    reportPath = report.save(runReportPath, options=vars(args))
+    print(report.summary())
+    print(f"Run report written to {reportPath}")
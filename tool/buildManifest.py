@@ -0,0 +1,71 @@
+import os, json
+
+MANIFEST_VERSION = 1
+
+class BuildManifest:
+    """Manifest of an incremental build of the dataset, stored in `folderPath` along with the scored pairs of each debate (`pairs/<kialoUrlId>.csv`).
+
+    For each debate, the manifest records the hash of its file, its tags, whether it could be processed, and the debate (and its hash) it was paired with for the neutral pairs between debates.
+    A debate whose record still matches the current state keeps its stored pairs, the others are processed again.
+    The whole build depends on the seed of the neutral pair sampling and on the model computing the similarities, changing either starts a new build.
+    """
+
+    def __init__(self, folderPath : os.path):
+        """Open (or create) the manifest in `folderPath`.
+
+        Args:
+            folderPath (os.path): Folder of the incremental build
+        """
+        self.folderPath = folderPath
+        self.path = os.path.join(folderPath, "manifest.json")
+        self.pairsFolderPath = os.path.join(folderPath, "pairs")
+        os.makedirs(self.pairsFolderPath, exist_ok=True)
+
+        self.seed = None
+        self.modelName = None
+        self.debates = {}
+        # Set while the stored pairs are being updated, an interrupted update makes the next build start over
+        self.dirty = False
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+            if manifest["version"] == MANIFEST_VERSION:
+                self.seed = manifest["seed"]
+                self.modelName = manifest["modelName"]
+                self.debates = manifest["debates"]
+                self.dirty = manifest["dirty"]
+
+    def pairsPath(self, kialoUrlId : str) -> os.path:
+        """Path of the scored pairs of a debate."""
+        return os.path.join(self.pairsFolderPath, kialoUrlId + ".csv")
+
+    def isCompatible(self, seed : int, modelName : str) -> bool:
+        """Whether the stored pairs were built with the same seed and model and were completely written."""
+        return not self.dirty and self.seed == seed and self.modelName == modelName
+
+    def reset(self, seed : int, modelName : str):
+        """Forget every debate and delete all stored pairs, including those left by an interrupted build, to start a new build with `seed` and `modelName`."""
+        self.debates = {}
+        for fileName in os.listdir(self.pairsFolderPath):
+            os.remove(os.path.join(self.pairsFolderPath, fileName))
+        self.seed = seed
+        self.modelName = modelName
+        self.dirty = False
+
+    def remove(self, kialoUrlId : str):
+        """Forget a debate and delete its stored pairs."""
+        self.debates.pop(kialoUrlId, None)
+        if os.path.exists(self.pairsPath(kialoUrlId)):
+            os.remove(self.pairsPath(kialoUrlId))
+
+    def save(self):
+        """Write the manifest, through a temporary file so that it is never left half written."""
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({
+                "version"   : MANIFEST_VERSION,
+                "seed"      : self.seed,
+                "modelName" : self.modelName,
+                "dirty"     : self.dirty,
+                "debates"   : self.debates,
+            }, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
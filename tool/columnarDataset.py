@@ -0,0 +1,164 @@
+import os
+import numpy as np
+import pandas as pd
+from tool.compactTree import STANCES
+from tool.pairStream import PAIR_COLUMNS, writeCsvChunks
+
+# Both formats are read and written through pandas, which needs the optional `pyarrow` package
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+RELATIONS = ["support", "attack", "neutral"]
+ARGUMENTS_TABLE = "kialoArguments"
+
+def tablePath(folderPath : os.path, name : str, format : str = "parquet") -> os.path:
+    """Path of the table `name` (e.g. "kialoPairs") in `folderPath`."""
+    return os.path.join(folderPath, name + FORMATS[format])
+
+def writeTable(df : pd.DataFrame, path : os.path, format : str = "parquet"):
+    """Write a table in a columnar format. The file is written next to `path` and only renamed once complete."""
+    tmpPath = path + ".tmp"
+    if format == "parquet":
+        df.to_parquet(tmpPath, index=False)
+    elif format == "arrow":
+        df.reset_index(drop=True).to_feather(tmpPath)
+    else:
+        raise ValueError(f"Unknown format {format}, expected one of {list(FORMATS)}")
+    os.replace(tmpPath, path)
+
+def readTable(path : os.path, format : str = "parquet", columns : list[str] = None) -> pd.DataFrame:
+    """Read a table written by `writeTable`, optionally only some of its columns."""
+    if format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    elif format == "arrow":
+        return pd.read_feather(path, columns=columns)
+    raise ValueError(f"Unknown format {format}, expected one of {list(FORMATS)}")
+
+class ColumnarDatasetBuilder:
+    """Build the two tables of the columnar dataset:
+    - the arguments table, with one row per argument of the debates: `id`, `text` (cleaned), `debate` (kialoUrlId), `node` (e.g. "1.2.3."), `level` and `stance`
+    - the pairs table, referencing the arguments by id: `srcId`, `trgId`, `topic` and `relation` (categorical), `sameTree` and `similarity` (float32)
+
+    Each argument text is stored once, whatever the number of pairs it appears in.
+    """
+
+    def __init__(self):
+        self._argIds = {}
+        self._texts, self._debates, self._nodes, self._levels, self._stances = [], [], [], [], []
+        self._pairChunks = []
+
+    def __len__(self):
+        return len(self._texts)
+
+    def addDebate(self, kialoUrlId : str, tree):
+        """Add the arguments of a debate, except its root and its "See" arguments, which are never part of a pair.
+
+        Args:
+            kialoUrlId (str): Identifier of the debate
+            tree (CompactTree): Parsed debate
+        """
+        for idx in range(1, len(tree)):
+            if tree.isSee[idx]:
+                continue
+            self._argIds[(kialoUrlId, tree.names[idx])] = len(self._texts)
+            self._texts.append(tree.cleanText(idx))
+            self._debates.append(kialoUrlId)
+            self._nodes.append(tree.names[idx])
+            self._levels.append(int(tree.level[idx]))
+            self._stances.append(STANCES[tree.stance[idx]])
+
+    def replaceTexts(self, texts):
+        """Replace the texts of some arguments, e.g. with the texts their pairs were embedded with when near duplicates are collapsed (see `NearDuplicates.collapsedTexts`).
+
+        Args:
+            texts (Iterable[tuple[str, str, str]]): Debate, node and new text of each argument, arguments of debates that were not added are ignored
+        """
+        for debate, node, text in texts:
+            argId = self._argIds.get((debate, node))
+            if argId is not None:
+                self._texts[argId] = text
+
+    def argumentIds(self, debates, nodes) -> np.ndarray:
+        """Ids of the arguments identified by their debate and node name."""
+        return np.fromiter((self._argIds[key] for key in zip(debates, nodes)), dtype=np.int32, count=len(debates))
+
+    def addPairs(self, chunk : pd.DataFrame):
+        """Add a chunk of scored pairs, with the columns of `PAIR_COLUMNS` and `ARGUMENT_REF_COLUMNS` and their similarity."""
+        self._pairChunks.append(pd.DataFrame({
+            "srcId"      : self.argumentIds(chunk["srcDebate"], chunk["srcNode"]),
+            "trgId"      : self.argumentIds(chunk["trgDebate"], chunk["trgNode"]),
+            "topic"      : pd.Categorical(chunk["topic"]),
+            "relation"   : pd.Categorical(chunk["relation"], categories=RELATIONS),
+            "sameTree"   : chunk["sameTree"].to_numpy(dtype=bool),
+            "similarity" : chunk["similarity"].to_numpy(dtype=np.float32),
+        }))
+
+    def arguments(self) -> pd.DataFrame:
+        """Arguments table."""
+        return pd.DataFrame({
+            "id"     : np.arange(len(self._texts), dtype=np.int32),
+            "text"   : self._texts,
+            "debate" : pd.Categorical(self._debates),
+            "node"   : self._nodes,
+            "level"  : np.array(self._levels, dtype=np.int16),
+            "stance" : pd.Categorical(self._stances, categories=STANCES),
+        })
+
+    def pairs(self) -> pd.DataFrame:
+        """Pairs table, in the order the chunks were added."""
+        if not self._pairChunks:
+            return pd.DataFrame({
+                "srcId"      : np.empty(0, dtype=np.int32),
+                "trgId"      : np.empty(0, dtype=np.int32),
+                "topic"      : pd.Categorical([]),
+                "relation"   : pd.Categorical([], categories=RELATIONS),
+                "sameTree"   : np.empty(0, dtype=bool),
+                "similarity" : np.empty(0, dtype=np.float32),
+            })
+        topics = pd.api.types.union_categoricals([chunk["topic"] for chunk in self._pairChunks])
+        pairs = pd.concat(self._pairChunks, ignore_index=True)
+        pairs["topic"] = topics
+        return pairs
+
+def readColumnarDataset(folderPath : os.path, name : str = "kialoPairs", format : str = "parquet") -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Read the arguments table and a pairs table of a columnar dataset.
+
+    Args:
+        folderPath (os.path): Folder of the dataset
+        name (str, optional): Name of the pairs table, "kialoPairs" or "kialoPairsRaw". Defaults to "kialoPairs".
+        format (str, optional): "parquet" or "arrow". Defaults to "parquet".
+
+    Returns:
+        tuple(pd.DataFrame, pd.DataFrame): Arguments and pairs tables. Row `i` of the arguments table is the argument of id `i`.
+    """
+    arguments = readTable(tablePath(folderPath, ARGUMENTS_TABLE, format), format)
+    pairs = readTable(tablePath(folderPath, name, format), format)
+    return arguments, pairs
+
+def exportCsv(folderPath : os.path, name : str, csvPath : os.path, format : str = "parquet", chunkSize : int = 100000) -> int:
+    """Export a pairs table of a columnar dataset to a CSV file with the texts of the arguments, as written by `processData.py` in CSV mode.
+
+    Args:
+        folderPath (os.path): Folder of the dataset
+        name (str): Name of the pairs table, "kialoPairs" or "kialoPairsRaw"
+        csvPath (os.path): Path of the CSV file
+        format (str, optional): "parquet" or "arrow". Defaults to "parquet".
+        chunkSize (int, optional): Number of rows converted at once. Defaults to 100000.
+
+    Returns:
+        int: Number of rows written
+    """
+    texts = readTable(tablePath(folderPath, ARGUMENTS_TABLE, format), format, columns=["text"])["text"].to_numpy()
+    pairs = readTable(tablePath(folderPath, name, format), format)
+
+    def chunks():
+        for start in range(0, len(pairs), chunkSize):
+            chunk = pairs.iloc[start:start+chunkSize]
+            yield pd.DataFrame({
+                "topic"      : chunk["topic"].to_numpy(),
+                "relation"   : chunk["relation"].to_numpy(),
+                "argSrc"     : texts[chunk["srcId"].to_numpy()],
+                "argTrg"     : texts[chunk["trgId"].to_numpy()],
+                "sameTree"   : chunk["sameTree"].to_numpy(),
+                "similarity" : chunk["similarity"].to_numpy(),
+            })
+
+    return writeCsvChunks(chunks(), csvPath, columns=PAIR_COLUMNS + ["similarity"])
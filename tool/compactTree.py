@@ -0,0 +1,293 @@
+import numpy as np
+
+STANCES = ("Pro", "Con")
+
+class CompactNode:
+    """Lightweight view on a node of a `CompactTree`.
+    Exposes the same attributes as the anytree nodes built by `rawKialo2Json`, so both can be used by the functions of `processTree`.
+    """
+    __slots__ = ("_tree", "_idx")
+
+    def __init__(self, tree, idx : int):
+        self._tree = tree
+        self._idx = idx
+
+    def __eq__(self, other):
+        return isinstance(other, CompactNode) and self._tree is other._tree and self._idx == other._idx
+
+    def __hash__(self):
+        return hash((id(self._tree), self._idx))
+
+    def __repr__(self):
+        return f"CompactNode('{self.name}')"
+
+    @property
+    def idx(self) -> int:
+        return self._idx
+
+    @property
+    def name(self) -> str:
+        return self._tree.names[self._idx]
+
+    @property
+    def tree(self) -> str:
+        return self._tree.names[self._idx]
+
+    @property
+    def parent(self):
+        parentIdx = self._tree.parent[self._idx]
+        return None if parentIdx < 0 else CompactNode(self._tree, int(parentIdx))
+
+    @property
+    def children(self) -> tuple:
+        return tuple(CompactNode(self._tree, int(x)) for x in self._tree.childrenIdx(self._idx))
+
+    @property
+    def level(self) -> int:
+        return int(self._tree.level[self._idx])
+
+    @property
+    def stance(self) -> str:
+        stance = self._tree.stance[self._idx]
+        return None if stance < 0 else STANCES[stance]
+
+    @property
+    def toneInput(self) -> str:
+        return self._tree.text(self._idx)
+
+    @property
+    def cleanInput(self) -> str:
+        return self._tree.cleanText(self._idx)
+
+    @property
+    def isSee(self) -> bool:
+        return bool(self._tree.isSee[self._idx])
+
+    @property
+    def subject(self) -> str:
+        return self._tree.subject
+
+    @property
+    def node_id(self):
+        if self._idx == 0:
+            return -1
+        return self._tree.subject.replace(" ", "_") + "_" + str(self._idx)
+
+class CompactTree:
+    """Argument tree stored in flat arrays rather than one object per node.
+
+    Node 0 is the root ("1."), the other nodes keep the order of the debate file. For each node, the arrays store:
+    - `parent`: index of the parent node (-1 for the root)
+    - `level`: level of the node, as computed by the parser
+    - `stance`: index in `STANCES` (-1 for the root)
+    - `branch`: index of the top-level argument the node descends from (-1 for the root)
+    - `textOffsets`: start of the node's text in the concatenated text of the debate
+    - `cleanOffsets`: start of the node's normalized text (without sources and page artifacts) in the concatenated normalized text
+    - `isSee`: whether the node is a "See" argument, only referring to another one
+
+    The subject is stored once for the whole tree. Like the dictionaries returned by `rawKialo2Json`, the tree can be indexed by node name (e.g. `tree['1.2.']`), which returns a `CompactNode`.
+    """
+    __slots__ = ("subject", "names", "name2Idx", "parent", "level", "stance", "branch", "textOffsets", "_text", "cleanOffsets", "_cleanText", "isSee",
+                 "childOffsets", "childIndices", "preorder", "postorder", "postorderPos", "subtreeSize")
+
+    def __init__(self, subject : str, arguments : list[dict]):
+        """Build the tree from the arguments parsed from a debate file.
+
+        Args:
+            subject (str): Subject of the debate
+            arguments (list[dict]): Parsed arguments, with their "Tree" position, "Level", "Stance", "ToneInput", "CleanInput" and "IsSee"
+        """
+        self.subject = subject
+        self.names = ["1."]
+        self.name2Idx = {"1.": 0}
+
+        nbNodes = len(arguments) + 1
+        parent, level, stance, branch = [-1], [0], [-1], [-1]
+        textOffsets, cleanOffsets = [0, 0], [0, 0]
+        texts, cleanTexts, isSee = [], [], [False]
+        for i, argument in enumerate(arguments, start=1):
+            idNode = argument["Tree"]
+            parentIdx = self.name2Idx[idNode[:idNode[:-1].rfind(".")+1]]
+            self.names.append(idNode)
+            self.name2Idx[idNode] = i
+            parent.append(parentIdx)
+            level.append(argument["Level"])
+            stance.append(STANCES.index(argument["Stance"]))
+            # Parents always come before their children in the file
+            branch.append(i if parentIdx == 0 else branch[parentIdx])
+            texts.append(argument["ToneInput"])
+            textOffsets.append(textOffsets[-1] + len(argument["ToneInput"]))
+            cleanTexts.append(argument["CleanInput"])
+            cleanOffsets.append(cleanOffsets[-1] + len(argument["CleanInput"]))
+            isSee.append(argument["IsSee"])
+
+        self.parent = np.array(parent, dtype=np.int32)
+        self.level = np.array(level, dtype=np.int16)
+        self.stance = np.array(stance, dtype=np.int8)
+        self.branch = np.array(branch, dtype=np.int32)
+        self._text = "".join(texts)
+        self.textOffsets = np.array(textOffsets, dtype=np.int64)
+        self._cleanText = "".join(cleanTexts)
+        self.cleanOffsets = np.array(cleanOffsets, dtype=np.int64)
+        self.isSee = np.array(isSee, dtype=bool)
+
+        # Children of each node, in file order, stored as contiguous slices of `childIndices`
+        self.childIndices = (np.argsort(self.parent[1:], kind="stable") + 1).astype(np.int32)
+        self.childOffsets = np.zeros(nbNodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent[1:], minlength=nbNodes), out=self.childOffsets[1:])
+
+        self._computeTraversals()
+
+    def _computeTraversals(self):
+        """Compute the pre-order and post-order of the nodes (same orders as anytree's PreOrderIter and PostOrderIter) and the size of each subtree, iteratively."""
+        nbNodes = len(self.names)
+        self.preorder = np.empty(nbNodes, dtype=np.int32)
+        self.postorder = np.empty(nbNodes, dtype=np.int32)
+        prePos, postPos = 0, 0
+        parent = self.parent.tolist()
+        childOffsets = self.childOffsets.tolist()
+        childIndices = self.childIndices.tolist()
+        subtreeSize = [1] * nbNodes
+        # Stack of (node, position of the next child to visit in childIndices)
+        stack = [(0, childOffsets[0])]
+        while stack:
+            node, nextChild = stack.pop()
+            if nextChild == childOffsets[node]:
+                self.preorder[prePos] = node
+                prePos += 1
+            if nextChild < childOffsets[node+1]:
+                stack.append((node, nextChild + 1))
+                child = childIndices[nextChild]
+                stack.append((child, childOffsets[child]))
+            else:
+                self.postorder[postPos] = node
+                postPos += 1
+                if node:
+                    subtreeSize[parent[node]] += subtreeSize[node]
+        self.subtreeSize = np.array(subtreeSize, dtype=np.int32)
+        self.postorderPos = np.empty(nbNodes, dtype=np.int32)
+        self.postorderPos[self.postorder] = np.arange(nbNodes, dtype=np.int32)
+
+    # Arrays of the tree, as stored by `toArrays`
+    ARRAY_FIELDS = ("parent", "level", "stance", "branch", "textOffsets", "cleanOffsets", "isSee", "childOffsets", "childIndices",
+                    "preorder", "postorder", "postorderPos", "subtreeSize")
+
+    def toArrays(self) -> dict[str, np.ndarray]:
+        """Flat arrays holding the whole tree, e.g. to save it with `np.savez`. The subject, node names and texts are stored as UTF-8 bytes.
+
+        Returns:
+            dict[str, np.ndarray]: Arrays of the tree, by name
+        """
+        arrays = {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+        arrays["subject"] = np.frombuffer(self.subject.encode("utf-8"), dtype=np.uint8)
+        arrays["names"] = np.frombuffer("\n".join(self.names).encode("utf-8"), dtype=np.uint8)
+        arrays["text"] = np.frombuffer(self._text.encode("utf-8"), dtype=np.uint8)
+        arrays["cleanText"] = np.frombuffer(self._cleanText.encode("utf-8"), dtype=np.uint8)
+        return arrays
+
+    @classmethod
+    def fromArrays(cls, arrays) -> "CompactTree":
+        """Rebuild a tree from the arrays returned by `toArrays`, without parsing the debate again.
+
+        Args:
+            arrays (Mapping[str, np.ndarray]): Arrays of the tree, by name (e.g. a loaded `.npz` file)
+
+        Returns:
+            CompactTree: The tree
+        """
+        tree = cls.__new__(cls)
+        for field in cls.ARRAY_FIELDS:
+            setattr(tree, field, arrays[field])
+        tree.subject = arrays["subject"].tobytes().decode("utf-8")
+        tree.names = arrays["names"].tobytes().decode("utf-8").split("\n")
+        tree.name2Idx = {name: i for i, name in enumerate(tree.names)}
+        tree._text = arrays["text"].tobytes().decode("utf-8")
+        tree._cleanText = arrays["cleanText"].tobytes().decode("utf-8")
+        return tree
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name : str) -> CompactNode:
+        return CompactNode(self, self.name2Idx[name])
+
+    def __contains__(self, name : str) -> bool:
+        return name in self.name2Idx
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def keys(self):
+        return self.name2Idx.keys()
+
+    def values(self):
+        return [CompactNode(self, i) for i in range(len(self.names))]
+
+    def items(self):
+        return [(name, CompactNode(self, i)) for i, name in enumerate(self.names)]
+
+    def text(self, idx : int) -> str:
+        """Text of node `idx`."""
+        if idx == 0:
+            return None
+        return self._text[self.textOffsets[idx]:self.textOffsets[idx+1]]
+
+    def cleanText(self, idx : int) -> str:
+        """Normalized text of node `idx`, without sources and page artifacts."""
+        if idx == 0:
+            return None
+        return self._cleanText[self.cleanOffsets[idx]:self.cleanOffsets[idx+1]]
+
+    def childrenIdx(self, idx : int) -> np.ndarray:
+        """Indices of the children of node `idx`."""
+        return self.childIndices[self.childOffsets[idx]:self.childOffsets[idx+1]]
+
+    def subtreePreorder(self, idx : int) -> np.ndarray:
+        """Indices of the nodes of the subtree rooted at `idx`, in pre-order."""
+        start = self.postorderPos[idx] - self.subtreeSize[idx] + 1
+        # A subtree spans the same number of nodes in both orders, and starts after the same nodes in pre-order as it does in post-order, plus its ancestors (as many as its level)
+        start += int(self.level[idx])
+        return self.preorder[start:start + self.subtreeSize[idx]]
+
+    def subtreePostorder(self, idx : int) -> np.ndarray:
+        """Indices of the nodes of the subtree rooted at `idx`, in post-order."""
+        end = self.postorderPos[idx] + 1
+        return self.postorder[end - self.subtreeSize[idx]:end]
+
+    def rootIsOnlyCommonAncestor(self, idx1 : int, idx2 : int) -> bool:
+        """Whether the root is the only common ancestor of two nodes, in O(1) using their top-level branch.
+        Matches anytree's `commonancestors`, for which a top-level node and its descendants only have the root in common.
+        """
+        branch1, branch2 = self.branch[idx1], self.branch[idx2]
+        return branch1 != branch2 or branch1 == idx1 or branch2 == idx2
+
+    def commonAncestors(self, idx1 : int, idx2 : int) -> list[int]:
+        """Indices of the common ancestors of two nodes, from the root down."""
+        common = []
+        for a1, a2 in zip(self.ancestors(idx1), self.ancestors(idx2)):
+            if a1 != a2:
+                break
+            common.append(a1)
+        return common
+
+    def ancestors(self, idx : int) -> list[int]:
+        """Indices of the ancestors of node `idx`, from the root down."""
+        ancestors = []
+        idx = self.parent[idx]
+        while idx >= 0:
+            ancestors.append(int(idx))
+            idx = self.parent[idx]
+        return ancestors[::-1]
+
+    def distance(self, idx1 : int, idx2 : int) -> int:
+        """Number of edges between two nodes. O(1) when the root is their only common ancestor, otherwise walks up to their lowest common ancestor."""
+        if self.branch[idx1] != self.branch[idx2]:
+            return int(self.level[idx1]) + int(self.level[idx2])
+        path1 = self.ancestors(idx1) + [idx1]
+        path2 = self.ancestors(idx2) + [idx2]
+        common = 0
+        for a1, a2 in zip(path1, path2):
+            if a1 != a2:
+                break
+            common += 1
+        return len(path1) + len(path2) - 2 * common
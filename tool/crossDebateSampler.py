@@ -0,0 +1,166 @@
+import ast, random
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+import numpy as np
+from tool.processTree import nodePair2NeutralArgPair
+
+# Argument of a sampled pair, holding what `nodePair2NeutralArgPair` reads from a tree node, so that the tree itself is not kept
+SampledNode = namedtuple("SampledNode", ["name", "cleanInput", "subject"])
+
+def argumentIndices(tree) -> np.ndarray:
+    """Indices of the arguments of a `CompactTree` that can be paired with another debate: every node but the root and the "See" arguments, in post-order like `getNNeutralPairsFromDiffTrees`."""
+    order = tree.subtreePostorder(0)[:-1]
+    return order[~tree.isSee[order]]
+
+def primaryTag(tags) -> str:
+    """First tag of a debate, e.g. "Politics" for the tags "['Politics', 'Economics']" of `kialo-url-ids.csv`, used as its stratum."""
+    if isinstance(tags, str) and tags.startswith("["):
+        try:
+            tags = ast.literal_eval(tags)
+        except (ValueError, SyntaxError):
+            return tags
+    if isinstance(tags, (list, tuple)):
+        return str(tags[0]) if tags else ""
+    return str(tags)
+
+class CrossDebateSampler:
+    """Sample neutral pairs of arguments from different debates across the whole corpus, instead of only between consecutive debates.
+
+    Debates are registered with their number of arguments (`add`), and the pairs are drawn from these counts alone (`sample`), as positions in the argument array of each debate (`argumentIndices`):
+    both debates of a pair are drawn with a probability proportional to their number of arguments (drawing the same debate twice is rejected), then an argument is drawn uniformly in each one,
+    so every pair of arguments from different debates is equally likely. Only the arguments drawn are then read from their trees, one debate at a time (`resolve`).
+
+    With `stratify`, debates are grouped by their first tag, and each pair of strata (including a stratum with itself) gets the same number of pairs, so that the mixing of topics does not depend on the size of each topic.
+    The pairs only depend on the seed and on the set of debates, not on the order debates are added in.
+    """
+
+    def __init__(self, stratify : bool = False):
+        """
+        Args:
+            stratify (bool, optional): Whether to balance the pairs across pairs of strata (first tag of each debate). Defaults to False.
+        """
+        self.stratify = stratify
+        # kialoUrlId -> number of arguments and tags
+        self.debates = {}
+
+    def __len__(self):
+        return len(self.debates)
+
+    def add(self, kialoUrlId : str, nbArguments : int, tags : str):
+        """Register a debate, with its number of arguments (see `argumentIndices`) and its tags."""
+        self.debates[kialoUrlId] = (nbArguments, tags)
+
+    def nbArguments(self) -> int:
+        """Number of arguments of all debates."""
+        return sum(count for count, _ in self.debates.values())
+
+    def _cells(self):
+        """Groups of debates the pairs are drawn from: (debates of the first argument, debates of the second argument, whether both groups are the same)."""
+        ids = sorted(kialoUrlId for kialoUrlId, (count, _) in self.debates.items() if count > 0)
+        if not self.stratify:
+            return [(ids, ids, True)]
+        strata = {}
+        for kialoUrlId in ids:
+            strata.setdefault(primaryTag(self.debates[kialoUrlId][1]), []).append(kialoUrlId)
+        keys = sorted(strata)
+        return [(strata[key1], strata[key2], i == j) for i, key1 in enumerate(keys) for j, key2 in enumerate(keys) if i <= j]
+
+    def _capacity(self, members1, members2, same):
+        """Number of distinct unordered pairs of arguments from different debates in a cell."""
+        counts1 = [self.debates[kialoUrlId][0] for kialoUrlId in members1]
+        if same:
+            return (sum(counts1) ** 2 - sum(count ** 2 for count in counts1)) // 2
+        return sum(counts1) * sum(self.debates[kialoUrlId][0] for kialoUrlId in members2)
+
+    def sample(self, n : int, rng=random) -> list[tuple[str, int, str, int]]:
+        """Draw `n` distinct pairs of arguments from different debates (fewer if there are not as many).
+
+        Args:
+            n (int): Number of pairs
+            rng (random.Random, optional): Random number generator, pass a seeded one for reproducible pairs. Defaults to the `random` module.
+
+        Returns:
+            list[tuple[str, int, str, int]]: Pairs as (kialoUrlId, position in `argumentIndices`) of both arguments
+        """
+        cells = [cell for cell in self._cells() if self._capacity(*cell) > 0]
+        if not cells or n <= 0:
+            return []
+        # Same number of pairs per cell, the remainder going to the first cells. The pairs a cell cannot hold go to the cells that still can, in further rounds
+        capacities = [self._capacity(*cell) for cell in cells]
+        quotas = [0] * len(cells)
+        remaining = min(n, sum(capacities))
+        notFull = list(range(len(cells)))
+        while remaining > 0:
+            share, extra = divmod(remaining, len(notFull))
+            for rank, i in enumerate(notFull):
+                given = min(share + (rank < extra), capacities[i] - quotas[i])
+                quotas[i] += given
+                remaining -= given
+            notFull = [i for i in notFull if quotas[i] < capacities[i]]
+
+        samples = []
+        seen = set()
+        for (members1, members2, same), quota in zip(cells, quotas):
+            cumulative1 = list(accumulate(self.debates[kialoUrlId][0] for kialoUrlId in members1))
+            cumulative2 = cumulative1 if same else list(accumulate(self.debates[kialoUrlId][0] for kialoUrlId in members2))
+            drawn = 0
+            while drawn < quota:
+                debate1 = members1[bisect_right(cumulative1, rng.random() * cumulative1[-1])]
+                debate2 = members2[bisect_right(cumulative2, rng.random() * cumulative2[-1])]
+                if debate1 == debate2:
+                    continue
+                pos1 = rng.randrange(self.debates[debate1][0])
+                pos2 = rng.randrange(self.debates[debate2][0])
+                # A pair and its reverse give the same rows
+                key = min((debate1, pos1, debate2, pos2), (debate2, pos2, debate1, pos1))
+                if key in seen:
+                    continue
+                seen.add(key)
+                samples.append((debate1, pos1, debate2, pos2))
+                drawn += 1
+        return samples
+
+    def resolve(self, samples : list[tuple[str, int, str, int]], loadTree) -> dict:
+        """Read the arguments of the sampled pairs from their trees, loading one tree at a time.
+
+        Args:
+            samples (list[tuple[str, int, str, int]]): Pairs returned by `sample`
+            loadTree (callable): Returns the `CompactTree` of a kialoUrlId
+
+        Raises:
+            ValueError: Raised if a debate does not have the number of arguments it was registered with
+
+        Returns:
+            dict: `SampledNode` of each (kialoUrlId, position) drawn
+        """
+        needed = {}
+        for debate1, pos1, debate2, pos2 in samples:
+            needed.setdefault(debate1, set()).add(pos1)
+            needed.setdefault(debate2, set()).add(pos2)
+        nodes = {}
+        for kialoUrlId in sorted(needed):
+            tree = loadTree(kialoUrlId)
+            indices = argumentIndices(tree)
+            if len(indices) != self.debates[kialoUrlId][0]:
+                raise ValueError(f"Debate {kialoUrlId} has {len(indices)} arguments, {self.debates[kialoUrlId][0]} were registered")
+            for pos in needed[kialoUrlId]:
+                idx = int(indices[pos])
+                nodes[(kialoUrlId, pos)] = SampledNode(tree.names[idx], tree.cleanText(idx), tree.subject)
+        return nodes
+
+    def iterNeutralArgPairs(self, samples : list[tuple[str, int, str, int]], nodes : dict):
+        """Generate the neutral argument pairs of the sampled pairs, and their reverse pairs, like `iterNeutralArgPairs` of `processTree`.
+
+        Args:
+            samples (list[tuple[str, int, str, int]]): Pairs returned by `sample`
+            nodes (dict): Arguments returned by `resolve`
+
+        Yields:
+            dict: Neutral argument pair
+        """
+        for debate1, pos1, debate2, pos2 in samples:
+            node1, node2 = nodes[(debate1, pos1)], nodes[(debate2, pos2)]
+            tags1, tags2 = self.debates[debate1][1], self.debates[debate2][1]
+            yield nodePair2NeutralArgPair(node1, node2, tags1, tags2, False, debate1, debate2)
+            yield nodePair2NeutralArgPair(node2, node1, tags2, tags1, False, debate2, debate1)
@@ -0,0 +1,134 @@
+import os, argparse
+import numpy as np
+from tool.compactTree import CompactTree
+from tool.parseDebate import PARSER_VERSION, rawKialo2CompactTree
+from tool.fileHash import hashFile
+
+class DebateCache:
+    """On-disk cache of parsed debates.
+
+    Each debate is stored as a `CompactTree` in an uncompressed `.npz` file named after the hash of the debate file, inside a folder per parser version (`parser-v1`, ...).
+    A debate is parsed again when its content changes or when `PARSER_VERSION` is bumped. Entries are written to a temporary file and renamed, so several processes can share the cache.
+    """
+
+    def __init__(self, cacheFolderPath : os.path):
+        """Open (or create) the cache inside `cacheFolderPath`.
+
+        Args:
+            cacheFolderPath (os.path): Folder of the cache
+        """
+        self.cacheFolderPath = cacheFolderPath
+        self.path = os.path.join(cacheFolderPath, f"parser-v{PARSER_VERSION}")
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def entryPath(self, contentHash : str) -> os.path:
+        return os.path.join(self.path, contentHash + ".npz")
+
+    def load(self, debatePath : os.path) -> CompactTree:
+        """Load the parsed tree of a debate from the cache, parsing the debate and caching its tree on a miss.
+
+        Args:
+            debatePath (os.path): Path of the debate file
+
+        Returns:
+            CompactTree: Parsed debate
+        """
+        entryPath = self.entryPath(hashFile(debatePath))
+        if os.path.exists(entryPath):
+            try:
+                with np.load(entryPath, allow_pickle=False) as arrays:
+                    tree = CompactTree.fromArrays(arrays)
+                self.hits += 1
+                return tree
+            except (OSError, ValueError, KeyError):
+                # Unreadable entry (e.g. truncated), parse the debate again
+                pass
+
+        self.misses += 1
+        tree = rawKialo2CompactTree(debatePath)
+        self.store(entryPath, tree, os.path.basename(debatePath))
+        return tree
+
+    def store(self, entryPath : os.path, tree : CompactTree, source : str):
+        """Write a tree to the cache, along with the name of its source file."""
+        tmpPath = f"{entryPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            np.savez(f, source=np.frombuffer(source.encode("utf-8"), dtype=np.uint8), **tree.toArrays())
+        os.replace(tmpPath, entryPath)
+
+    def entries(self, debatesFolderPath : os.path = None) -> list[dict]:
+        """List the entries of the cache, for every parser version.
+        An entry is stale when it was written by another parser version, or, if `debatesFolderPath` is given, when no debate of that folder currently has its content.
+
+        Args:
+            debatesFolderPath (os.path, optional): Folder of the debate files. Defaults to None (only the parser version is checked).
+
+        Returns:
+            list[dict]: For each entry, its path, source file, parser version, size in bytes and whether it is stale
+        """
+        currentHashes = None
+        if debatesFolderPath is not None:
+            currentHashes = {hashFile(os.path.join(debatesFolderPath, x)) for x in os.listdir(debatesFolderPath) if x.endswith(".txt")}
+
+        entries = []
+        for folder in sorted(os.listdir(self.cacheFolderPath)):
+            if not folder.startswith("parser-v"):
+                continue
+            version = int(folder[len("parser-v"):])
+            for fileName in sorted(os.listdir(os.path.join(self.cacheFolderPath, folder))):
+                if not fileName.endswith(".npz"):
+                    continue
+                path = os.path.join(self.cacheFolderPath, folder, fileName)
+                try:
+                    with np.load(path, allow_pickle=False) as arrays:
+                        source = arrays["source"].tobytes().decode("utf-8")
+                except (OSError, ValueError, KeyError):
+                    source = None
+                stale = version != PARSER_VERSION or source is None
+                if currentHashes is not None:
+                    stale = stale or fileName[:-len(".npz")] not in currentHashes
+                entries.append({
+                    "path"      : path,
+                    "source"    : source,
+                    "version"   : version,
+                    "size"      : os.path.getsize(path),
+                    "stale"     : stale,
+                })
+        return entries
+
+    def invalidate(self, debatesFolderPath : os.path = None, everything : bool = False) -> int:
+        """Delete the stale entries of the cache (see `entries`), or all of them.
+
+        Args:
+            debatesFolderPath (os.path, optional): Folder of the debate files, entries matching none of them are stale. Defaults to None.
+            everything (bool, optional): Delete every entry, stale or not. Defaults to False.
+
+        Returns:
+            int: Number of entries deleted
+        """
+        deleted = 0
+        for entry in self.entries(debatesFolderPath):
+            if everything or entry["stale"]:
+                os.remove(entry["path"])
+                deleted += 1
+        return deleted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or invalidate the entries of the parsed debate cache.")
+    parser.add_argument("command", choices=["list", "invalidate"], help="list the entries, or delete the stale ones")
+    parser.add_argument("--cache", default=os.path.abspath("processedData/debateCache/"), help="folder of the cache")
+    parser.add_argument("--debates", default=os.path.abspath("rawData/debates/en"), help="folder of the debate files, entries matching none of them are stale (pass an empty string to only check the parser version)")
+    parser.add_argument("--all", action="store_true", help="with invalidate, delete every entry")
+    args = parser.parse_args()
+
+    cache = DebateCache(args.cache)
+    debatesFolderPath = args.debates or None
+    if args.command == "list":
+        entries = cache.entries(debatesFolderPath)
+        for entry in entries:
+            print(f"{'stale' if entry['stale'] else 'valid':>5} v{entry['version']} {entry['size']/1e3:>10.1f} kB {entry['source']} ({os.path.basename(entry['path'])})")
+        print(f"{len(entries)} entries, {sum(x['stale'] for x in entries)} stale, {sum(x['size'] for x in entries)/1e6:.1f} MB")
+    else:
+        print(f"Deleted {cache.invalidate(debatesFolderPath, everything=args.all)} entries")
@@ -1,49 +1,200 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-import time
+import os, time, random, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from tqdm import tqdm
-import os
 
-def downloadDiscussions(discussionUrlIds : list[str], kialoUsername : str, secret : str, downloadPath : os.path = os.path.abspath("../rawData/debates")):
-  """Download discussions from Kialo using Selenium.
-  This function logs into Kialo and downloads discussions based on the provided URL IDs.
-  The discussions are saved as text files in the specified download path.
-  The function creates the download path if it does not exist.
+KIALO_URL = "https://www.kialo.com"
+# Status codes worth retrying, the others are reported as failures right away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+  """Thread-safe token bucket rate limiter: at most `rate` requests per second on average, with bursts of up to `capacity` requests."""
+
+  def __init__(self, rate : float, capacity : int = 1):
+    self.rate = rate
+    self.capacity = capacity
+    self._tokens = capacity
+    self._last = time.monotonic()
+    self._lock = threading.Lock()
+
+  def acquire(self):
+    """Wait until a token is available and take it."""
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return
+        wait = (1 - self._tokens) / self.rate
+      time.sleep(wait)
+
+def loginKialo(kialoUsername : str, secret : str) -> dict:
+  """Log into Kialo with Selenium and return the cookies of the authenticated session.
+  Selenium is only needed here, the downloads themselves go through plain HTTP requests.
 
   Args:
-      discussionUrlIds (list[str]): List of discussion URL IDs to download
       kialoUsername (str): Username for Kialo account
       secret (str): Password for Kialo account
+
+  Returns:
+      dict: Cookies of the session, by name
+  """
+  from selenium import webdriver
+  from selenium.webdriver.support.ui import WebDriverWait
+  from selenium.webdriver.support import expected_conditions as EC
+  from selenium.webdriver.common.by import By
+
+  driver = webdriver.Chrome()
+  try:
+    driver.get(KIALO_URL + "/login")
+
+    #Login
+    id          = driver.find_element(By.ID, "emailOrUsername")
+    password    = driver.find_element(By.ID, "password")
+    loginButton = driver.find_element(By.CLASS_NAME, "login-form__submit")
+    id.send_keys(kialoUsername)
+    password.send_keys(secret)
+
+    loginButton.click()
+
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, 'home-page-section__header')))
+    return {cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}
+  finally:
+    driver.quit()
+
+def createSession(cookies : dict = None, poolSize : int = 8, retries : int = 0, backoff : float = 1.0) -> requests.Session:
+  """Create an HTTP session keeping up to `poolSize` connections alive, authenticated with `cookies`.
+
+  Args:
+      cookies (dict, optional): Cookies of an authenticated session. Defaults to None.
+      poolSize (int, optional): Number of connections kept alive, i.e. of concurrent requests. Defaults to 8.
+      retries (int, optional): Number of retries of failed connections and transient status codes (429, 5xx), with exponential backoff, done by the session itself. Defaults to 0.
+      backoff (float, optional): Backoff factor of the retries in seconds. Defaults to 1.0.
+
+  Returns:
+      requests.Session: The session
+  """
+  session = requests.Session()
+  maxRetries = Retry(total=retries, backoff_factor=backoff, status_forcelist=sorted(RETRY_STATUS), allowed_methods={"GET"}, raise_on_status=False) if retries else 0
+  adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=maxRetries)
+  session.mount("http://", adapter)
+  session.mount("https://", adapter)
+  if cookies:
+    session.cookies.update(cookies)
+  return session
+
+def downloadFile(session : requests.Session, url : str, path : os.path, rateLimiter : TokenBucket = None, retries : int = 5, backoff : float = 1.0, timeout : float = 30) -> bool:
+  """Download `url` to `path`, unless `path` already exists.
+  The file is written next to `path` and only renamed once complete, so an interrupted download never leaves a truncated file behind.
+  Connection errors and transient status codes (429, 5xx) are retried with exponential backoff and jitter, honoring the `Retry-After` header.
+
+  Args:
+      session (requests.Session): Session used for the request
+      url (str): URL of the file
+      path (os.path): Path to save the file to
+      rateLimiter (TokenBucket, optional): Rate limiter shared by all downloads, acquired before each attempt. Defaults to None.
+      retries (int, optional): Maximum number of retries. Defaults to 5.
+      backoff (float, optional): Delay before the first retry in seconds, doubled at each retry. Defaults to 1.0.
+      timeout (float, optional): Timeout of each request in seconds. Defaults to 30.
+
+  Raises:
+      requests.RequestException: Raised once all retries failed, or right away for other status codes
+
+  Returns:
+      bool: True if the file was downloaded, False if it already existed
+  """
+  if os.path.exists(path):
+    return False
+
+  tmpPath = f"{path}.{threading.get_ident()}.part"
+  for attempt in range(retries + 1):
+    if rateLimiter is not None:
+      rateLimiter.acquire()
+    delay = backoff * 2**attempt * random.uniform(0.5, 1.5)
+    try:
+      with session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code in RETRY_STATUS and attempt < retries:
+          retryAfter = response.headers.get("Retry-After")
+          if retryAfter is not None and retryAfter.isdigit():
+            delay = max(delay, int(retryAfter))
+          time.sleep(delay)
+          continue
+        response.raise_for_status()
+
+        size = 0
+        with open(tmpPath, "wb") as f:
+          for block in response.iter_content(chunk_size=65536):
+            f.write(block)
+            size += len(block)
+        # A dropped connection may end the body early without raising
+        expectedSize = response.headers.get("Content-Length")
+        if expectedSize is not None and "Content-Encoding" not in response.headers and int(expectedSize) != size:
+          raise requests.ConnectionError(f"Incomplete download of {url}: {size} of {expectedSize} bytes")
+      os.replace(tmpPath, path)
+      return True
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+      if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+      if attempt == retries:
+        raise
+      time.sleep(delay)
+    except BaseException:
+      if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+      raise
+
+def downloadDiscussions(discussionUrlIds : list[str], kialoUsername : str = None, secret : str = None, downloadPath : os.path = os.path.abspath("../rawData/debates"),
+                        workers : int = 8, rate : float = 4.0, retries : int = 5, cookies : dict = None, baseUrl : str = KIALO_URL) -> dict:
+  """Download discussions from Kialo as text files, concurrently.
+  This function logs into Kialo with Selenium (unless `cookies` are given), then downloads the discussions through a pooled HTTP session reusing the session cookies.
+  The discussions are saved as "<urlId>.txt" in the specified download path, which is created if it does not exist. Discussions already downloaded (including those already sorted into a language subfolder) are skipped, so an interrupted download can simply be started again.
+
+  Args:
+      discussionUrlIds (list[str]): List of discussion URL IDs to download
+      kialoUsername (str, optional): Username for Kialo account. Defaults to None.
+      secret (str, optional): Password for Kialo account. Defaults to None.
       downloadPath (os.path, optional): Path to save downloaded discussions. Defaults to "../rawData/debates".
+      workers (int, optional): Number of concurrent downloads. Defaults to 8.
+      rate (float, optional): Maximum number of requests per second, across all workers. Defaults to 4.0.
+      retries (int, optional): Maximum number of retries of each download. Defaults to 5.
+      cookies (dict, optional): Cookies of an authenticated session, instead of logging in. Defaults to None.
+      baseUrl (str, optional): Server to download from, e.g. a local server for tests. Defaults to "https://www.kialo.com".
+
+  Returns:
+      dict: URL IDs of the discussions "downloaded", "skipped" (already on disk) and "failed", with their error
   """
   path = downloadPath
 
   if not os.path.exists(path):
     os.makedirs(path)
 
-  prefs = {"download.default_directory": path }
-  options = Options()
-  options.add_experimental_option("prefs", prefs)
-  driver = webdriver.Chrome(options = options)
-
-
-  driver.get("https://www.kialo.com/login")
+  if cookies is None and kialoUsername is not None:
+    cookies = loginKialo(kialoUsername, secret)
 
-  #Login
-  id          = driver.find_element(By.ID, "emailOrUsername")
-  password    = driver.find_element(By.ID, "password")
-  loginButton = driver.find_element(By.CLASS_NAME, "login-form__submit")
-  id.send_keys(kialoUsername)
-  password.send_keys(secret)
+  session = createSession(cookies, poolSize=workers)
+  rateLimiter = TokenBucket(rate, capacity=workers)
+  report = {"downloaded": [], "skipped": [], "failed": {}}
 
-  loginButton.click()
+  def download(urlId):
+    return downloadFile(session, baseUrl + "/export/" + urlId + ".txt", os.path.join(path, urlId + ".txt"), rateLimiter, retries=retries)
 
-  myElem = WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CLASS_NAME, 'home-page-section__header')))
+  # Files sorted by `classifyFilesByLanguage` are in a subfolder per language
+  existing = {fileName for _, _, fileNames in os.walk(path) for fileName in fileNames}
+  report["skipped"] = [urlId for urlId in discussionUrlIds if urlId + ".txt" in existing]
+  toDownload = [urlId for urlId in discussionUrlIds if urlId + ".txt" not in existing]
 
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    futures = {executor.submit(download, urlId): urlId for urlId in toDownload}
+    for future in tqdm(as_completed(futures), total=len(futures)):
+      urlId = futures[future]
+      try:
+        report["downloaded" if future.result() else "skipped"].append(urlId)
+      except requests.RequestException as e:
+        report["failed"][urlId] = repr(e)
+  session.close()
 
-  for urlId in tqdm(discussionUrlIds):
-    driver.get("https://www.kialo.com/export/" + urlId + ".txt")
-    time.sleep(1.5)
\ No newline at end of file
+  return report
@@ -0,0 +1,258 @@
+import os, json, hashlib
+import numpy as np
+
+CACHE_VERSION = 2
+
+def hashText(text : str) -> bytes:
+    """Hash an argument text into the 16 bytes key used by the embedding cache.
+
+    Args:
+        text (str): Argument text
+
+    Returns:
+        bytes: 16 bytes digest of the text
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def checksumRows(embeddings : np.ndarray) -> np.ndarray:
+    """Checksum of each row of a matrix of embeddings, stored in the index of the cache to check the rows read back.
+
+    Args:
+        embeddings (np.ndarray): Matrix of embeddings, in the storage type of the cache
+
+    Returns:
+        np.ndarray: 8 bytes digest of each row, as uint64
+    """
+    return np.fromiter((int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "little") for row in embeddings), dtype=np.uint64, count=len(embeddings))
+
+def modelNamespace(modelName : str) -> str:
+    """Convert a model name into a folder name, i.e. "sentence-transformers/all-MiniLM-L6-v2" into "sentence-transformers__all-MiniLM-L6-v2".
+
+    Args:
+        modelName (str): Name of the model producing the embeddings
+
+    Returns:
+        str: Folder name for the model's cache
+    """
+    return modelName.replace("/", "__").replace("\\", "__").replace(":", "_")
+
+class EmbeddingCache:
+    """On-disk cache of argument embeddings for a given model.
+
+    The embeddings are stored in a memory-mapped matrix (`embeddings.bin`), one row per argument, next to an index (`index.npy`) mapping the hash of each argument text to its row.
+    Each model gets its own folder inside `cacheFolderPath`, so embeddings of different models are never mixed.
+
+    When `maxEntries` is set, the least recently used entries are evicted to make room for new ones. Their rows are reused in place, so rows handed out during a run are never moved.
+    Entries used during the current run are never evicted, the cache may then temporarily grow beyond `maxEntries`.
+    The index without the evicted entries is saved before their rows are overwritten, and the index stores a checksum of each row, checked when a row is first read by a run,
+    so an interrupted run never leaves an entry pointing to the embedding of another text.
+    """
+
+    def __init__(self, cacheFolderPath : os.path, modelName : str, dtype=np.float32, maxEntries : int = None):
+        """Open (or create) the cache of `modelName` inside `cacheFolderPath`.
+
+        Args:
+            cacheFolderPath (os.path): Folder containing the caches of all models
+            modelName (str): Name of the model producing the embeddings
+            dtype (np.dtype, optional): Storage type of the embeddings, either float32 or float16. Defaults to np.float32.
+            maxEntries (int, optional): Maximum number of embeddings kept in the cache. Defaults to None (no limit).
+
+        Raises:
+            ValueError: Raised if `dtype` differs from the one of an existing cache
+        """
+        self.modelName = modelName
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported embedding cache dtype {self.dtype}, use float32 or float16.")
+        self.maxEntries = maxEntries
+        self.path = os.path.join(cacheFolderPath, modelNamespace(modelName))
+        os.makedirs(self.path, exist_ok=True)
+
+        self._metaPath = os.path.join(self.path, "meta.json")
+        self._indexPath = os.path.join(self.path, "index.npy")
+        self._matrixPath = os.path.join(self.path, "embeddings.bin")
+
+        self.dim = None
+        self.nbRows = 0
+        self.clock = 0
+        # Per row: text hash, last time used (clock value), whether the row holds an embedding and checksum of the embedding
+        self._hashes = np.empty(0, dtype="V16")
+        self._lastUsed = np.empty(0, dtype=np.int64)
+        self._occupied = np.empty(0, dtype=bool)
+        self._checksums = np.empty(0, dtype=np.uint64)
+        self._matrix = None
+
+        if os.path.exists(self._metaPath):
+            with open(self._metaPath, "r") as f:
+                meta = json.load(f)
+            if meta["version"] != CACHE_VERSION:
+                raise ValueError(f"Embedding cache at {self.path} has version {meta['version']}, expected {CACHE_VERSION}. Delete it to rebuild it.")
+            if np.dtype(meta["dtype"]) != self.dtype:
+                raise ValueError(f"Embedding cache at {self.path} stores {meta['dtype']} embeddings, not {self.dtype}.")
+            self.dim = meta["dim"]
+            self.nbRows = meta["nbRows"]
+            self.clock = meta["clock"]
+            index = np.load(self._indexPath)
+            self._hashes = index["hash"].copy()
+            self._lastUsed = index["lastUsed"].copy()
+            self._occupied = index["occupied"].copy()
+            self._checksums = index["checksum"].copy()
+            self._openMatrix()
+
+        # Rows stamped with the current clock were used during this run
+        self.clock += 1
+        self._hash2Row = {h: i for i, h in enumerate(self._hashes.tolist()) if self._occupied[i]}
+        self.hits = 0
+        self.misses = 0
+        # Embeddings added since the last flush
+        self.unflushed = 0
+
+    def __len__(self):
+        return len(self._hash2Row)
+
+    def _openMatrix(self):
+        if self.nbRows == 0:
+            self._matrix = np.empty((0, self.dim), dtype=self.dtype)
+        else:
+            self._matrix = np.memmap(self._matrixPath, dtype=self.dtype, mode="r+", shape=(self.nbRows, self.dim))
+
+    def _grow(self, nbNewRows):
+        """Extend the matrix file and the index by `nbNewRows` empty rows."""
+        if self._matrix is not None and isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+            self._matrix = None
+        newNbRows = self.nbRows + nbNewRows
+        with open(self._matrixPath, "ab") as f:
+            f.truncate(newNbRows * self.dim * self.dtype.itemsize)
+        self._hashes = np.concatenate([self._hashes, np.zeros(nbNewRows, dtype="V16")])
+        self._lastUsed = np.concatenate([self._lastUsed, np.zeros(nbNewRows, dtype=np.int64)])
+        self._occupied = np.concatenate([self._occupied, np.zeros(nbNewRows, dtype=bool)])
+        self._checksums = np.concatenate([self._checksums, np.zeros(nbNewRows, dtype=np.uint64)])
+        self.nbRows = newNbRows
+        self._openMatrix()
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Memory-mapped matrix of all cached embeddings, indexed by the rows returned by `lookup` and `add`."""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return self._matrix
+
+    def lookup(self, texts : list[str]) -> np.ndarray:
+        """Find the rows of the cached embeddings of `texts`, and mark them as used by this run (written to disk by `flush`).
+
+        Args:
+            texts (list[str]): Argument texts
+
+        Returns:
+            np.ndarray: Row of each text in `embeddings`, -1 if the text is not cached
+        """
+        rows = np.fromiter((self._hash2Row.get(hashText(x), -1) for x in texts), dtype=np.int64, count=len(texts))
+        # Rows not used yet by this run are checked against their checksum, and dropped if their embedding was overwritten
+        unchecked = np.flatnonzero(rows >= 0)
+        unchecked = unchecked[self._lastUsed[rows[unchecked]] < self.clock]
+        corrupted = unchecked[checksumRows(self._matrix[rows[unchecked]]) != self._checksums[rows[unchecked]]] if len(unchecked) else unchecked
+        if len(corrupted):
+            corruptedRows = np.unique(rows[corrupted])
+            print(f"Embedding cache: {len(corruptedRows)} entries do not match their checksum and are encoded again")
+            for h in self._hashes[corruptedRows].tolist():
+                del self._hash2Row[h]
+            self._occupied[corruptedRows] = False
+            rows[np.isin(rows, corruptedRows)] = -1
+        hits = rows[rows >= 0]
+        self._lastUsed[hits] = self.clock
+        self.hits += len(hits)
+        self.misses += len(rows) - len(hits)
+        return rows
+
+    def add(self, texts : list[str], embeddings : np.ndarray) -> np.ndarray:
+        """Store the embeddings of `texts` in the cache, all at once.
+
+        Args:
+            texts (list[str]): Argument texts, not already cached
+            embeddings (np.ndarray): Embedding of each text
+
+        Returns:
+            np.ndarray: Row of each text in `embeddings`
+        """
+        embeddings = np.asarray(embeddings)
+        if len(texts) == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embeddings of dimension {embeddings.shape[1]} cannot be added to a cache of dimension {self.dim}.")
+
+        rows = self._allocateRows(len(texts))
+        embeddings = embeddings.astype(self.dtype, copy=False)
+        # Sort rows so that the memmap is written in order
+        order = np.argsort(rows, kind="stable")
+        self._matrix[rows[order]] = embeddings[order]
+        self._checksums[rows] = checksumRows(embeddings)
+
+        hashes = [hashText(x) for x in texts]
+        self._hash2Row.update(zip(hashes, rows.tolist()))
+        self._hashes[rows] = hashes
+        self._occupied[rows] = True
+        self._lastUsed[rows] = self.clock
+        self.unflushed += len(texts)
+        return rows
+
+    def _allocateRows(self, n):
+        """Pick `n` rows to write new embeddings into: free rows first, then rows of evicted entries, then new rows."""
+        free = np.flatnonzero(~self._occupied)[:n]
+        missing = n - len(free)
+        if missing == 0:
+            return free
+
+        evicted = np.empty(0, dtype=np.int64)
+        if self.maxEntries is not None:
+            nbRoom = max(self.maxEntries - self.nbRows, 0)
+            nbToEvict = max(missing - nbRoom, 0)
+            if nbToEvict:
+                # Least recently used entries that were not used during this run
+                candidates = np.flatnonzero(self._occupied & (self._lastUsed < self.clock))
+                candidates = candidates[np.argsort(self._lastUsed[candidates], kind="stable")]
+                evicted = candidates[:nbToEvict]
+                for h in self._hashes[evicted].tolist():
+                    del self._hash2Row[h]
+                self._occupied[evicted] = False
+                if len(evicted) < nbToEvict:
+                    print(f"Embedding cache exceeds its limit of {self.maxEntries} entries, all entries are in use by this run.")
+                # The saved index must no longer reference the evicted rows before they are overwritten
+                if len(evicted):
+                    self.flush()
+            missing -= len(evicted)
+
+        start = self.nbRows
+        if missing:
+            self._grow(missing)
+        return np.concatenate([free, evicted, np.arange(start, start + missing)]).astype(np.int64)
+
+    def flush(self):
+        """Write the embeddings and the index to disk."""
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+
+        index = np.empty(self.nbRows, dtype=[("hash", "V16"), ("lastUsed", np.int64), ("occupied", bool), ("checksum", np.uint64)])
+        index["hash"] = self._hashes
+        index["lastUsed"] = self._lastUsed
+        index["occupied"] = self._occupied
+        index["checksum"] = self._checksums
+        # Write then rename so that an interrupted flush never leaves a corrupted index behind
+        with open(self._indexPath + ".tmp", "wb") as f:
+            np.save(f, index)
+        os.replace(self._indexPath + ".tmp", self._indexPath)
+
+        meta = {
+            "version"   : CACHE_VERSION,
+            "modelName" : self.modelName,
+            "dtype"     : self.dtype.name,
+            "dim"       : self.dim,
+            "nbRows"    : self.nbRows,
+            "clock"     : self.clock,
+        }
+        with open(self._metaPath + ".tmp", "w") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(self._metaPath + ".tmp", self._metaPath)
+        self.unflushed = 0
@@ -0,0 +1,14 @@
+import os, hashlib
+
+def hashFile(path : os.path) -> str:
+    """Hash the content of a file, e.g. the key of a parsed debate in the debate cache or of a file in the manifest of `sortFiles.py`.
+    Only depends on the standard library, so that it can be imported without the parser and numpy.
+
+    Args:
+        path (os.path): Path of the file
+
+    Returns:
+        str: Hexadecimal digest of the file content
+    """
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
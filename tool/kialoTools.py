@@ -1,7 +1,11 @@
 from enum import Enum
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import os, json, time, hashlib, threading
 import requests
 import pandas as pd
-import os
+from tool.download import KIALO_URL, createSession
 
 class KialoSort(Enum):
   RANK_ACTIVITY = "rank_and_latest_activity"
@@ -15,8 +19,8 @@ class KialoFilter(Enum):
   TAG           = "tag"
   TAG_ALL       = "tag_all"
 
-def getDiscussions(filter: KialoFilter, sort: KialoSort, limit : int=3000) -> list[dict]:
-    """Send API request to get discussions from Kialo based on filter and sort options.
+def getDiscussions(filter: KialoFilter, sort: KialoSort, limit : int=3000, **kwargs) -> list[dict]:
+    """Send API requests to get discussions from Kialo based on filter and sort options, see `iterDiscussions` for the other options.
 
     Args:
         filter (KialoFilter): Filter option for discussions
@@ -26,9 +30,85 @@ def getDiscussions(filter: KialoFilter, sort: KialoSort, limit : int=3000) -> li
     Returns:
         list[dict]: List of discussion objects containing title, id, and tags
     """
-    req = "https://www.kialo.com/api/v1/discussions?filter=" + str(filter.value) + "&sort=" + str(sort.value) + "&limit=" + str(limit) + "&skip=0"
-    tags = requests.get(req)
-    return tags.json()["discussions"]
+    return list(iterDiscussions(filter, sort, limit, **kwargs))
+
+def iterDiscussions(filter: KialoFilter, sort: KialoSort, limit : int=3000, pageSize : int=100, workers : int=4, session : requests.Session=None,
+                    cachePath : os.path=None, ttl : float=24*3600, baseUrl : str=KIALO_URL, timeout : float=30):
+    """Stream discussions from the Kialo API, page by page.
+    Up to `workers` pages are requested at once over a pooled session, and the discussions are yielded in the order of the API as soon as their page arrives. The listing stops at `limit` discussions or at the first incomplete page.
+    Pages can be cached on disk, so that the same request made again within `ttl` seconds does not hit the network.
+
+    Args:
+        filter (KialoFilter): Filter option for discussions
+        sort (KialoSort): Sorting option for discussions
+        limit (int, optional): Maximum number of discussions to request. Defaults to 3000.
+        pageSize (int, optional): Number of discussions per request. Defaults to 100.
+        workers (int, optional): Number of pages requested concurrently. Defaults to 4.
+        session (requests.Session, optional): Session used for the requests. Defaults to None (a new session retrying failed requests).
+        cachePath (os.path, optional): Folder of the cache of API responses. Defaults to None (no cache).
+        ttl (float, optional): Time in seconds after which a cached response is requested again. Defaults to 24 hours.
+        baseUrl (str, optional): Server of the API, e.g. a local server for tests. Defaults to "https://www.kialo.com".
+        timeout (float, optional): Timeout of each request in seconds. Defaults to 30.
+
+    Yields:
+        dict: Each discussion object containing title, id, and tags
+    """
+    ownSession = session is None
+    if ownSession:
+        session = createSession(poolSize=workers, retries=5)
+
+    def getPage(skip):
+        req = baseUrl + "/api/v1/discussions?filter=" + str(filter.value) + "&sort=" + str(sort.value) + "&limit=" + str(min(pageSize, limit - skip)) + "&skip=" + str(skip)
+        return getCachedJson(session, req, cachePath, ttl, timeout)["discussions"]
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            skips = iter(range(0, limit, pageSize))
+            pending = deque(executor.submit(getPage, skip) for skip in islice(skips, workers))
+            while pending:
+                discussions = pending.popleft().result()
+                yield from discussions
+                if len(discussions) < pageSize:
+                    # Last page, the pages requested after it are empty
+                    for future in pending:
+                        future.cancel()
+                    return
+                for skip in islice(skips, 1):
+                    pending.append(executor.submit(getPage, skip))
+    finally:
+        if ownSession:
+            session.close()
+
+def getCachedJson(session : requests.Session, url : str, cachePath : os.path=None, ttl : float=24*3600, timeout : float=30) -> dict:
+    """Get the JSON response of `url`, from the cache if it was stored less than `ttl` seconds ago.
+
+    Args:
+        session (requests.Session): Session used for the request
+        url (str): URL to request
+        cachePath (os.path, optional): Folder of the cache, one file per URL. Defaults to None (no cache).
+        ttl (float, optional): Time in seconds after which a cached response is requested again. Defaults to 24 hours.
+        timeout (float, optional): Timeout of the request in seconds. Defaults to 30.
+
+    Returns:
+        dict: JSON response
+    """
+    if cachePath is not None:
+        path = os.path.join(cachePath, hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest() + ".json")
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+            with open(path, "r") as f:
+                return json.load(f)
+
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+
+    if cachePath is not None:
+        os.makedirs(cachePath, exist_ok=True)
+        tmpPath = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(result, f)
+        os.replace(tmpPath, path)
+    return result
 
 def replaceSpecialChars(string : str) -> str:
     """Replace special characters found in discussion titles with URL-friendly characters.
@@ -50,15 +130,18 @@ def discussions2urlID(discussions : list[dict], export : bool =False, exportPath
     """Convert discussion titles to URL-friendly IDs by removing special characters and appending the discussion ID. Can save the resulting list to a CSV file named "kialo-url-ids.csv".
 
     Args:
-        discussions (list[dict]): List of discussion objects containing title and id
+        discussions (Iterable[dict]): Discussion objects containing title and id
         export (bool, optional): Whether to save or not the resulting list to CSV format. Defaults to False.
         exportPath (os.path, optional): Path of folder to save the CSV file into. Defaults to "../rawData".
 
     Returns:
         list[str]: List of URL IDs to use for downloading discussions
     """
-    idsUrl = [replaceSpecialChars(x["title"].lower())+"-"+str(x["id"]) for x in discussions]
-    tags = [x["tags"] for x in discussions]
+    idsUrl, tags = [], []
+    # Single pass, so that `discussions` can be a stream such as `iterDiscussions`
+    for x in discussions:
+        idsUrl.append(replaceSpecialChars(x["title"].lower())+"-"+str(x["id"]))
+        tags.append(x["tags"])
     if export:
         if not os.path.exists(exportPath):
             os.makedirs(exportPath)
@@ -0,0 +1,342 @@
+import os, re
+import numpy as np
+import pandas as pd
+from tool.compactTree import CompactTree
+from tool.embeddingCache import hashText
+
+# Modes of `DuplicateFilter`: "skip" drops the pairs repeating another pair up to near duplicates, "collapse" also replaces each argument by the representative of its cluster in its debate,
+# with the text of the first argument of the cluster
+DEDUP_MODES = ["skip", "collapse"]
+# Columns of the artifact written by `NearDuplicates.save`
+DUPLICATE_COLUMNS = ["cluster", "debate", "node", "text"]
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalizeForShingles(text : str) -> str:
+    """Lowercase a text and replace punctuation and whitespace by single spaces, so that light edits (case, punctuation, spacing) do not change its shingles."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+def lshParameters(threshold : float, numPerm : int) -> tuple[int, int]:
+    """Number of bands and of rows per band of the LSH index minimizing the false positive and false negative probabilities around `threshold`.
+    Two signatures share a bucket of at least one band with probability 1 - (1 - s^rows)^bands, where s is the Jaccard similarity of their shingles.
+
+    Args:
+        threshold (float): Jaccard similarity above which two texts are near duplicates
+        numPerm (int): Length of the MinHash signatures
+
+    Returns:
+        tuple(int, int): Number of bands and number of rows per band, whose product is at most `numPerm`
+    """
+    below = np.linspace(0, threshold, 101)
+    above = np.linspace(threshold, 1, 101)
+    best, bestError = (1, numPerm), np.inf
+    for bands in range(1, numPerm + 1):
+        for rows in range(1, numPerm // bands + 1):
+            falsePositive = (1 - (1 - below ** rows) ** bands).mean() * threshold
+            falseNegative = ((1 - above ** rows) ** bands).mean() * (1 - threshold)
+            if falsePositive + falseNegative < bestError:
+                best, bestError = (bands, rows), falsePositive + falseNegative
+    return best
+
+class MinHasher:
+    """MinHash signatures of the character shingles of texts.
+
+    Each shingle (`shingleSize` bytes of the normalized UTF-8 text) is read as an integer, and each of the `numPerm` signature values is its minimum under a multiply-add-shift hash function `(a * x + b) >> 32` (modulo 2^64).
+    The share of equal values of two signatures estimates the Jaccard similarity of their sets of shingles. Texts are hashed by blocks, with NumPy, rather than shingle by shingle.
+    """
+
+    def __init__(self, numPerm : int = 64, shingleSize : int = 5, seed : int = 0, blockSize : int = 16384):
+        """
+        Args:
+            numPerm (int, optional): Length of the signatures. Defaults to 64.
+            shingleSize (int, optional): Number of bytes of each shingle, at most 8. Defaults to 5.
+            seed (int, optional): Seed of the hash functions, signatures are only comparable with the same seed. Defaults to 0.
+            blockSize (int, optional): Number of shingles hashed at once, memory grows with `blockSize * numPerm`. Defaults to 16384.
+        """
+        if not 1 <= shingleSize <= 8:
+            raise ValueError(f"Shingles are read as 64-bit integers, their size must be between 1 and 8 bytes, got {shingleSize}")
+        self.numPerm = numPerm
+        self.shingleSize = shingleSize
+        self.blockSize = blockSize
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**63, size=numPerm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=numPerm, dtype=np.uint64)
+        self._weights = np.uint64(256) ** np.arange(shingleSize - 1, -1, -1, dtype=np.uint64)
+
+    def shingleIds(self, texts : list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Shingles of each text, texts shorter than a shingle being padded with spaces.
+
+        Returns:
+            tuple(np.ndarray, np.ndarray): Shingles of all texts as 32-bit integers (in uint64), and the number of shingles of each text
+        """
+        encoded = [normalizeForShingles(text).encode("utf-8").ljust(self.shingleSize) for text in texts]
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+        counts = lengths - self.shingleSize + 1
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        # Start of every shingle, shingles never span two texts
+        starts = np.repeat(offsets - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + np.arange(counts.sum())
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.shingleSize)
+        ids = windows[starts].astype(np.uint64) @ self._weights
+        # Multiply-shift hashing down to 32 bits
+        ids = (ids * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+        return ids, counts
+
+    def signatures(self, texts : list[str]) -> np.ndarray:
+        """MinHash signatures of texts.
+
+        Args:
+            texts (list[str]): Texts
+
+        Returns:
+            np.ndarray: Signature of each text, of shape (len(texts), numPerm), as uint32
+        """
+        result = np.empty((len(texts), self.numPerm), dtype=np.uint32)
+        if not texts:
+            return result
+        ids, counts = self.shingleIds(texts)
+        ends = np.cumsum(counts)
+        # One row per hash function, so that the minimum over the shingles of each text runs along contiguous memory
+        buffer = np.empty((self.numPerm, self.blockSize), dtype=np.uint64)
+        first = 0
+        while first < len(texts):
+            # Whole texts of at most `blockSize` shingles (at least one text)
+            start = ends[first - 1] if first else 0
+            last = max(first + 1, int(np.searchsorted(ends, start + self.blockSize, side="right")))
+            block = ids[start:ends[last - 1]]
+            hashed = buffer[:, :len(block)] if len(block) <= self.blockSize else np.empty((self.numPerm, len(block)), dtype=np.uint64)
+            np.multiply(self._a[:, None], block[None, :], out=hashed)
+            hashed += self._b[:, None]
+            hashed >>= np.uint64(32)
+            result[first:last] = np.minimum.reduceat(hashed, np.concatenate([[0], ends[first:last - 1] - start]), axis=1).T
+            first = last
+        return result
+
+class NearDuplicates:
+    """Clusters of near-duplicate arguments, artifact of the dedup stage of `processData.py`.
+    Each argument is referenced by its debate (kialoUrlId) and node (e.g. "1.2."), in the order the arguments were indexed.
+    Arguments without near duplicates are not stored. Within each debate, the first argument of a cluster represents the arguments of the cluster from that debate,
+    and the text of the first argument of the cluster (in any debate) is the text all of them are embedded with.
+    """
+
+    def __init__(self, clusters : list[list[tuple[str, str, str]]] = None):
+        """
+        Args:
+            clusters (list[list[tuple[str, str, str]]], optional): Arguments (debate, node and text) of each cluster, in the order they were indexed. Defaults to None (no clusters).
+        """
+        self.clusters = clusters or []
+        # (debate, node) -> index of its cluster and (debate, node, text) of its representative in the same debate
+        self._representatives = {}
+        for cluster, members in enumerate(self.clusters):
+            firsts = {}
+            for member in members:
+                self._representatives[member[:2]] = (cluster, firsts.setdefault(member[0], member))
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def nbDuplicates(self) -> int:
+        """Number of arguments that are not the first argument of their cluster."""
+        return sum(len(members) - 1 for members in self.clusters)
+
+    def cluster(self, debate : str, node : str) -> int:
+        """Index of the cluster of an argument, None if the argument has no near duplicates."""
+        entry = self._representatives.get((debate, node))
+        return entry[0] if entry is not None else None
+
+    def representative(self, debate : str, node : str) -> tuple[str, str, str]:
+        """Debate, node and text of the first argument of the same debate in the cluster of an argument (possibly itself), None if the argument has no near duplicates."""
+        entry = self._representatives.get((debate, node))
+        return entry[1] if entry is not None else None
+
+    def text(self, cluster : int) -> str:
+        """Text of the first argument of a cluster."""
+        return self.clusters[cluster][0][2]
+
+    def collapsedTexts(self):
+        """Debate, node and text of the first argument of its cluster of every clustered argument, i.e. the texts of the arguments in "collapse" mode."""
+        for members in self.clusters:
+            for debate, node, _ in members:
+                yield debate, node, members[0][2]
+
+    def save(self, path : os.path):
+        """Write the clusters to a CSV file, with one row per argument (`DUPLICATE_COLUMNS`), written next to `path` and only renamed once complete."""
+        rows = [(i, debate, node, text) for i, members in enumerate(self.clusters) for debate, node, text in members]
+        pd.DataFrame(rows, columns=DUPLICATE_COLUMNS).to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path : os.path) -> "NearDuplicates":
+        """Read the clusters written by `save`."""
+        df = pd.read_csv(path, dtype={"debate": str, "node": str, "text": str}, keep_default_na=False)
+        return cls([list(zip(group["debate"], group["node"], group["text"])) for _, group in df.groupby("cluster", sort=True)])
+
+class NearDuplicateIndex:
+    """Cluster near-duplicate arguments across debates with MinHash signatures and an LSH index, in roughly linear time.
+
+    The signatures (see `MinHasher`) are cut into bands, and arguments whose signatures are equal on a whole band share a bucket of that band.
+    Each argument of a bucket is compared with the first one, and both are linked if the share of equal signature values is at least `threshold`.
+    Clusters are the connected components of these links, so arguments can be clustered through an intermediate one.
+    """
+
+    def __init__(self, threshold : float = 0.8, numPerm : int = 64, shingleSize : int = 5, seed : int = 0):
+        """
+        Args:
+            threshold (float, optional): Estimated Jaccard similarity of the shingles above which two arguments are near duplicates. Defaults to 0.8.
+            numPerm (int, optional): Length of the MinHash signatures. Defaults to 64.
+            shingleSize (int, optional): Number of bytes of each shingle. Defaults to 5.
+            seed (int, optional): Seed of the hash functions. Defaults to 0.
+        """
+        self.threshold = threshold
+        self.hasher = MinHasher(numPerm, shingleSize, seed)
+        self.bands, self.rows = lshParameters(threshold, numPerm)
+        self._refs = []
+        self._texts = []
+        self._signatures = []
+
+    def __len__(self):
+        return len(self._refs)
+
+    def add(self, debate : str, nodes : list[str], texts : list[str]):
+        """Index arguments of a debate.
+
+        Args:
+            debate (str): kialoUrlId of the debate
+            nodes (list[str]): Names of the arguments
+            texts (list[str]): Cleaned texts of the arguments
+        """
+        self._refs.extend((debate, node) for node in nodes)
+        self._texts.extend(texts)
+        self._signatures.append(self.hasher.signatures(texts))
+
+    def addTree(self, debate : str, tree):
+        """Index the arguments of a parsed debate (`CompactTree` or tree of `rawKialo2Json`), except its root and its "See" arguments, which are never part of a pair."""
+        if isinstance(tree, CompactTree):
+            indices = [idx for idx in range(1, len(tree)) if not tree.isSee[idx]]
+            self.add(debate, [tree.names[idx] for idx in indices], [tree.cleanText(idx) for idx in indices])
+        else:
+            nodes = [node for name, node in tree.items() if node.parent is not None and not getattr(node, "isSee", False)]
+            self.add(debate, [node.name for node in nodes], [node.cleanInput for node in nodes])
+
+    def links(self) -> tuple[np.ndarray, np.ndarray]:
+        """Pairs of indexed arguments found to be near duplicates, as two arrays of positions."""
+        signatures = np.concatenate(self._signatures) if self._signatures else np.empty((0, self.hasher.numPerm), dtype=np.uint32)
+        rng = np.random.default_rng(0)
+        sources, targets = [], []
+        for band in range(self.bands):
+            columns = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            # Equal bands give equal keys, different ones collide with negligible probability and are then rejected by the comparison of the signatures
+            keys = columns @ rng.integers(1, 2**63, size=self.rows, dtype=np.uint64)
+            order = np.argsort(keys, kind="stable")
+            sortedKeys = keys[order]
+            newBucket = np.concatenate([[True], sortedKeys[1:] != sortedKeys[:-1]])
+            first = order[np.flatnonzero(newBucket)[np.cumsum(newBucket) - 1]]
+            candidates = order[~newBucket]
+            firsts = first[~newBucket]
+            similar = (signatures[candidates] == signatures[firsts]).mean(axis=1) >= self.threshold
+            sources.append(firsts[similar])
+            targets.append(candidates[similar])
+        if not sources:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(sources), np.concatenate(targets)
+
+    def clusters(self) -> NearDuplicates:
+        """Cluster the indexed arguments.
+
+        Returns:
+            NearDuplicates: Clusters of at least two arguments, with their arguments in the order they were indexed
+        """
+        parents = np.arange(len(self._refs))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for source, target in zip(*(links.tolist() for links in self.links())):
+            root1, root2 = find(source), find(target)
+            if root1 != root2:
+                # The smallest position stays the root, so that clusters keep the order of the arguments
+                parents[max(root1, root2)] = min(root1, root2)
+        roots = np.fromiter((find(i) for i in range(len(parents))), dtype=np.int64, count=len(parents))
+        members = {}
+        for i in np.flatnonzero(roots != np.arange(len(roots))).tolist():
+            members.setdefault(int(roots[i]), [int(roots[i])]).append(i)
+        return NearDuplicates([[(*self._refs[i], self._texts[i]) for i in members[root]] for root in sorted(members)])
+
+class DuplicateFilter:
+    """Filter the stream of rows generated from the debates (see `pair2Row`) with the clusters of near-duplicate arguments.
+
+    A pair is dropped when its arguments are near duplicates of each other, or when another pair with the same relation between arguments of the same clusters was already kept, in any debate.
+    With the "collapse" mode, the arguments that have near duplicates are also replaced by their representative in the same debate, with the text of the first argument of their cluster,
+    so that each cluster is embedded once across debates. Rows thus keep their debates, and `sameTree` as well as the debate-grouped splits of the dataset remain valid.
+    The statistics only keep the hash of each text (see `hashText`), so that the filter does not hold the texts of the corpus.
+    """
+
+    def __init__(self, duplicates : NearDuplicates, mode : str = "collapse"):
+        """
+        Args:
+            duplicates (NearDuplicates): Clusters of near-duplicate arguments
+            mode (str, optional): "skip" or "collapse". Defaults to "collapse".
+        """
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown deduplication mode {mode}, expected one of {DEDUP_MODES}")
+        self.duplicates = duplicates
+        self.mode = mode
+        # Keys of the pairs kept involving an argument with near duplicates, other pairs cannot repeat one another
+        self._seen = set()
+        # Hashes of the unique texts of the rows before and after the filter
+        self._textsIn = set()
+        self._textsOut = set()
+        self.pairsIn = 0
+        self.selfPairs = 0
+        self.duplicatePairs = 0
+
+    def filter(self, rows):
+        """Filter a stream of rows.
+
+        Args:
+            rows (Iterable[dict]): Rows of the dataset, with `ARGUMENT_REF_COLUMNS`
+
+        Yields:
+            dict: Rows kept, with the representatives of the arguments in their debate and the texts of their clusters in "collapse" mode
+        """
+        for row in rows:
+            self.pairsIn += 1
+            self._textsIn.add(hashText(row["argSrc"]))
+            self._textsIn.add(hashText(row["argTrg"]))
+            srcCluster = self.duplicates.cluster(row["srcDebate"], row["srcNode"])
+            trgCluster = self.duplicates.cluster(row["trgDebate"], row["trgNode"])
+            if srcCluster is not None or trgCluster is not None:
+                srcKey = srcCluster if srcCluster is not None else (row["srcDebate"], row["srcNode"])
+                trgKey = trgCluster if trgCluster is not None else (row["trgDebate"], row["trgNode"])
+                if srcKey == trgKey:
+                    self.selfPairs += 1
+                    continue
+                key = (srcKey, trgKey, row["relation"])
+                if key in self._seen:
+                    self.duplicatePairs += 1
+                    continue
+                self._seen.add(key)
+                if self.mode == "collapse":
+                    row = dict(row)
+                    if srcCluster is not None:
+                        row["srcNode"] = self.duplicates.representative(row["srcDebate"], row["srcNode"])[1]
+                        row["argSrc"] = self.duplicates.text(srcCluster)
+                    if trgCluster is not None:
+                        row["trgNode"] = self.duplicates.representative(row["trgDebate"], row["trgNode"])[1]
+                        row["argTrg"] = self.duplicates.text(trgCluster)
+            self._textsOut.add(hashText(row["argSrc"]))
+            self._textsOut.add(hashText(row["argTrg"]))
+            yield row
+
+    def stats(self) -> dict:
+        """Pairs dropped and unique texts (i.e. embeddings) saved by the filter so far."""
+        return {
+            "pairsIn"         : self.pairsIn,
+            "selfPairs"       : self.selfPairs,
+            "duplicatePairs"  : self.duplicatePairs,
+            "pairsSaved"      : self.selfPairs + self.duplicatePairs,
+            "embeddingsSaved" : len(self._textsIn) - len(self._textsOut),
+        }
@@ -0,0 +1,29 @@
+import re
+
+# Arguments repeating a previous one, e.g. "-> See 1.1.1.1.1."
+SEE_PATTERN = re.compile(r"-> See (\d\.)*")
+# Sources, e.g. "[124]"
+SOURCE_PATTERN = re.compile(r"\s*\[\d+\]")
+# Artifacts like (p. 1), (p. i), (p. ii), (p. 65-66), etc.
+PAGE_PATTERN = re.compile(r"\(\s*p\.\s*[\di]+(-\d+)*\s*\)")
+# Sources and page artifacts, removed in a single pass
+CLEANUP_PATTERN = re.compile(SOURCE_PATTERN.pattern + "|" + PAGE_PATTERN.pattern)
+
+def isSeeArgument(text : str) -> bool:
+    """Whether the argument only refers to another argument of the debate, i.e. "-> See 1.1.1.1.1."."""
+    return SEE_PATTERN.search(text) is not None
+
+def cleanArgument(text : str) -> str:
+    """Remove sources and page artifacts from an argument."""
+    return CLEANUP_PATTERN.sub("", text)
+
+def normalizeArgument(text : str) -> tuple[str, bool]:
+    """Normalize an argument once, when its debate is parsed.
+
+    Args:
+        text (str): Text of the argument
+
+    Returns:
+        tuple(str, bool): Text without sources and page artifacts, and whether the argument is a "See" argument, which pair generators skip
+    """
+    return cleanArgument(text), isSeeArgument(text)
@@ -1,20 +1,259 @@
-from scipy import spatial
+import os
+from multiprocessing import get_context
+import numpy as np
+from tqdm import tqdm
+
+# Backends of `loadEncoder`, all running on CPU
+ENCODER_BACKENDS = ["torch", "quantized", "onnx"]
+
+def loadEncoder(modelName, backend="torch", maxSeqLength=None, workers=1):
+    """Load the encoder of the arguments, anything with the `encode(sentences, batch_size, show_progress_bar)` method of `SentenceTransformer` returning one embedding per sentence.
+
+    Backends:
+    - "torch": the fp32 model, as loaded by `SentenceTransformer`
+    - "quantized": the model with its linear layers dynamically quantized to int8 by torch, usually about twice as fast on CPU for a small drift of the embeddings
+    - "onnx": the model exported to ONNX and run by onnxruntime (needs `pip install sentence-transformers[onnx]`)
+
+    Args:
+        modelName (str): Name of the model
+        backend (str, optional): One of `ENCODER_BACKENDS`. Defaults to "torch".
+        maxSeqLength (int, optional): Number of tokens an argument is truncated to, fewer tokens mean less padding and faster batches. Defaults to None (the default of the model).
+        workers (int, optional): Number of processes encoding the arguments, each with its own copy of the model (see `EncodePool`). Defaults to 1.
+
+    Raises:
+        ValueError: Raised if `backend` is unknown
+
+    Returns:
+        SentenceTransformer | EncodePool: The encoder
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend}, use one of {', '.join(ENCODER_BACKENDS)}.")
+    if workers > 1:
+        return EncodePool(modelName, workers, backend=backend, maxSeqLength=maxSeqLength)
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        model = SentenceTransformer(modelName, device="cpu", backend="onnx", trust_remote_code=True)
+    else:
+        model = SentenceTransformer(modelName, device="cpu", trust_remote_code=True)
+    if backend == "quantized":
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if maxSeqLength is not None:
+        model.max_seq_length = maxSeqLength
+    return model
+
+def encoderName(modelName, backend="torch", maxSeqLength=None):
+    """Name identifying the embeddings of an encoder, e.g. for the embedding cache: the model name, followed by the backend and the maximum sequence length when they change the embeddings.
+    The embeddings do not depend on the number of workers, so neither does the name.
+    """
+    name = modelName
+    if backend != "torch":
+        name += f":{backend}"
+    if maxSeqLength is not None:
+        name += f":max{maxSeqLength}"
+    return name
+
+# Encoder of the current worker process of an `EncodePool`
+_workerEncoder = None
+
+def _initEncodeWorker(modelName, backend, maxSeqLength, nbThreads):
+    global _workerEncoder
+    import torch
+    torch.set_num_threads(nbThreads)
+    _workerEncoder = loadEncoder(modelName, backend=backend, maxSeqLength=maxSeqLength)
+
+def _encodeBatch(batch):
+    return np.asarray(_workerEncoder.encode(batch, batch_size=len(batch), show_progress_bar=False), dtype=np.float32)
+
+class EncodePool:
+    """Encode arguments with several processes, each holding its own copy of the model and using its share of the CPU cores.
+    Sentences are sorted by length then cut into batches, so each batch holds sentences of similar length and little padding, and the batches are sharded across the processes.
+    The embeddings are the same as with a single process.
+
+    The processes are started with "spawn", so the pool should be created under `if __name__ == "__main__"`, and closed with `close` (or used as a context manager).
+    """
+
+    def __init__(self, modelName, workers, backend="torch", maxSeqLength=None):
+        """Start `workers` processes, each loading the encoder (see `loadEncoder`).
+
+        Args:
+            modelName (str): Name of the model
+            workers (int): Number of processes
+            backend (str, optional): Backend of the encoder of each process. Defaults to "torch".
+            maxSeqLength (int, optional): Number of tokens an argument is truncated to. Defaults to None (the default of the model).
+        """
+        nbThreads = max((os.cpu_count() or 1) // workers, 1)
+        self.workers = workers
+        self.pool = get_context("spawn").Pool(workers, initializer=_initEncodeWorker, initargs=(modelName, backend, maxSeqLength, nbThreads))
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False):
+        """Encode `sentences`, with the same signature as `SentenceTransformer.encode`.
+
+        Returns:
+            np.ndarray: Embedding of each sentence, in the order of `sentences`
+        """
+        sentences = list(sentences)
+        order = np.argsort(np.fromiter(map(len, sentences), dtype=np.int64, count=len(sentences)), kind="stable")
+        batches = [[sentences[i] for i in order[start:start+batch_size]] for start in range(0, len(order), batch_size)]
+        embeddings = None
+        start = 0
+        for batchEmbeddings in tqdm(self.pool.imap(_encodeBatch, batches), total=len(batches), disable=not show_progress_bar):
+            if embeddings is None:
+                embeddings = np.empty((len(sentences), batchEmbeddings.shape[1]), dtype=np.float32)
+            embeddings[order[start:start+len(batchEmbeddings)]] = batchEmbeddings
+            start += len(batchEmbeddings)
+        return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        self.pool.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 def getEmbeddingSimilarity(arg1, arg2):
+    # scipy is only imported here, it takes longer to import than the rest of the pipeline needs
+    from scipy import spatial
     return 1 - spatial.distance.cosine(arg1, arg2)
 
-def getEmbeddingsFromArgs(args, model):
+def getEmbeddingsFromArgs(args, model, batchSize=32, showProgress=False):
     # For nomic models with prompt prefix
-    # prompt_prefix = 'clustering: '    
-    prompt_prefix = ''    
+    # prompt_prefix = 'clustering: '
+    prompt_prefix = ''
     sentences = []
     for arg in list(args):
         sentence = prompt_prefix+arg
         sentences.append(sentence)
-    embeddings = model.encode(sentences)
+    embeddings = model.encode(sentences, batch_size=batchSize, show_progress_bar=showProgress)
     return embeddings
 
 def computeRowCosineSimilarity(row, model):
     embeddings = getEmbeddingsFromArgs([row["argSrc"], row["argTrg"]], model)
-    return getEmbeddingSimilarity(embeddings[0], embeddings[1])
\ No newline at end of file
+    return getEmbeddingSimilarity(embeddings[0], embeddings[1])
+
+def getUniqueArgs(argSrc, argTrg):
+    """Collect the unique argument texts used by a list of pairs.
+
+    Args:
+        argSrc (list[str]): Source argument of each pair
+        argTrg (list[str]): Target argument of each pair
+
+    Returns:
+        tuple(list[str], np.ndarray, np.ndarray): Unique texts in order of first appearance, and for each pair the index of its source and target text in that list
+    """
+    text2Idx = {}
+    srcIdx = np.fromiter((text2Idx.setdefault(x, len(text2Idx)) for x in argSrc), dtype=np.int64, count=len(argSrc))
+    trgIdx = np.fromiter((text2Idx.setdefault(x, len(text2Idx)) for x in argTrg), dtype=np.int64, count=len(argTrg))
+    return list(text2Idx), srcIdx, trgIdx
+
+def pairwiseCosineSimilarity(embeddings, srcIdx, trgIdx, chunkSize=100000):
+    """Compute the cosine similarity between rows `srcIdx[i]` and `trgIdx[i]` of `embeddings` for every pair `i`.
+    Pairs are processed in chunks, so only the rows used by a chunk are read from `embeddings` (which can be memory-mapped).
+
+    Args:
+        embeddings (np.ndarray): Matrix of embeddings, one row per unique argument
+        srcIdx (np.ndarray): Row index of the source argument of each pair
+        trgIdx (np.ndarray): Row index of the target argument of each pair
+        chunkSize (int, optional): Number of pairs processed at once. Defaults to 100000.
+
+    Returns:
+        np.ndarray: Cosine similarity of each pair
+    """
+    if not isinstance(embeddings, np.ndarray):
+        embeddings = np.asarray(embeddings)
+    similarities = np.empty(len(srcIdx), dtype=np.float32)
+    for start in range(0, len(srcIdx), chunkSize):
+        src = np.asarray(embeddings[srcIdx[start:start+chunkSize]], dtype=np.float32)
+        trg = np.asarray(embeddings[trgIdx[start:start+chunkSize]], dtype=np.float32)
+        norms = np.linalg.norm(src, axis=1) * np.linalg.norm(trg, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Zero vectors end up as NaN, like scipy's cosine distance would
+            similarities[start:start+chunkSize] = np.einsum("ij,ij->i", src, trg) / norms
+    return similarities
+
+def embedUniqueArgs(texts, model, batchSize=256, showProgress=True, cache=None, checkpointSize=None, flush=True):
+    """Embed a list of unique argument texts, reading them from the cache when possible.
+
+    Args:
+        texts (list[str]): Unique argument texts
+        model (SentenceTransformer): Model used to encode the arguments
+        batchSize (int, optional): Number of arguments encoded per batch. Defaults to 256.
+        showProgress (bool, optional): Whether to display the encoding progress bar and the cache hits. Defaults to True.
+        cache (EmbeddingCache, optional): Cache of previously computed embeddings for `model`, only missing arguments are encoded. Defaults to None.
+        checkpointSize (int, optional): With `cache`, number of arguments encoded between two flushes of the cache, so that an interrupted run only encodes again the arguments since the last flush. Defaults to None (flushed once all arguments are encoded).
+        flush (bool, optional): With `cache`, whether to flush the cache once done (new embeddings and recency of the hits), otherwise the caller flushes it. Defaults to True.
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): Matrix of embeddings (the memory-mapped cache matrix if `cache` is set) and row of each text in this matrix
+    """
+    if cache is None:
+        embeddings = getEmbeddingsFromArgs(texts, model, batchSize=batchSize, showProgress=showProgress)
+        return np.asarray(embeddings), np.arange(len(texts))
+
+    rows = cache.lookup(texts)
+    missing = np.flatnonzero(rows < 0)
+    if showProgress:
+        print(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} arguments to encode")
+    # Arguments of similar length are encoded together, so that batches hold little padding
+    missing = missing[np.argsort(np.fromiter((len(texts[i]) for i in missing), dtype=np.int64, count=len(missing)), kind="stable")]
+    step = checkpointSize or max(len(missing), 1)
+    for start in range(0, len(missing), step):
+        batch = missing[start:start+step]
+        batchTexts = [texts[i] for i in batch]
+        embeddings = getEmbeddingsFromArgs(batchTexts, model, batchSize=batchSize, showProgress=showProgress)
+        rows[batch] = cache.add(batchTexts, embeddings)
+        if flush:
+            cache.flush()
+    if flush and len(missing) == 0 and texts:
+        # Nothing was encoded, the hits were only marked as recently used in memory
+        cache.flush()
+    return cache.embeddings, rows
+
+def embedArguments(texts, model, batchSize=256, cache=None, checkpointSize=None):
+    """Embed a list of argument texts, encoding every unique text only once, without progress output.
+
+    Args:
+        texts (list[str]): Argument texts
+        model (SentenceTransformer): Model used to encode the arguments
+        batchSize (int, optional): Number of arguments encoded per batch. Defaults to 256.
+        cache (EmbeddingCache, optional): Cache of previously computed embeddings for `model`, only missing arguments are encoded. Defaults to None.
+        checkpointSize (int, optional): With `cache`, number of arguments added to the cache (over all calls) between two flushes, for callers embedding many small lists, which then flush the cache once done.
+            Defaults to None (flushed on every call).
+
+    Returns:
+        np.ndarray: Embedding of each text, one row per text
+    """
+    uniqueTexts, idx, _ = getUniqueArgs(texts, [])
+    if not uniqueTexts:
+        return np.empty((0, 0), dtype=np.float32)
+    embeddings, rows = embedUniqueArgs(uniqueTexts, model, batchSize=batchSize, showProgress=False, cache=cache, flush=checkpointSize is None)
+    if cache is not None and checkpointSize is not None and cache.unflushed >= checkpointSize:
+        cache.flush()
+    return np.asarray(embeddings[rows[idx]], dtype=np.float32)
+
+def computePairCosineSimilarities(argSrc, argTrg, model, batchSize=256, showProgress=True, cache=None):
+    """Compute the cosine similarity of each argument pair, encoding every unique argument only once.
+
+    Args:
+        argSrc (list[str]): Source argument of each pair
+        argTrg (list[str]): Target argument of each pair
+        model (SentenceTransformer): Model used to encode the arguments
+        batchSize (int, optional): Number of arguments encoded per batch. Defaults to 256.
+        showProgress (bool, optional): Whether to display the encoding progress bar. Defaults to True.
+        cache (EmbeddingCache, optional): Cache of previously computed embeddings for `model`, only missing arguments are encoded. Defaults to None.
+
+    Returns:
+        np.ndarray: Cosine similarity of each pair
+    """
+    texts, srcIdx, trgIdx = getUniqueArgs(argSrc, argTrg)
+    nbEncodesSaved = len(srcIdx) + len(trgIdx) - len(texts)
+    print(f"Found {len(texts)} unique arguments for {len(srcIdx)} pairs ({nbEncodesSaved} encodes saved)")
+    if not texts:
+        return np.empty(0, dtype=np.float32)
+
+    embeddings, rows = embedUniqueArgs(texts, model, batchSize=batchSize, showProgress=showProgress, cache=cache)
+    return pairwiseCosineSimilarity(embeddings, rows[srcIdx], rows[trgIdx])
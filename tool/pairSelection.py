@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+def smallestIndices(values : np.ndarray, k : int) -> np.ndarray:
+    """Indices of the `k` smallest values, in ascending order of value, in linear time plus the sort of the `k` values kept.
+    Equal values keep the order of their positions, as a stable sort would, including at the boundary of the selection. NaN values come last.
+
+    Args:
+        values (np.ndarray): 1D array of values
+        k (int): Number of values to keep
+
+    Returns:
+        np.ndarray: Indices of the selected values
+    """
+    values = np.asarray(values)
+    n = len(values)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(values, kind="stable")
+
+    threshold = values[np.argpartition(values, k - 1)[k - 1]]
+    if np.isnan(threshold):
+        below = np.flatnonzero(~np.isnan(values))
+        equal = np.flatnonzero(np.isnan(values))
+    else:
+        below = np.flatnonzero(values < threshold)
+        equal = np.flatnonzero(values == threshold)
+    indices = np.concatenate([below, equal[:k - len(below)]])
+    return indices[np.argsort(values[indices], kind="stable")]
+
+class SmallestRows:
+    """Keep the `k` rows of smallest `column` from a stream of DataFrames, without holding the whole stream in memory.
+    Rows are buffered and the buffer is cut back to the `k` best rows whenever it holds twice as many, so memory stays bounded by `2k` rows plus a chunk and each row is handled a constant number of times on average.
+    Once the buffer was cut back, rows of the following chunks that cannot beat the `k`-th best row so far are dropped right away.
+    The rows kept are the same as with `smallestIndices` on the concatenation of the stream.
+    """
+
+    def __init__(self, k : int = None, column : str = "similarity"):
+        """
+        Args:
+            k (int, optional): Number of rows to keep. Defaults to None (unknown until `result`, all rows are buffered).
+            column (str, optional): Column the rows are selected on. Defaults to "similarity".
+        """
+        self.k = k
+        self.column = column
+        self._chunks = []
+        self._size = 0
+        self._threshold = None
+
+    def __len__(self):
+        return self._size
+
+    def add(self, chunk : pd.DataFrame):
+        """Add a chunk of rows, in stream order."""
+        if self._threshold is not None:
+            # Later rows lose ties against the rows already kept
+            chunk = chunk[chunk[self.column].to_numpy() < self._threshold]
+        if chunk.empty:
+            return
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self.k is not None and self._size >= 2 * max(self.k, 1):
+            self._compact(self.k)
+
+    def _compact(self, k):
+        rows = pd.concat(self._chunks, ignore_index=True)
+        # Kept rows stay in stream order, so that ties are still broken by position
+        indices = np.sort(smallestIndices(rows[self.column].to_numpy(), k))
+        self._chunks = [rows.iloc[indices]]
+        self._size = len(indices)
+        if len(indices) == k and k > 0:
+            threshold = rows[self.column].to_numpy()[indices].max()
+            self._threshold = None if np.isnan(threshold) else threshold
+
+    def result(self, k : int = None) -> pd.DataFrame:
+        """Rows of smallest `column`, in ascending order.
+
+        Args:
+            k (int, optional): Number of rows, at most the one given to the constructor. Defaults to None (the one given to the constructor).
+
+        Returns:
+            pd.DataFrame: Selected rows, with a new index
+        """
+        k = self.k if k is None else k
+        if not self._chunks:
+            return pd.DataFrame()
+        rows = pd.concat(self._chunks, ignore_index=True)
+        return rows.iloc[smallestIndices(rows[self.column].to_numpy(), k)].reset_index(drop=True)
+
+def countRelations(rows, counts : dict):
+    """Pass through a stream of dataset rows, counting them by relation into `counts`."""
+    for row in rows:
+        counts[row["relation"]] = counts.get(row["relation"], 0) + 1
+        yield row
+
+def selectPairs(kp : pd.DataFrame) -> pd.DataFrame:
+    """Keep all support and attack pairs, and only the most dissimilar neutral pairs so that the dataset is balanced.
+    The objective is to have half as many neutral pairs as support and attack pairs, with a 50:50 split between sameTree and !sameTree.
+
+    Args:
+        kp (pd.DataFrame): All pairs, with their relation, sameTree and similarity
+
+    Returns:
+        pd.DataFrame: Pairs of the final dataset: support, attack, then the sameTree and diffTree neutral pairs by ascending similarity
+    """
+    relation = kp["relation"].to_numpy()
+    sameTree = kp["sameTree"].to_numpy(dtype=bool)
+    similarity = kp["similarity"].to_numpy()
+    isSupport, isAttack, isNeutral = relation == "support", relation == "attack", relation == "neutral"
+    k = (int(isSupport.sum()) + int(isAttack.sum())) // 2 // 2
+
+    parts = [np.flatnonzero(isSupport), np.flatnonzero(isAttack)]
+    for mask in [isNeutral & sameTree, isNeutral & ~sameTree]:
+        candidates = np.flatnonzero(mask)
+        parts.append(candidates[smallestIndices(similarity[candidates], k)])
+    return kp.iloc[np.concatenate(parts)].reset_index(drop=True)
+
+def selectPairChunks(chunks, nbArgumentPairs : int = None) -> pd.DataFrame:
+    """Equivalent of `selectPairs` on a stream of scored pairs, keeping only the candidate neutral pairs in memory.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Chunks of pairs, with their relation, sameTree and similarity
+        nbArgumentPairs (int, optional): Total number of support and attack pairs of the stream, if known upfront, which bounds the neutral pairs buffered. Defaults to None (all neutral pairs are buffered until the end of the stream).
+
+    Returns:
+        pd.DataFrame: Pairs of the final dataset, as returned by `selectPairs`
+    """
+    k = nbArgumentPairs // 2 // 2 if nbArgumentPairs is not None else None
+    support, attack = [], []
+    neutral = {True: SmallestRows(k), False: SmallestRows(k)}
+    nbSupport, nbAttack = 0, 0
+    for chunk in chunks:
+        relation = chunk["relation"].to_numpy()
+        sameTree = chunk["sameTree"].to_numpy(dtype=bool)
+        support.append(chunk[relation == "support"])
+        attack.append(chunk[relation == "attack"])
+        nbSupport += len(support[-1])
+        nbAttack += len(attack[-1])
+        neutral[True].add(chunk[(relation == "neutral") & sameTree])
+        neutral[False].add(chunk[(relation == "neutral") & ~sameTree])
+
+    if nbArgumentPairs is not None and nbArgumentPairs != nbSupport + nbAttack:
+        raise ValueError(f"Expected {nbArgumentPairs} support and attack pairs, found {nbSupport + nbAttack}")
+    k = (nbSupport + nbAttack) // 2 // 2
+    parts = support + attack + [neutral[True].result(k), neutral[False].result(k)]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,102 @@
+import os
+from itertools import islice
+import pandas as pd
+
+PAIR_COLUMNS = ["topic", "relation", "argSrc", "argTrg", "sameTree"]
+# Debate and node of each argument of a pair, used to build the columnar dataset (see `tool/columnarDataset.py`)
+ARGUMENT_REF_COLUMNS = ["srcDebate", "srcNode", "trgDebate", "trgNode"]
+
+def pair2Row(pair : dict) -> dict:
+    """Convert a pair generated by `processTree` into a row of the dataset.
+
+    Args:
+        pair (dict): Argument pair, as generated by `iterArgumentPairs` or `iterNeutralArgPairs`
+
+    Returns:
+        dict: Row with the columns of `PAIR_COLUMNS` and `ARGUMENT_REF_COLUMNS`
+    """
+    return {
+        "topic"     : pair["domain"],
+        "relation"  : pair["relation"],
+        "argSrc"    : pair["subArgument"],
+        "argTrg"    : pair["topArgument"],
+        "sameTree"  : pair["sameTree"],
+        "srcDebate" : pair["subArgumentDebate"],
+        "srcNode"   : pair["subArgumentName"],
+        "trgDebate" : pair["topArgumentDebate"],
+        "trgNode"   : pair["topArgumentName"],
+    }
+
+def iterChunks(records, chunkSize : int):
+    """Group a stream of records into lists of at most `chunkSize` records."""
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+def writeCsvInChunks(records, path : os.path, chunkSize : int = 100000, columns : list[str] = PAIR_COLUMNS) -> int:
+    """Write a stream of records to a CSV file, `chunkSize` records at a time, so that memory does not grow with the number of records.
+
+    Args:
+        records (Iterable[dict]): Records to write
+        path (os.path): Path of the CSV file
+        chunkSize (int, optional): Number of records held in memory at once. Defaults to 100000.
+        columns (list[str], optional): Columns of the CSV file. Defaults to PAIR_COLUMNS.
+
+    Returns:
+        int: Number of records written
+    """
+    chunks = (pd.DataFrame.from_records(chunk, columns=columns) for chunk in iterChunks(records, chunkSize))
+    return writeCsvChunks(chunks, path, columns)
+
+def writeCsvChunks(chunks, path : os.path, columns : list[str] = PAIR_COLUMNS) -> int:
+    """Append a stream of DataFrames to a CSV file.
+    The file is written next to `path` and only renamed once complete.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Chunks of rows to write
+        path (os.path): Path of the CSV file
+        columns (list[str], optional): Columns of the CSV file. Defaults to PAIR_COLUMNS.
+
+    Returns:
+        int: Number of rows written
+    """
+    nbRows = 0
+    for chunk in teeCsvChunks(chunks, path, columns):
+        nbRows += len(chunk)
+    return nbRows
+
+def teeCsvChunks(chunks, path : os.path, columns : list[str] = PAIR_COLUMNS):
+    """Pass through a stream of DataFrames, appending each of them to a CSV file on the way, e.g. to keep a side output of a stream consumed by something else.
+    The file is written next to `path` and only renamed once the stream is exhausted.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Chunks of rows to write
+        path (os.path): Path of the CSV file
+        columns (list[str], optional): Columns of the CSV file. Defaults to PAIR_COLUMNS.
+
+    Yields:
+        pd.DataFrame: Each chunk, once written
+    """
+    tmpPath = path + ".tmp"
+    pd.DataFrame(columns=columns).to_csv(tmpPath, index=False)
+    for chunk in chunks:
+        chunk[columns].to_csv(tmpPath, mode="a", header=False, index=False)
+        yield chunk
+    os.replace(tmpPath, path)
+
+def readCsvInChunks(path : os.path, chunkSize : int = 100000, dtype : dict = None):
+    """Read a CSV file written by `writeCsvInChunks`, `chunkSize` rows at a time.
+    Texts such as "NA" or empty arguments are kept as strings.
+
+    Args:
+        path (os.path): Path of the CSV file
+        chunkSize (int, optional): Number of rows per chunk. Defaults to 100000.
+        dtype (dict, optional): Type of some of the columns, as in `pd.read_csv`. Defaults to None (inferred).
+
+    Yields:
+        pd.DataFrame: Each chunk of rows
+    """
+    yield from pd.read_csv(path, chunksize=chunkSize, keep_default_na=False, na_values=[], dtype=dtype)
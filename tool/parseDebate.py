@@ -1,28 +1,64 @@
-import json, re
+import re
+from itertools import islice
 from anytree import Node
+from tool.compactTree import CompactTree
+from tool.pairCleanup import normalizeArgument
 
-def group_arguments(tableau):
-    argGroup = tableau[0]
-    i = 1
+# Version of the parser and of the trees it builds, parsed debates cached with another version are parsed again (see `tool/debateCache.py`)
+PARSER_VERSION = 2
 
-    while True:
+# Position of the argument in the tree, e.g. "1.2.1."
+TREE_PATTERN = re.compile(r"^(\d{1,}.)+")
+# Stance of the argument, also used to detect the first line of an argument
+STANCE_PATTERN = re.compile(r"(Con|Pro)(?::)")
+# Text of the argument
+CONTENT_PATTERN = re.compile(r"((Con|Pro)(?::\s))(.*)")
+# Each number of the tree position, the level of the argument being their count minus one
+LEVEL_PATTERN = re.compile(r"(\d{1,}(?=\.))+")
 
-        if i > len(tableau) - 1:
-            # Return if you reach the end of tableau
-            return [argGroup]
+def group_arguments(lines):
+    """Group the lines of a debate into arguments. A line containing a stance (`Pro:` or `Con:`) starts a new argument, any other line is appended to the current one.
 
-        stance = re.search(r"(Con|Pro)(?::)", tableau[i])
-        if stance == None:
-            argGroup = argGroup + " " + tableau[i]
-            i+=1
+    Args:
+        lines (Iterable[str]): Non-empty lines of the debate, without the header
+
+    Yields:
+        str: Each argument, as a single line
+    """
+    argGroup = None
+    for line in lines:
+        if argGroup is None:
+            argGroup = [line]
+        elif STANCE_PATTERN.search(line) is None:
+            argGroup.append(line)
         else:
-            return [argGroup] + group_arguments(tableau[i:]) 
+            yield " ".join(argGroup)
+            argGroup = [line]
 
+    if argGroup is None:
+        raise ValueError("The debate does not contain any argument.")
+    yield " ".join(argGroup)
 
+def readDebateLines(fi):
+    """Read the stripped, non-empty lines of a Kialo export up to its "Sources:" section.
 
-def rawKialo2Json(input_file):
-    """Uses kialoParser script to parse the Kialo file and convert it to a json file.
-    script by Edoardo Guido
+    Args:
+        fi (TextIO): Opened Kialo debate file
+
+    Yields:
+        str: Each non-empty line
+    """
+    for line in fi:
+        if line.startswith("Sources:"):
+            break
+        line = line.strip()
+        if line:
+            yield line
+
+def parseKialoArguments(input_file):
+    """Parse the arguments of a Kialo debate exported as text.
+    The file is read line by line in a single pass.
+    Adapted from the kialoParser script by Edoardo Guido
     edoardo.guido.93@gmail.com
     https://edoardoguido.com
 
@@ -30,65 +66,76 @@ def rawKialo2Json(input_file):
         input_file (str): Filename of the Kialo debate downloaded as txt.
 
     Returns:
-        dict: dictionnary containing information about each node, accessible by the node id.
+        tuple(str, list[dict]): Subject of the debate and list of parsed arguments, in file order. Each argument has its raw text ("ToneInput"), its text without sources and page artifacts ("CleanInput") and whether it is a "See" argument ("IsSee").
     """
     with open(input_file, 'r') as fi:
-        lines = []
-        for line in fi:
-            if line.startswith("Sources:"):
-                break
-            lines.append(line.strip())
+        lines = readDebateLines(fi)
 
-        lines = [x for x in lines if x]
-
-        # list containing each parsed comment
-        result = []
-
-        # we remove the first two lines of the text
+        # we remove the first four lines of the text
         # as we don't need the header
-        header = []
-        for line in range(0, 4):
-            header.append(lines.pop(0))
+        header = list(islice(lines, 4))
+        if len(header) < 4:
+            raise ValueError(f"The header of {input_file} is incomplete.")
 
         subject = header[1]
+        subjectId = subject.replace(" ","_")
 
-        lines = group_arguments(lines)
+        # list containing each parsed comment
+        result = []
 
-        ##                                            ##
-        ##                 REGEDITS              ##
-        ##                                            ##
-        # iterate every row in the text file
-        counter = 1
-        for line in lines:
+        # iterate every argument in the text file
+        for counter, line in enumerate(group_arguments(lines), start=1):
 
             # find the tree position the comment is in
-            tree =  re.search(r"^(\d{1,}.)+", line)
+            tree = TREE_PATTERN.search(line).group()
 
             # find if the comment is Pro or Con
-            stance = re.search(r"(Con|Pro)(?::)", line)
+            stance = STANCE_PATTERN.search(line)
 
             # find the text of the comment
-            content = re.search(r"((Con|Pro)(?::\s))(.*)", line)
+            content = CONTENT_PATTERN.search(line)
 
             # define the hierarchy of the current comment
             # which is based on the tree structure
+            level = len(LEVEL_PATTERN.findall(tree))-1
 
-            parsed = re.findall(r"(\d{1,}(?=\.))+", tree.group())
-            level = len(parsed)-1
+            # normalize the text once, and flag the arguments only referring to another one
+            cleanInput, isSee = normalizeArgument(content.group(3))
 
-            # make a dictionary with the single entry
-            # and put it at the end of the list
             result.append({
-                "Tree": tree.group(),
+                "Tree": tree,
                 "Level": level,
                 "Stance": stance.group(1),
                 "ToneInput": content.group(3),
-                "node_id":subject.replace(" ","_")+"_"+str(counter)
+                "CleanInput": cleanInput,
+                "IsSee": isSee,
+                "node_id": subjectId+"_"+str(counter)
             })
 
-            counter+=1
-        
-        to_write = json.dumps(result, sort_keys=True, indent=4, separators=(',', ': '))
+    return subject, result
+
+def rawKialo2CompactTree(input_file):
+    """Parse a Kialo debate exported as text into a `CompactTree`, which stores the nodes in flat arrays instead of one anytree node each.
+
+    Args:
+        input_file (str): Filename of the Kialo debate downloaded as txt.
+
+    Returns:
+        CompactTree: Tree of arguments, indexable by node id like the dictionary returned by `rawKialo2Json`.
+    """
+    subject, result = parseKialoArguments(input_file)
+    return CompactTree(subject, result)
+
+def rawKialo2Json(input_file):
+    """Parse a Kialo debate exported as text into a tree of anytree nodes.
+
+    Args:
+        input_file (str): Filename of the Kialo debate downloaded as txt.
+
+    Returns:
+        dict: dictionnary containing information about each node, accessible by the node id.
+    """
+    subject, result = parseKialoArguments(input_file)
 
     trees = [x["Tree"] for x in result]
     trees = ['1.'] + trees
@@ -105,12 +152,14 @@ def rawKialo2Json(input_file):
             parentId = idNode[:idNode[:-1].rfind(".")+1]
             id2Node[idNode] = Node(idNode,
                                     parent=id2Node[parentId],
-                                    tree=resultAsDict[idNode]["Tree"], 
-                                    level=resultAsDict[idNode]["Level"], 
-                                    stance=resultAsDict[idNode]["Stance"], 
-                                    toneInput=resultAsDict[idNode]["ToneInput"], 
+                                    tree=resultAsDict[idNode]["Tree"],
+                                    level=resultAsDict[idNode]["Level"],
+                                    stance=resultAsDict[idNode]["Stance"],
+                                    toneInput=resultAsDict[idNode]["ToneInput"],
+                                    cleanInput=resultAsDict[idNode]["CleanInput"],
+                                    isSee=resultAsDict[idNode]["IsSee"],
                                     subject=subject,
                                     node_id=resultAsDict[idNode]["node_id"]
     )
 
-    return id2Node
\ No newline at end of file
+    return id2Node
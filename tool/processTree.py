@@ -1,20 +1,52 @@
 import random
 from anytree import PreOrderIter, PostOrderIter, Walker
 from anytree.util import commonancestors
-from tqdm import tqdm
-from itertools import product, combinations
+from itertools import product, accumulate
+from bisect import bisect_left, bisect_right
+import numpy as np
+from tool.compactTree import CompactTree, CompactNode, STANCES
+from tool.pairSelection import smallestIndices
+
+def preOrderNames(node):
+    """Names of the nodes of the subtree rooted at `node` (anytree or compact node), in pre-order."""
+    if isinstance(node, CompactNode):
+        tree = node._tree
+        return [tree.names[i] for i in tree.subtreePreorder(node.idx)]
+    return [n.name for n in PreOrderIter(node)]
+
+def postOrderNames(node):
+    """Names of the nodes of the subtree rooted at `node` (anytree or compact node), in post-order."""
+    if isinstance(node, CompactNode):
+        tree = node._tree
+        return [tree.names[i] for i in tree.subtreePostorder(node.idx)]
+    return [n.name for n in PostOrderIter(node)]
+
+def argumentNames(tree, names):
+    """Filter out the "See" arguments (flagged when parsing the debate) from a list of node names."""
+    if isinstance(tree, CompactTree):
+        return [name for name in names if not tree.isSee[tree.name2Idx[name]]]
+    return [name for name in names if not getattr(tree[name], "isSee", False)]
 
 def pickRandomNodePair(tree):
-    nodes = [node.name for node in PreOrderIter(tree['1.'])]
-    # Remove root from list of choices
-    nodes.pop(0)
+    # Remove root and "See" arguments from list of choices
+    nodes = argumentNames(tree, preOrderNames(tree['1.'])[1:])
     node1_name, node2_name = random.sample(nodes, 2)
     return node1_name, node2_name
 
 def getCommonAncestor(tree, node1_name, node2_name):
+    if isinstance(tree, CompactTree):
+        return tuple(CompactNode(tree, i) for i in tree.commonAncestors(tree.name2Idx[node1_name], tree.name2Idx[node2_name]))
     return commonancestors(tree[node1_name], tree[node2_name])
 
+def rootIsOnlyCommonAncestor(tree, node1_name, node2_name):
+    """Whether the root is the only common ancestor of two nodes, in O(1) for a `CompactTree`."""
+    if isinstance(tree, CompactTree):
+        return tree.rootIsOnlyCommonAncestor(tree.name2Idx[node1_name], tree.name2Idx[node2_name])
+    return len(getCommonAncestor(tree, node1_name, node2_name)) == 1
+
 def distanceBetweenPair(tree, node1_name, node2_name):
+    if isinstance(tree, CompactTree):
+        return tree.distance(tree.name2Idx[node1_name], tree.name2Idx[node2_name])
     walker = Walker()
     path = walker.walk(tree[node1_name], tree[node2_name])
     upwards, _, downwards = path
@@ -36,8 +68,7 @@ def getNeutralPair(tree, threshold):
     attempt_limit = 1000
     for _ in range(attempt_limit):
         n1, n2 = pickRandomNodePair(tree)
-        rootIsOnlyCommonAncestor = len(getCommonAncestor(tree, n1, n2)) == 1
-        if not rootIsOnlyCommonAncestor:
+        if not rootIsOnlyCommonAncestor(tree, n1, n2):
             continue
         # First version used a tree walk to compute distance
         # distance = distanceBetweenPair(tree, n1, n2)
@@ -48,6 +79,89 @@ def getNeutralPair(tree, threshold):
         return n1, n2
     raise LookupError(f"Could not find a pair of nodes that satisfy the conditions after {attempt_limit} attempts")
 
+def getBranches(tree):
+    """Get the names of the nodes of each branch of the tree (i.e. each subtree of a child of the root), in post-order.
+    "See" arguments, which only refer to another argument, are left out.
+
+    Args:
+        tree (dict | CompactTree): dictionary of nodes representing the tree
+
+    Returns:
+        list[list[str]]: List of node names for each branch
+    """
+    root = tree['1.']
+    if root.children is None:
+        return []
+    return [argumentNames(tree, postOrderNames(child)) for child in root.children]
+
+class CrossBranchPairIndex:
+    """Index of the pairs of nodes from two different branches of a tree whose levels add up to at least `threshold`, i.e. the valid neutral pairs from the same tree.
+    The first node of a pair always belongs to an earlier branch than the second one.
+
+    The pairs are never materialized: for each minimum level `m`, the positions (in branch order) of the nodes of level `m` or more are kept in a sorted list.
+    The valid partners of a node are then a suffix of one of these lists, the nodes after its own branch. Memory is O(number of nodes * depth).
+    """
+
+    def __init__(self, tree, threshold):
+        branches = getBranches(tree)
+        self.names = [name for branch in branches for name in branch]
+        levels = [tree[name].level for name in self.names]
+
+        # Position of the first node after the branch of each node
+        branchEnds = []
+        for branch in branches:
+            branchEnds += [len(branchEnds) + len(branch)] * len(branch)
+
+        self.minLevels = [max(threshold - level, 0) for level in levels]
+        self.nodesAtLeast = {
+            m : [pos for pos, level in enumerate(levels) if level >= m]
+            for m in set(self.minLevels)
+        }
+        # First valid partner of each node in `nodesAtLeast[minLevels[pos]]`, and number of valid partners
+        self.partnerStarts = [bisect_left(self.nodesAtLeast[m], end) for m, end in zip(self.minLevels, branchEnds)]
+        self.weights = [len(self.nodesAtLeast[m]) - start for m, start in zip(self.minLevels, self.partnerStarts)]
+        self.cumulativeWeights = list(accumulate(self.weights))
+        self.count = self.cumulativeWeights[-1] if self.cumulativeWeights else 0
+
+    def partners(self, pos):
+        """Positions of the valid partners of the node at position `pos`."""
+        return self.nodesAtLeast[self.minLevels[pos]][self.partnerStarts[pos]:]
+
+    def pair(self, k):
+        """The `k`-th valid pair, as a pair of positions."""
+        pos = bisect_right(self.cumulativeWeights, k)
+        offset = k - (self.cumulativeWeights[pos] - self.weights[pos])
+        return pos, self.nodesAtLeast[self.minLevels[pos]][self.partnerStarts[pos] + offset]
+
+    def sample(self, n, rng = random):
+        """Sample `n` distinct valid pairs uniformly at random, in random order (all of them if there are less than `n`).
+
+        Args:
+            n (int): Number of pairs to sample
+            rng (random.Random, optional): Random number generator. Defaults to the `random` module.
+
+        Returns:
+            list[tuple[str, str]]: List of pairs of node names
+        """
+        if n >= self.count // 2:
+            # Most valid pairs are needed, list them all (at most 2n pairs)
+            positions = [(pos, partner) for pos in range(len(self.names)) for partner in self.partners(pos)]
+            if n < len(positions):
+                positions = rng.sample(positions, n)
+            else:
+                rng.shuffle(positions)
+        else:
+            # Rejection sampling, only duplicates are rejected, i.e. less than half the draws
+            positions = []
+            seen = set()
+            while len(positions) < n:
+                pair = self.pair(rng.randrange(self.count))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                positions.append(pair)
+        return [(self.names[pos1], self.names[pos2]) for pos1, pos2 in positions]
+
 def getAllNeutralPairsFromSameTree(tree, threshold):
     """Get all pairs of nodes that are at least `threshold` distance apart and have the root as their only common ancestor (i.e. arguments that aren't directly related)
 
@@ -58,37 +172,21 @@ def getAllNeutralPairsFromSameTree(tree, threshold):
     Returns:
         list(tuple(str, str)): List of pairs of node names
     """
-    root = tree['1.']
-    if root.children is None:
-        return []
+    branches = getBranches(tree)
+    levels = {name : tree[name].level for branch in branches for name in branch}
 
-    branches = []
-    for child in root.children:
-        # generate list of nodes for each 
-        branches.append([node.name for node in PostOrderIter(child)])
-
-    nodePairs = []    
-    for branchPair in combinations(branches, 2):
-        # generate combination of each node in each branch
-        nodePairs += list(product(branchPair[0], branchPair[1]))
-    
     neutralPairs = []
-    for n1, n2 in tqdm(nodePairs, desc="Finding neutral pairs"):
-        if n1 == n2:
-            continue
-        if (n1, n2) in neutralPairs:
-            continue
-        rootIsOnlyCommonAncestor = len(getCommonAncestor(tree, n1, n2)) == 1
-        if not rootIsOnlyCommonAncestor:
-            continue
-        # First version used a tree walk to compute distance
-        # distance = distanceBetweenPair(tree, n1, n2)
-        # Use the already set 'level' attribute of the node to compute it instead
-        distance = tree[n1].level + tree[n2].level
-        if distance < threshold:
-            continue
-        # Here, could add test via embedding similarity
-        neutralPairs.append((n1, n2))
+    for i, branch1 in enumerate(branches):
+        for branch2 in branches[i+1:]:
+            # Only generate pairs of arguments that are in different branches
+            # This guarantees that the root is the only common ancestor
+            # Nodes of branch2 far enough from a node of branch1, by minimum level required
+            partnersByMinLevel = {}
+            for n1 in branch1:
+                minLevel = threshold - levels[n1]
+                if minLevel not in partnersByMinLevel:
+                    partnersByMinLevel[minLevel] = [n2 for n2 in branch2 if levels[n2] >= minLevel]
+                neutralPairs += [(n1, n2) for n2 in partnersByMinLevel[minLevel]]
     return neutralPairs
 
 def getAllNeutralPairsFromDiffTrees(t1, t2):
@@ -101,124 +199,255 @@ def getAllNeutralPairsFromDiffTrees(t1, t2):
     Returns:
         list[tuple[str, str]]: List of pairs of node names
     """
-    nodes1 = [node.name for node in PostOrderIter(t1['1.'])]
-    nodes2 = [node.name for node in PostOrderIter(t2['1.'])]
-    # Remove roots from lists of choices
-    nodes1.pop()
-    nodes2.pop()
+    # Remove roots and "See" arguments from lists of choices
+    nodes1 = argumentNames(t1, postOrderNames(t1['1.'])[:-1])
+    nodes2 = argumentNames(t2, postOrderNames(t2['1.'])[:-1])
     neutralPairs = list(product(nodes1, nodes2))
     return neutralPairs
 
-def getNNeutralPairsFromSameTrees(tree, threshold, n = 1000):
+def getNNeutralPairsFromSameTrees(tree, threshold, n = 1000, rng = random):
     """Get `n` pairs of nodes that are at least `threshold` distance apart and have the root as their only common ancestor (i.e. arguments that aren't directly related)
 
     Args:
         t1 (dict): dictionnary of nodes
         threshold (int): minimum distance between nodes
         n (int, optional): Number of pairs to generate. Defaults to 1000.
+        rng (random.Random, optional): Random number generator, pass a seeded one for reproducible pairs. Defaults to the `random` module.
+
+    The pairs are drawn uniformly among all valid pairs, without listing them (see `CrossBranchPairIndex`).
 
     Returns:
         list[tuple[str, str]]: List of pairs of node names
     """
-    root = tree['1.']
-    if root.children is None:
-        return []
-
     # Only generate pairs of arguments that are in different branches
     # This guarantees that the root is the only common ancestor
-    branches = []
-    for child in root.children:
-        # generate list of nodes for each 
-        branches.append([node.name for node in PostOrderIter(child)])
-
-    nodePairs = []
-    for branchPair in combinations(branches, 2):
-        # generate combination of each node in each branch
-        # same as [(x,y) for x in branchPair[0] for y in branchPair[1]]
-        nodePairs += list(product(branchPair[0], branchPair[1]))
-    
-    # Shuffle the list of pairs to avoid bias
-    random.shuffle(nodePairs)
-    neutralPairs = []
-    # Keep generating pairs until we have enough
-    while len(neutralPairs) < n and nodePairs:
-        n1, n2 = nodePairs.pop()
-        # The three tests below are redundant, but kept just in case
-        if n1 == n2:
-            continue
-        if (n1, n2) in neutralPairs:
-            continue
-        rootIsOnlyCommonAncestor = len(getCommonAncestor(tree, n1, n2)) == 1
-        if not rootIsOnlyCommonAncestor:
-            continue
-        # First version used a tree walk to compute distance
-        # distance = distanceBetweenPair(tree, n1, n2)
-        # Use the already set 'level' attribute of the node to compute it instead
-        distance = tree[n1].level + tree[n2].level
-        if distance < threshold:
-            continue
-        # Here, could add test via embedding similarity
-        neutralPairs.append((n1, n2))
-    
-    return neutralPairs
+    return CrossBranchPairIndex(tree, threshold).sample(n, rng)
 
-def getNNeutralPairsFromDiffTrees(t1, t2, n = 1000):
+def getNNeutralPairsFromDiffTrees(t1, t2, n = 1000, rng = random):
     """Get `n` pairs of nodes that are from different trees (i.e. arguments that aren't directly related)
 
+    The pairs are drawn as indices in the product of both lists of nodes, which is never materialized: memory only grows with `n`.
+    Drawing from the indices picks the same pairs as sampling the product list with the same `rng`.
+
     Args:
         t1 (dict): dictionnary of nodes for the first tree
         t2 (dict): dictionnary of nodes for the second tree
-        n (int, optional): Number of pairs to generate. Defaults to 1000.
+        n (int, optional): Number of pairs to generate. Defaults to 1000. If there are fewer possible pairs, all of them are returned in random order.
+        rng (random.Random, optional): Random number generator, pass a seeded one for reproducible pairs. Defaults to the `random` module.
 
     Returns:
         list[tuple[str, str]]: List of pairs of node names
     """
-    allNeutralPairs = getAllNeutralPairsFromDiffTrees(t1, t2)
-    neutralPairs = random.sample(allNeutralPairs, n)
+    # Remove roots and "See" arguments from lists of choices
+    nodes1 = argumentNames(t1, postOrderNames(t1['1.'])[:-1])
+    nodes2 = argumentNames(t2, postOrderNames(t2['1.'])[:-1])
+    nbPairs = len(nodes1) * len(nodes2)
+    # Index k stands for the k-th pair of product(nodes1, nodes2)
+    indices = rng.sample(range(nbPairs), min(n, nbPairs))
+    neutralPairs = [(nodes1[k // len(nodes2)], nodes2[k % len(nodes2)]) for k in indices]
     return neutralPairs
 
 
+def embedTreeArguments(tree, embed):
+    """Embed the arguments of a tree once, for the neutral pair mining.
+
+    Args:
+        tree (dict | CompactTree): Tree of the debate
+        embed (callable): Returns the embedding matrix of a list of texts, one row per text
+
+    Returns:
+        tuple(list[str], np.ndarray): Names of the arguments (without the root and "See" arguments, in post-order, i.e. branch by branch) and their embeddings normalized to unit length (float32)
+    """
+    names = argumentNames(tree, postOrderNames(tree['1.'])[:-1])
+    if not names:
+        return names, np.empty((0, 0), dtype=np.float32)
+    embeddings = np.asarray(embed([tree[name].cleanInput for name in names]), dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # Zero vectors are left as is, with a similarity of 0 to every argument
+    embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+    return names, embeddings
+
+def leastSimilarPairs(embeddings1, embeddings2, k, valid=None, blockSize=1024):
+    """Find the `k` pairs of rows of two normalized embedding matrices with the lowest cosine similarity.
+    The similarity matrix is computed one `blockSize` x `blockSize` block at a time and only the best `k` pairs are kept between blocks, so memory is bounded by the block size and `k`.
+
+    Args:
+        embeddings1 (np.ndarray): Normalized embeddings of the first arguments of the pairs
+        embeddings2 (np.ndarray): Normalized embeddings of the second arguments of the pairs
+        k (int): Number of pairs to find
+        valid (callable, optional): Called with the ranges of rows of a block, returns the boolean matrix of the valid pairs of the block, or None if none of them is. Defaults to None (all pairs are valid).
+        blockSize (int, optional): Number of rows of each matrix per block. Defaults to 1024.
+
+    Returns:
+        tuple(np.ndarray, np.ndarray, np.ndarray): Rows in `embeddings1` and `embeddings2` of each pair, and its similarity, by ascending similarity (ties in row order)
+    """
+    n2 = len(embeddings2)
+    bestSimilarities = np.empty(0, dtype=np.float32)
+    bestPositions = np.empty(0, dtype=np.int64)
+    if k <= 0:
+        return bestPositions, bestPositions, bestSimilarities
+    for start1 in range(0, len(embeddings1), blockSize):
+        rows1 = range(start1, min(start1 + blockSize, len(embeddings1)))
+        for start2 in range(0, n2, blockSize):
+            rows2 = range(start2, min(start2 + blockSize, n2))
+            mask = valid(rows1, rows2) if valid is not None else None
+            if valid is not None and (mask is None or not mask.any()):
+                continue
+            similarities = embeddings1[rows1.start:rows1.stop] @ embeddings2[rows2.start:rows2.stop].T
+            candidates = np.flatnonzero(mask) if mask is not None else np.arange(similarities.size)
+            values = similarities.ravel()[candidates]
+            if len(bestSimilarities) == k:
+                # Pairs that cannot beat the current best ones are dropped before merging
+                keep = values <= bestSimilarities[-1]
+                candidates, values = candidates[keep], values[keep]
+            kept = smallestIndices(values, k)
+            i, j = np.divmod(candidates[kept], len(rows2))
+            positions = (i + rows1.start) * n2 + (j + rows2.start)
+
+            similarities = np.concatenate([bestSimilarities, values[kept]])
+            positions = np.concatenate([bestPositions, positions])
+            order = np.lexsort((positions, similarities))[:k]
+            bestSimilarities, bestPositions = similarities[order], positions[order]
+    rows1, rows2 = np.divmod(bestPositions, n2)
+    return rows1, rows2, bestSimilarities
+
+def mineNeutralPairsFromSameTree(tree, threshold, k, embedded, blockSize=1024):
+    """Get the `k` most dissimilar pairs of nodes that are at least `threshold` distance apart and have the root as their only common ancestor, i.e. the valid pairs of `getNNeutralPairsFromSameTrees`.
+    Rather than sampling pairs at random to filter them on their similarity later, the similarity of every valid pair is computed from the embeddings of the arguments, block by block (see `leastSimilarPairs`).
+
+    Args:
+        tree (dict | CompactTree): Tree of the debate
+        threshold (int): minimum distance between nodes
+        k (int): Number of pairs to find
+        embedded (tuple(list[str], np.ndarray)): Arguments of `tree` and their embeddings, as returned by `embedTreeArguments`
+        blockSize (int, optional): Number of arguments per block of the similarity matrix. Defaults to 1024.
+
+    Returns:
+        list[tuple[str, str]]: List of pairs of node names, the first node always belonging to an earlier branch, by ascending similarity
+    """
+    names, embeddings = embedded
+    # Arguments are sorted by branch, see `embedTreeArguments`
+    branch = np.array([b for b, branchNames in enumerate(getBranches(tree)) for _ in branchNames], dtype=np.int32)
+    level = np.array([tree[name].level for name in names], dtype=np.int32)
+
+    def valid(rows1, rows2):
+        # Blocks entirely below the diagonal only hold pairs from the same branch or in the wrong order
+        if rows2.stop <= rows1.start:
+            return None
+        branch1, branch2 = branch[rows1.start:rows1.stop, None], branch[None, rows2.start:rows2.stop]
+        level1, level2 = level[rows1.start:rows1.stop, None], level[None, rows2.start:rows2.stop]
+        return (branch1 < branch2) & (level1 + level2 >= threshold)
+
+    rows1, rows2, _ = leastSimilarPairs(embeddings, embeddings, k, valid, blockSize)
+    return [(names[i], names[j]) for i, j in zip(rows1.tolist(), rows2.tolist())]
+
+def mineNeutralPairsFromDiffTrees(embedded1, embedded2, k, blockSize=1024):
+    """Get the `k` most dissimilar pairs of nodes from two different trees, computed from the embeddings of their arguments block by block (see `leastSimilarPairs`).
 
-def argumentTree2argumentPairTree(node, domains):
+    Args:
+        embedded1 (tuple(list[str], np.ndarray)): Arguments of the first tree and their embeddings, as returned by `embedTreeArguments`
+        embedded2 (tuple(list[str], np.ndarray)): Arguments of the second tree and their embeddings
+        k (int): Number of pairs to find
+        blockSize (int, optional): Number of arguments per block of the similarity matrix. Defaults to 1024.
+
+    Returns:
+        list[tuple[str, str]]: List of pairs of node names, by ascending similarity
+    """
+    names1, embeddings1 = embedded1
+    names2, embeddings2 = embedded2
+    rows1, rows2, _ = leastSimilarPairs(embeddings1, embeddings2, k, blockSize=blockSize)
+    return [(names1[i], names2[j]) for i, j in zip(rows1.tolist(), rows2.tolist())]
+
+
+
+def argumentTree2argumentPairTree(node, domains, debate=None):
     """Convert an argument tree to a list of argument pairs.
 
     Args:
-        node (anytree.Node): Node of the argument tree, typically the root node.
+        node (anytree.Node | CompactNode): Node of the argument tree, typically the root node.
         domains (str): Debate subject tags, i.e. "Politics", "Economics", etc.
+        debate (str, optional): Identifier of the debate (e.g. its kialoUrlId), stored with each argument of the pairs. Defaults to None.
 
     Returns:
         list: List of argument pairs, where each pair is a dictionary containing the argument pair, the relationship and additional information.
     """
-    pairs = []
-    
-    if len(node.children) == 0:
-        return pairs
-    elif node.children != None:
-        for child in node.children:
-            if node.name != "1.":
-                pair = {
-                    "topArgument"       :   node.toneInput,
-                    "subArgument"       :   child.toneInput,
-                    "subject"           :   child.subject,
-                    "subArgumentLevel"  :   child.level,
-                    "domain"            :   domains,
-                    "sameTree"        :   True
-                }
-                if child.stance == "Con":
-                    pair["relation"] = "attack"
-                else:
-                    pair["relation"] = "support"
-                pairs.append(pair)
-
-            pairs += argumentTree2argumentPairTree(child, domains)
-        
-    return pairs
-
-
-def nodePair2NeutralArgPair(node1, node2, domains_n1, domains_n2, same_tree):
+    return list(iterArgumentPairs(node, domains, debate))
+
+def iterArgumentPairs(node, domains, debate=None):
+    """Generate the argument pairs of an argument tree one by one, see `argumentTree2argumentPairTree`.
+    Each node of the subtree of `node` forms a pair with its parent, except the children of the root and "See" arguments. The pairs are generated in pre-order, with the normalized texts of the arguments.
+
+    Args:
+        node (anytree.Node | CompactNode): Node of the argument tree, typically the root node.
+        domains (str): Debate subject tags, i.e. "Politics", "Economics", etc.
+        debate (str, optional): Identifier of the debate (e.g. its kialoUrlId), stored with each argument of the pairs. Defaults to None.
+
+    Yields:
+        dict: Argument pair, with the relationship and additional information.
+    """
+    if isinstance(node, CompactNode):
+        yield from iterCompactArgumentPairs(node, domains, debate)
+        return
+
+    nodes = PreOrderIter(node)
+    # Skip `node` itself
+    next(nodes)
+    for child in nodes:
+        parent = child.parent
+        if parent.name == "1." or child.isSee or parent.isSee:
+            continue
+        pair = {
+            "topArgument"       :   parent.cleanInput,
+            "subArgument"       :   child.cleanInput,
+            "topArgumentName"   :   parent.name,
+            "subArgumentName"   :   child.name,
+            "topArgumentDebate" :   debate,
+            "subArgumentDebate" :   debate,
+            "subject"           :   child.subject,
+            "subArgumentLevel"  :   child.level,
+            "domain"            :   domains,
+            "sameTree"        :   True
+        }
+        if child.stance == "Con":
+            pair["relation"] = "attack"
+        else:
+            pair["relation"] = "support"
+        yield pair
+
+def iterCompactArgumentPairs(node, domains, debate=None):
+    """Same as `iterArgumentPairs` for a node of a `CompactTree`, reading the arrays of the tree directly."""
+    tree = node._tree
+    for idx in tree.subtreePreorder(node.idx)[1:].tolist():
+        parentIdx = tree.parent[idx]
+        if parentIdx == 0 or tree.isSee[idx] or tree.isSee[parentIdx]:
+            continue
+        pair = {
+            "topArgument"       :   tree.cleanText(parentIdx),
+            "subArgument"       :   tree.cleanText(idx),
+            "topArgumentName"   :   tree.names[parentIdx],
+            "subArgumentName"   :   tree.names[idx],
+            "topArgumentDebate" :   debate,
+            "subArgumentDebate" :   debate,
+            "subject"           :   tree.subject,
+            "subArgumentLevel"  :   int(tree.level[idx]),
+            "domain"            :   domains,
+            "sameTree"        :   True
+        }
+        if tree.stance[idx] == STANCES.index("Con"):
+            pair["relation"] = "attack"
+        else:
+            pair["relation"] = "support"
+        yield pair
+
+
+def nodePair2NeutralArgPair(node1, node2, domains_n1, domains_n2, same_tree, debate_n1=None, debate_n2=None):
     pair = {
-            "topArgument"  :   node1.toneInput,
-            "subArgument"  :   node2.toneInput,
+            "topArgument"  :   node1.cleanInput,
+            "subArgument"  :   node2.cleanInput,
+            "topArgumentName"   :   node1.name,
+            "subArgumentName"   :   node2.name,
+            "topArgumentDebate" :   debate_n1,
+            "subArgumentDebate" :   debate_n2 if not same_tree else debate_n1,
             "relation"          :   "neutral"
         }
 
@@ -233,8 +462,25 @@ def nodePair2NeutralArgPair(node1, node2, domains_n1, domains_n2, same_tree):
 
     return pair
 
-def namePairs2NeutralArgPairs(tree, nodes, domains_n1, tree2=None, domains_n2=None, same_tree=True):
-    pairs = []
+def namePairs2NeutralArgPairs(tree, nodes, domains_n1, tree2=None, domains_n2=None, same_tree=True, debate_n1=None, debate_n2=None):
+    return list(iterNeutralArgPairs(tree, nodes, domains_n1, tree2, domains_n2, same_tree, debate_n1, debate_n2))
+
+def iterNeutralArgPairs(tree, nodes, domains_n1, tree2=None, domains_n2=None, same_tree=True, debate_n1=None, debate_n2=None):
+    """Generate the neutral argument pairs for each pair of node names, and their reverse pairs, one by one.
+
+    Args:
+        tree (dict | CompactTree): Tree of the first node of each pair
+        nodes (Iterable[tuple[str, str]]): Pairs of node names
+        domains_n1 (str): Debate subject tags of `tree`
+        tree2 (dict | CompactTree, optional): Tree of the second node of each pair, if not `tree`. Defaults to None.
+        domains_n2 (str, optional): Debate subject tags of `tree2`. Defaults to None.
+        same_tree (bool, optional): Whether both nodes come from `tree`. Defaults to True.
+        debate_n1 (str, optional): Identifier of the debate of `tree` (e.g. its kialoUrlId). Defaults to None.
+        debate_n2 (str, optional): Identifier of the debate of `tree2`. Defaults to None.
+
+    Yields:
+        dict: Neutral argument pair
+    """
     for nodeName1, nodeName2 in nodes:
         node1 = tree[nodeName1]
         if same_tree:
@@ -242,12 +488,9 @@ def namePairs2NeutralArgPairs(tree, nodes, domains_n1, tree2=None, domains_n2=No
         else:
             node2 = tree2[nodeName2]
 
-        pair = nodePair2NeutralArgPair(node1, node2, domains_n1, domains_n2, same_tree)
-        pairs.append(pair)
+        yield nodePair2NeutralArgPair(node1, node2, domains_n1, domains_n2, same_tree, debate_n1, debate_n2)
 
         if same_tree:
             domains_n2 = domains_n1
-        reverse_pair = nodePair2NeutralArgPair(node2, node1, domains_n2, domains_n1, same_tree)
-        pairs.append(reverse_pair)
-
-    return pairs
\ No newline at end of file
+            debate_n2 = debate_n1
+        yield nodePair2NeutralArgPair(node2, node1, domains_n2, domains_n1, same_tree, debate_n2, debate_n1)
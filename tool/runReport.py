@@ -0,0 +1,181 @@
+import os, sys, json, time, platform, resource, tracemalloc, cProfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import pandas as pd
+
+# Columns of the per-debate records, one row per debate and stage
+DEBATE_COLUMNS = ["debate", "stage", "seconds", "peakMemoryMB", "nodes", "pairs", "error", "message"]
+
+def maxRssMB() -> float:
+    """Peak resident memory of this process and of its finished child processes so far, in MB (`ru_maxrss` is in kilobytes on Linux, bytes on macOS)."""
+    unit = 1 if sys.platform == "darwin" else 1024
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage * unit / 2**20
+
+@contextmanager
+def measureDebate(records : list, kialoUrlId : str, stage : str, traceMemory : bool = False):
+    """Measure one stage of one debate and append its record (see `DEBATE_COLUMNS`) to `records`.
+    The record is yielded so that the stage can fill in its number of nodes and pairs. An exception is recorded with its type, then raised again.
+
+    Args:
+        records (list): Records of the run
+        kialoUrlId (str): Debate being processed
+        stage (str): Name of the stage, e.g. "parse"
+        traceMemory (bool, optional): Whether to measure the peak memory allocated by the stage with `tracemalloc`, which slows it down. Defaults to False.
+    """
+    record = dict.fromkeys(DEBATE_COLUMNS)
+    record.update(debate=kialoUrlId, stage=stage)
+    started = traceMemory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif traceMemory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        record["message"] = str(e)[:500]
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        if traceMemory:
+            record["peakMemoryMB"] = tracemalloc.get_traced_memory()[1] / 2**20
+        if started:
+            tracemalloc.stop()
+        records.append(record)
+
+class RunReport:
+    """Measurements of a run of the pipeline: a record per debate and stage (see `measureDebate`), and the totals of the pipeline stages (see `stage`).
+    One stage can be profiled with cProfile, its statistics are written with the report.
+    """
+
+    def __init__(self, traceMemory : bool = False, profileStage : str = None):
+        """
+        Args:
+            traceMemory (bool, optional): Whether the debate stages measure their peak memory with `tracemalloc`. Defaults to False.
+            profileStage (str, optional): Pipeline stage profiled with cProfile. Defaults to None.
+        """
+        self.traceMemory = traceMemory
+        self.profileStage = profileStage
+        self.profiler = cProfile.Profile() if profileStage else None
+        self.debates = []
+        self.stages = {}
+        self.startDate = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        # Stages in progress, with the time spent in the stages nested in them
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name : str):
+        """Measure a pipeline stage, which can be entered several times (e.g. once per item of a lazy stream, see `timedIter`).
+        Time spent in nested stages is only counted for them. The counters set in the dictionary yielded (e.g. `stage["pairs"] = n`) are summed over the calls of the stage.
+
+        Args:
+            name (str): Name of the stage, e.g. "embed"
+        """
+        totals = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "maxRssMB": None, "counts": {}})
+        counts = {}
+        profiling = self.profiler is not None and self._stack and self._stack[-1][0] == self.profileStage
+        if profiling and name != self.profileStage:
+            self.profiler.disable()
+        elif name == self.profileStage and not profiling:
+            self.profiler.enable()
+        self._stack.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            elapsed = time.perf_counter() - start
+            _, nestedSeconds = self._stack.pop()
+            if name == self.profileStage and not profiling:
+                self.profiler.disable()
+            elif profiling and name != self.profileStage:
+                self.profiler.enable()
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            totals["seconds"] += elapsed - nestedSeconds
+            totals["calls"] += 1
+            totals["maxRssMB"] = maxRssMB()
+            for key, value in counts.items():
+                totals["counts"][key] = totals["counts"].get(key, 0) + value
+
+    def timedIter(self, iterable, name : str, count=None):
+        """Pass through a lazy stream, counting the time spent producing each item in the stage `name`.
+
+        Args:
+            iterable (Iterable): Stream to time
+            name (str): Name of the stage
+            count (callable, optional): Returns the counters of an item for the stage, e.g. `lambda chunk: {"pairs": len(chunk)}`. Defaults to None.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as counts:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                if count is not None:
+                    counts.update(count(item))
+            yield item
+
+    def debateTotals(self) -> dict:
+        """Totals of each debate stage: time, debates processed, failures (by exception type), nodes and pairs."""
+        totals = {}
+        for record in self.debates:
+            stage = totals.setdefault(record["stage"], {"seconds": 0.0, "debates": 0, "nodes": 0, "pairs": 0, "failures": {}, "maxPeakMemoryMB": None})
+            stage["seconds"] += record["seconds"]
+            stage["debates"] += 1
+            stage["nodes"] += record["nodes"] or 0
+            stage["pairs"] += record["pairs"] or 0
+            if record["error"] is not None:
+                stage["failures"][record["error"]] = stage["failures"].get(record["error"], 0) + 1
+            if record["peakMemoryMB"] is not None:
+                stage["maxPeakMemoryMB"] = max(stage["maxPeakMemoryMB"] or 0, record["peakMemoryMB"])
+        return totals
+
+    def failures(self) -> list[dict]:
+        """Records of the debate stages that failed."""
+        return [record for record in self.debates if record["error"] is not None]
+
+    def save(self, folderPath : os.path, name : str = "runReport", options : dict = None) -> os.path:
+        """Write the report as `<name>.json` (totals, failures and every record), the debate records as `<name>Debates.csv`, and the profile of the profiled stage as `<name>-<stage>.prof` (readable with `pstats` or snakeviz).
+
+        Args:
+            folderPath (os.path): Folder of the report
+            name (str, optional): Name of the report files. Defaults to "runReport".
+            options (dict, optional): Options of the run, stored in the report. Defaults to None.
+
+        Returns:
+            os.path: Path of the JSON report
+        """
+        os.makedirs(folderPath, exist_ok=True)
+        report = {
+            "date"         : self.startDate.isoformat(timespec="seconds"),
+            "seconds"      : time.perf_counter() - self._start,
+            "maxRssMB"     : maxRssMB(),
+            "python"       : platform.python_version(),
+            "options"      : options,
+            "stages"       : self.stages,
+            "debateStages" : self.debateTotals(),
+            "failures"     : self.failures(),
+            "debates"      : self.debates,
+        }
+        jsonPath = os.path.join(folderPath, name + ".json")
+        with open(jsonPath + ".tmp", "w") as f:
+            json.dump(report, f, indent=1, default=str)
+        os.replace(jsonPath + ".tmp", jsonPath)
+        pd.DataFrame(self.debates, columns=DEBATE_COLUMNS).astype({"nodes": "Int64", "pairs": "Int64"}).to_csv(os.path.join(folderPath, name + "Debates.csv"), index=False)
+        if self.profiler is not None:
+            self.profiler.dump_stats(os.path.join(folderPath, f"{name}-{self.profileStage}.prof"))
+        return jsonPath
+
+    def summary(self) -> str:
+        """Short text summary of the stages and failures of the run."""
+        lines = [f"{'stage':>10} {'time (s)':>9} {'max RSS (MB)':>13}"]
+        for name, stage in self.stages.items():
+            lines.append(f"{name:>10} {stage['seconds']:>9.2f} {stage['maxRssMB']:>13.0f}")
+        for name, stage in self.debateTotals().items():
+            failures = ", ".join(f"{count} {error}" for error, count in stage["failures"].items())
+            lines.append(f"{name:>10} {stage['seconds']:>9.2f} {'':>13} {stage['debates']} debates" + (f", failed: {failures}" if failures else ""))
+        return "\n".join(lines)
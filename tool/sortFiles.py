@@ -1,34 +1,122 @@
-import os, shutil
-from langdetect import detect, LangDetectException
+import os, json, shutil
+from multiprocessing import Pool
+from tool.fileHash import hashFile
 
-def classifyFilesByLanguage(baseFolderPath : os.path):
-    """Classify debate files by their language. Will sort them into folders named after the detected language. 
-    The folders will be created in the same directory as the original files. 
-    The original files will be copied to the new folders. 
-    The original files will not be deleted.
+MANIFEST_NAME = "languages.json"
+LINK_MODES = ("hardlink", "symlink", "copy")
+
+def detectLanguage(text : str) -> str:
+    """Detect the language of a text with langdetect, None if it could not be detected.
+    langdetect is only imported on the first call, so that importing this module (e.g. from `getDebatesData.py`) does not load it.
+    """
+    from langdetect import DetectorFactory, detect, LangDetectException
+    # Make langdetect deterministic, so that a file is always classified the same way
+    DetectorFactory.seed = 0
+    try:
+        return detect(text)
+    except LangDetectException:
+        return None
+
+def detectFileLanguage(task):
+    """Detect the language of a debate file from the first characters of its text.
+    Runs inside the worker processes.
+
+    Args:
+        task (tuple): Path of the file and number of characters sampled
+
+    Returns:
+        tuple(str, str | None): Path of the file and detected language, None if it could not be detected
+    """
+    file_path, sampleSize = task
+    with open(file_path, 'r', encoding='utf-8') as f:
+        # The first line ("Discussion Title: ...") is always in English
+        f.readline()
+        content = f.read(sampleSize)
+    return file_path, detectLanguage(content)
+
+def placeFile(file_path : os.path, new_file_path : os.path, linkMode : str = "hardlink"):
+    """Place a file into a language folder, replacing any previous version.
+
+    Args:
+        file_path (os.path): Path of the original file
+        new_file_path (os.path): Path of the file in the language folder
+        linkMode (str, optional): "hardlink", "symlink" or "copy". Hard links fall back to a copy when not supported (e.g. across file systems). Defaults to "hardlink".
+    """
+    if os.path.lexists(new_file_path):
+        os.remove(new_file_path)
+    if linkMode == "hardlink":
+        try:
+            os.link(file_path, new_file_path)
+            return
+        except OSError:
+            pass
+    elif linkMode == "symlink":
+        os.symlink(os.path.relpath(file_path, os.path.dirname(new_file_path)), new_file_path)
+        return
+    shutil.copy(file_path, new_file_path)
+
+def classifyFilesByLanguage(baseFolderPath : os.path, workers : int = None, sampleSize : int = 2000, linkMode : str = "hardlink") -> dict:
+    """Classify debate files by their language. Will sort them into folders named after the detected language.
+    The folders will be created in the same directory as the original files.
+    The files are linked (or copied) into the new folders, the original files will not be deleted.
+
+    The language is detected on the first `sampleSize` characters of each file, by a pool of processes.
+    Results are recorded in a manifest (`languages.json`) keyed by the hash of each file, so files already classified are skipped on the next run, unless their content changed.
 
     Args:
         baseFolderPath (os.path): The path to the folder containing the debate files.
+        workers (int, optional): Number of processes detecting languages. Defaults to None (one per CPU).
+        sampleSize (int, optional): Number of characters of each file used to detect its language. Defaults to 2000.
+        linkMode (str, optional): How files are placed into the language folders: "hardlink", "symlink" or "copy". Defaults to "hardlink".
+
+    Returns:
+        dict: Number of files "classified", "skipped" (already classified) and "failed"
     """
+    if linkMode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode {linkMode}, expected one of {LINK_MODES}")
+
+    manifestPath = os.path.join(baseFolderPath, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifestPath):
+        with open(manifestPath, 'r') as f:
+            manifest = json.load(f)
+
+    hashes = {}
+    tasks = []
+    skipped = 0
     for filename in os.listdir(baseFolderPath):
         if filename.endswith(".txt"):
             file_path = os.path.join(baseFolderPath, filename)
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            try:
-                lang = detect(content)
-                # print(f"File '{filename}' has been detected to be in language '{lang}'.")
-
-                # Create folder for the language if not existing already
-                lang_folder = os.path.join(baseFolderPath, lang)
-                if not os.path.exists(lang_folder):
-                    os.makedirs(lang_folder)
-                
-                # Copy file to the appropriate folder
-                new_file_path = os.path.join(lang_folder, filename)
-                shutil.copy(file_path, new_file_path)
-            
-            except LangDetectException:
-                print(f"Failed to detect language of '{filename}'.")
\ No newline at end of file
+            hashes[filename] = hashFile(file_path)
+            entry = manifest.get(filename)
+            if entry is not None and entry["hash"] == hashes[filename] and os.path.lexists(os.path.join(baseFolderPath, entry["lang"], filename)):
+                skipped += 1
+            else:
+                tasks.append((file_path, sampleSize))
+
+    classified, failed = 0, 0
+    with Pool(workers) as pool:
+        for file_path, lang in pool.imap_unordered(detectFileLanguage, tasks, chunksize=16):
+            filename = os.path.basename(file_path)
+            previous = manifest.pop(filename, None)
+            # Remove the file from the folder of its previously detected language
+            if previous is not None and previous["lang"] != lang and os.path.lexists(os.path.join(baseFolderPath, previous["lang"], filename)):
+                os.remove(os.path.join(baseFolderPath, previous["lang"], filename))
+            if lang is None:
+                print(f"Failed to detect language of '{filename}'.")
+                failed += 1
+                continue
+
+            # Create folder for the language if not existing already
+            lang_folder = os.path.join(baseFolderPath, lang)
+            os.makedirs(lang_folder, exist_ok=True)
+
+            placeFile(file_path, os.path.join(lang_folder, filename), linkMode)
+            manifest[filename] = {"hash": hashes[filename], "lang": lang}
+            classified += 1
+
+    with open(manifestPath + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifestPath + ".tmp", manifestPath)
+
+    return {"classified": classified, "skipped": skipped, "failed": failed}
@@ -0,0 +1,95 @@
+import os, json, uuid
+from datetime import datetime, timezone
+
+CHECKPOINT_VERSION = 1
+
+class StageCheckpoints:
+    """Checkpoints of the stages of the pipeline, one JSON file per stage (`<stage>.json`) inside a folder, next to the artifacts the stages write.
+
+    A checkpoint is only written once its stage completed. It records the version of the checkpoint format, a unique id, the options the stage depends on and its artifacts.
+    A stage reading the artifacts of another one stores the id of that checkpoint, so that artifacts written by another run of the previous stage are detected (see `require`).
+    """
+
+    def __init__(self, folderPath : os.path):
+        """Open (or create) the checkpoints folder.
+
+        Args:
+            folderPath (os.path): Folder of the checkpoints
+        """
+        self.path = folderPath
+        os.makedirs(folderPath, exist_ok=True)
+
+    def checkpointPath(self, stage : str) -> os.path:
+        return os.path.join(self.path, stage + ".json")
+
+    def artifactPath(self, name : str) -> os.path:
+        """Path of an artifact stored inside the checkpoints folder."""
+        return os.path.join(self.path, name)
+
+    def load(self, stage : str) -> dict:
+        """Read the checkpoint of `stage`.
+
+        Returns:
+            dict: The checkpoint, None if the stage has no checkpoint or if it was written by another version of the checkpoint format
+        """
+        path = self.checkpointPath(stage)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            return None
+        return checkpoint
+
+    def save(self, stage : str, **fields) -> dict:
+        """Write the checkpoint of a completed stage, replacing the previous one.
+
+        Args:
+            stage (str): Name of the stage
+            **fields: Options and artifacts of the stage, JSON serializable
+
+        Returns:
+            dict: The checkpoint written, with its version, id and date
+        """
+        checkpoint = {
+            "version" : CHECKPOINT_VERSION,
+            "stage"   : stage,
+            "id"      : uuid.uuid4().hex,
+            "date"    : datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **fields,
+        }
+        path = self.checkpointPath(stage)
+        with open(path + ".tmp", "w") as f:
+            json.dump(checkpoint, f, indent=1)
+        os.replace(path + ".tmp", path)
+        return checkpoint
+
+    def invalidate(self, stage : str):
+        """Remove the checkpoint of `stage`, e.g. before running it again, so that an interrupted run never leaves an outdated checkpoint behind."""
+        if os.path.exists(self.checkpointPath(stage)):
+            os.remove(self.checkpointPath(stage))
+
+    def require(self, stage : str, previous : dict = None, **options) -> dict:
+        """Read the checkpoint of `stage`, which another stage is about to resume from.
+
+        Args:
+            stage (str): Name of the stage
+            previous (dict, optional): Checkpoint of the stage `stage` read from, which must be the one recorded in its checkpoint (as `<previous stage>Id`). Defaults to None.
+            **options: Options the checkpoint must have been written with
+
+        Raises:
+            FileNotFoundError: Raised if `stage` has no checkpoint, or one written by another version of the checkpoint format
+            ValueError: Raised if the checkpoint was written with other options or from another run of the previous stage
+
+        Returns:
+            dict: The checkpoint
+        """
+        checkpoint = self.load(stage)
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint of the {stage} stage (version {CHECKPOINT_VERSION}) at {self.checkpointPath(stage)}. Run the {stage} stage first.")
+        for name, value in options.items():
+            if checkpoint.get(name) != value:
+                raise ValueError(f"The checkpoint of the {stage} stage was written with {name}={checkpoint.get(name)!r}, not {value!r}. Run the {stage} stage again.")
+        if previous is not None and checkpoint.get(previous["stage"] + "Id") != previous["id"]:
+            raise ValueError(f"The checkpoint of the {stage} stage was not written from the current checkpoint of the {previous['stage']} stage. Run the {stage} stage again.")
+        return checkpoint
@@ -0,0 +1,120 @@
+import os, random, argparse
+import pandas as pd
+
+WORDS = "argument policy people state law freedom health growth market risk cost school energy tax society right evidence study government public".split()
+
+def generateSyntheticDebate(nbArguments : int, seed : int = 0, title : str = "Synthetic debate", maxDepth : int = None, branching : int = None,
+                            textLength : tuple[int, int] = (5, 40), artifactRatio : float = 0.0, seeRatio : float = 0.0) -> list[str]:
+    """Generate the lines of a random debate in the Kialo text export format parsed by `rawKialo2Json`.
+    Each argument is attached to a random node of the debate that can still take children, so with the default options the tree is a random recursive tree.
+
+    Args:
+        nbArguments (int): Number of arguments (excluding the thesis)
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        title (str, optional): Title of the debate. Defaults to "Synthetic debate".
+        maxDepth (int, optional): Maximum level of the arguments, the children of the thesis being of level 1. Defaults to None (unbounded).
+        branching (int, optional): Maximum number of children of a node. Defaults to None (unbounded).
+        textLength (tuple[int, int], optional): Minimum and maximum number of words of an argument. Defaults to (5, 40).
+        artifactRatio (float, optional): Fraction of the arguments ending with a source annotation (e.g. "[12]"), half of which also get a page annotation (e.g. "(p. 3)"). Defaults to 0.0.
+        seeRatio (float, optional): Fraction of the arguments only referring to a previous argument ("-> See 1.2."). Defaults to 0.0.
+
+    Raises:
+        ValueError: Raised if `maxDepth` and `branching` do not allow `nbArguments` arguments
+
+    Returns:
+        list[str]: Lines of the debate file
+    """
+    rng = random.Random(seed)
+    # The parser skips the first four non-empty lines, the second one being the subject of the debate
+    lines = [f"Discussion Title: {title}", "", title, "", f"1. {title}?", f"Background of the {title.lower()}.", ""]
+
+    nodes = ["1."]
+    # Nodes that can still take children, the same list as `nodes` when the tree is unbounded
+    openNodes = nodes if maxDepth is None and branching is None else ["1."]
+    nbChildren = {"1.": 0}
+    for _ in range(nbArguments):
+        if not openNodes:
+            raise ValueError(f"A debate of depth {maxDepth} and branching {branching} cannot hold {nbArguments} arguments")
+        if openNodes is nodes:
+            parent = rng.choice(nodes)
+        else:
+            pos = rng.randrange(len(openNodes))
+            parent = openNodes[pos]
+        nbChildren[parent] += 1
+        node = f"{parent}{nbChildren[parent]}."
+        nbChildren[node] = 0
+        nodes.append(node)
+        if openNodes is not nodes:
+            if branching is not None and nbChildren[parent] >= branching:
+                openNodes[pos] = openNodes[-1]
+                openNodes.pop()
+            if maxDepth is None or node.count(".") - 1 < maxDepth:
+                openNodes.append(node)
+
+        stance = rng.choice(["Pro", "Con"])
+        if seeRatio and len(nodes) > 2 and rng.random() < seeRatio:
+            text = f"-> See {rng.choice(nodes[1:-1])}"
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(*textLength)))
+            if artifactRatio and rng.random() < artifactRatio:
+                text += f" [{rng.randint(1, 200)}]"
+                if rng.random() < 0.5:
+                    text += f" (p. {rng.randint(1, 300)})"
+        lines.append(f"{node} {stance}: {text}")
+
+    lines += ["", "Sources:"]
+    return lines
+
+def writeSyntheticDebate(path : str, nbArguments : int, seed : int = 0, title : str = "Synthetic debate", **options):
+    """Write a random debate in the Kialo text export format to `path`.
+
+    Args:
+        path (str): Path of the debate file to write
+        nbArguments (int): Number of arguments (excluding the thesis)
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        title (str, optional): Title of the debate. Defaults to "Synthetic debate".
+        **options: Shape of the debate, see `generateSyntheticDebate`
+    """
+    with open(path, "w") as f:
+        f.write("\n".join(generateSyntheticDebate(nbArguments, seed, title, **options)) + "\n")
+
+def writeSyntheticDataset(folderPath : str, nbDebates : int, nbArguments : int, seed : int = 0, nbTags : int = 5, **options) -> pd.DataFrame:
+    """Write a set of random debates laid out like the downloaded data, so that `processData.py` can run on it: `kialo-url-ids.csv` and the debates inside `debates/en/`.
+
+    Args:
+        folderPath (str): Folder to write the data to, the equivalent of `rawData/`
+        nbDebates (int): Number of debates
+        nbArguments (int): Number of arguments of each debate
+        seed (int, optional): Seed of the random generator, debate `i` uses `seed + i`. Defaults to 0.
+        nbTags (int, optional): Number of distinct tags, each debate gets one of them. Defaults to 5.
+        **options: Shape of the debates, see `generateSyntheticDebate`
+
+    Returns:
+        pd.DataFrame: The debates, with their kialoUrlId and tags, as written to `kialo-url-ids.csv`
+    """
+    debatesPath = os.path.join(folderPath, "debates", "en")
+    os.makedirs(debatesPath, exist_ok=True)
+    kialoUrlIds = []
+    for i in range(nbDebates):
+        kialoUrlId = f"synthetic-debate-{seed + i}"
+        writeSyntheticDebate(os.path.join(debatesPath, kialoUrlId + ".txt"), nbArguments, seed=seed + i, title=f"Synthetic debate {seed + i}", **options)
+        kialoUrlIds.append({"kialoUrlId": kialoUrlId, "tags": str([f"Tag{i % nbTags}"])})
+    kialoUrlIds = pd.DataFrame(kialoUrlIds)
+    kialoUrlIds.to_csv(os.path.join(folderPath, "kialo-url-ids.csv"))
+    return kialoUrlIds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write random debates in the Kialo text export format, laid out like the downloaded data.")
+    parser.add_argument("folder", help="folder to write the data to, e.g. rawData")
+    parser.add_argument("--debates", type=int, default=40, help="number of debates")
+    parser.add_argument("--arguments", type=int, default=500, help="number of arguments of each debate")
+    parser.add_argument("--depth", type=int, default=None, help="maximum level of the arguments")
+    parser.add_argument("--branching", type=int, default=None, help="maximum number of children of a node")
+    parser.add_argument("--text-length", type=int, nargs=2, default=[5, 40], metavar=("MIN", "MAX"), help="minimum and maximum number of words of an argument")
+    parser.add_argument("--artifacts", type=float, default=0.1, help="fraction of the arguments with source and page annotations")
+    parser.add_argument("--see", type=float, default=0.02, help="fraction of \"See\" arguments")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    writeSyntheticDataset(args.folder, args.debates, args.arguments, seed=args.seed, maxDepth=args.depth, branching=args.branching,
+                          textLength=tuple(args.text_length), artifactRatio=args.artifacts, seeRatio=args.see)
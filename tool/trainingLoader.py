@@ -0,0 +1,260 @@
+import os, json, argparse
+from collections import namedtuple
+import numpy as np
+from tool.columnarDataset import FORMATS, RELATIONS, readColumnarDataset
+
+LOADER_VERSION = 1
+SPLITS = ["train", "val", "test"]
+# Columns of the pairs, one `.npy` file each, in the order of the splits
+PAIR_ARRAYS = {"srcId": np.int32, "trgId": np.int32, "relation": np.int8, "sameTree": np.bool_, "similarity": np.float32, "pairIndex": np.int64}
+
+# Batch of pairs, each field being a view of the memory-mapped column (`relation` holds indices into `RELATIONS`)
+PairBatch = namedtuple("PairBatch", list(PAIR_ARRAYS))
+
+def assignDebateSplits(nbPairsPerDebate : np.ndarray, fractions : tuple[float, float, float], rng : np.random.Generator) -> np.ndarray:
+    """Assign each debate to a split, so that the splits get about `fractions` of the pairs.
+    Debates are shuffled, then laid out one after the other: a debate goes to the split its middle pair falls into.
+
+    Args:
+        nbPairsPerDebate (np.ndarray): Number of pairs of each debate
+        fractions (tuple[float, float, float]): Share of the pairs of the train, validation and test splits
+        rng (np.random.Generator): Random number generator
+
+    Returns:
+        np.ndarray: Split (index in `SPLITS`) of each debate
+    """
+    order = rng.permutation(len(nbPairsPerDebate))
+    counts = nbPairsPerDebate[order].astype(np.float64)
+    middles = (np.cumsum(counts) - counts / 2) / max(counts.sum(), 1)
+    bounds = np.cumsum(fractions) / sum(fractions)
+    splits = np.empty(len(order), dtype=np.int8)
+    splits[order] = np.minimum(np.searchsorted(bounds, middles, side="right"), len(SPLITS) - 1)
+    return splits
+
+def interleaveRelations(indices : np.ndarray, relation : np.ndarray, rng : np.random.Generator) -> tuple[np.ndarray, int]:
+    """Order the pairs of a split so that any slice of `len(RELATIONS) * k` rows of its start is balanced: the pairs of each relation are shuffled, then taken in turn (support, attack, neutral, support, ...) while every relation has some left.
+    The remaining pairs of the most frequent relations follow, shuffled.
+
+    Args:
+        indices (np.ndarray): Pairs of the split
+        relation (np.ndarray): Relation (index in `RELATIONS`) of every pair
+        rng (np.random.Generator): Random number generator
+
+    Returns:
+        tuple(np.ndarray, int): Pairs of the split in their new order, and the number of pairs of the balanced start
+    """
+    byRelation = [rng.permutation(indices[relation[indices] == code]) for code in range(len(RELATIONS))]
+    nbPerRelation = min(len(pairs) for pairs in byRelation)
+    balanced = np.stack([pairs[:nbPerRelation] for pairs in byRelation], axis=1).ravel()
+    rest = rng.permutation(np.concatenate([pairs[nbPerRelation:] for pairs in byRelation]))
+    return np.concatenate([balanced, rest]), len(balanced)
+
+def exportTrainingData(folderPath : os.path, outputPath : os.path, format : str = "parquet", name : str = "kialoPairs", fractions : tuple[float, float, float] = (0.8, 0.1, 0.1),
+                       seed : int = 0, embeddingCache=None) -> dict:
+    """Export a columnar dataset (see `tool/columnarDataset.py`) to flat `.npy` arrays, so that `TrainingData` can memory-map it.
+
+    Each debate goes to a single split (train, validation or test). Pairs between two debates of different splits, which would leak a debate across splits, are left out.
+    Within each split, the pairs are shuffled once and laid out by relation in turn (see `interleaveRelations`), so that the balanced batches of `TrainingData.iterBatches` are contiguous slices of the arrays.
+    The texts of the arguments are stored as a single UTF-8 buffer with the offset of each argument, and their embeddings are copied from the embedding cache if given, one row per argument id.
+
+    Args:
+        folderPath (os.path): Folder of the columnar dataset
+        outputPath (os.path): Folder the arrays are written to
+        format (str, optional): Format of the columnar dataset, "parquet" or "arrow". Defaults to "parquet".
+        name (str, optional): Pairs table exported, "kialoPairs" or "kialoPairsRaw". Defaults to "kialoPairs".
+        fractions (tuple[float, float, float], optional): Share of the pairs of the train, validation and test splits. Defaults to (0.8, 0.1, 0.1).
+        seed (int, optional): Seed of the assignment of the debates to the splits and of the shuffling of the pairs. Defaults to 0.
+        embeddingCache (EmbeddingCache, optional): Cache the embeddings of the arguments are read from, arguments missing from it get NaN embeddings. Defaults to None (no embeddings).
+
+    Returns:
+        dict: Metadata of the export, also written to `meta.json`
+    """
+    arguments, pairs = readColumnarDataset(folderPath, name, format)
+    os.makedirs(outputPath, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    argumentDebate = arguments["debate"].cat.codes.to_numpy().astype(np.int32)
+    srcId = pairs["srcId"].to_numpy(dtype=np.int32)
+    trgId = pairs["trgId"].to_numpy(dtype=np.int32)
+    relation = pairs["relation"].cat.set_categories(RELATIONS).cat.codes.to_numpy().astype(np.int8)
+    srcDebate, trgDebate = argumentDebate[srcId], argumentDebate[trgId]
+
+    debateSplit = assignDebateSplits(np.bincount(srcDebate, minlength=len(arguments["debate"].cat.categories)), fractions, rng)
+    pairSplit = np.where(debateSplit[srcDebate] == debateSplit[trgDebate], debateSplit[srcDebate], -1)
+
+    order, splits, start = [], {}, 0
+    for code, split in enumerate(SPLITS):
+        splitOrder, nbBalanced = interleaveRelations(np.flatnonzero(pairSplit == code), relation, rng)
+        order.append(splitOrder)
+        splits[split] = {
+            "start"       : start,
+            "balancedEnd" : start + nbBalanced,
+            "end"         : start + len(splitOrder),
+            "debates"     : int((debateSplit == code).sum()),
+            "relations"   : {rel: int((relation[splitOrder] == i).sum()) for i, rel in enumerate(RELATIONS)},
+        }
+        start += len(splitOrder)
+    order = np.concatenate(order)
+
+    columns = {
+        "srcId"      : srcId,
+        "trgId"      : trgId,
+        "relation"   : relation,
+        "sameTree"   : pairs["sameTree"].to_numpy(dtype=bool),
+        "similarity" : pairs["similarity"].to_numpy(dtype=np.float32),
+        "pairIndex"  : np.arange(len(pairs), dtype=np.int64),
+    }
+    for column, dtype in PAIR_ARRAYS.items():
+        np.save(os.path.join(outputPath, column + ".npy"), columns[column][order].astype(dtype, copy=False))
+
+    texts = [text.encode("utf-8") for text in arguments["text"]]
+    np.save(os.path.join(outputPath, "argumentDebate.npy"), argumentDebate)
+    np.save(os.path.join(outputPath, "textOffsets.npy"), np.concatenate([[0], np.cumsum([len(text) for text in texts], dtype=np.int64)]).astype(np.int64))
+    np.save(os.path.join(outputPath, "texts.npy"), np.frombuffer(b"".join(texts), dtype=np.uint8))
+
+    embeddings = None
+    if embeddingCache is not None:
+        rows = embeddingCache.lookup(list(arguments["text"]))
+        dim = embeddingCache.dim or 0
+        matrix = np.lib.format.open_memmap(os.path.join(outputPath, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(len(arguments), dim))
+        found = np.flatnonzero(rows >= 0)
+        # Read the cache in the order of its rows
+        found = found[np.argsort(rows[found], kind="stable")]
+        matrix[found] = embeddingCache.embeddings[rows[found]]
+        matrix[rows < 0] = np.nan
+        matrix.flush()
+        del matrix
+        embeddings = {"model": embeddingCache.modelName, "dimension": dim, "missing": int((rows < 0).sum())}
+
+    meta = {
+        "version"         : LOADER_VERSION,
+        "source"          : {"folder": os.path.abspath(folderPath), "name": name, "format": format},
+        "seed"            : seed,
+        "fractions"       : list(fractions),
+        "relations"       : RELATIONS,
+        "debates"         : [str(debate) for debate in arguments["debate"].cat.categories],
+        "debateSplits"    : [SPLITS[code] for code in debateSplit],
+        "arguments"       : len(arguments),
+        "pairs"           : len(order),
+        "crossSplitPairs" : int((pairSplit < 0).sum()),
+        "splits"          : splits,
+        "embeddings"      : embeddings,
+    }
+    with open(os.path.join(outputPath, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+class TrainingData:
+    """Dataset exported by `exportTrainingData`, memory-mapped: opening it reads no pair, and the pages of the arrays are loaded (and shared between processes) by the OS as they are used.
+
+    The pairs of each split are contiguous, and batches are slices of the memory-mapped columns, i.e. views that are neither parsed nor copied.
+    Shuffling happens by index: the pairs were shuffled once at export, and each epoch visits the batches in a new random order, starting at a random offset so that batches hold other pairs from one epoch to the next.
+
+    Example:
+        data = TrainingData("processedData/training")
+        for epoch in range(10):
+            for batch in data.iterBatches("train", 96, epoch=epoch):
+                src = data.embeddings[batch.srcId]
+    """
+
+    def __init__(self, folderPath : os.path):
+        """Open an exported dataset.
+
+        Args:
+            folderPath (os.path): Folder written by `exportTrainingData`
+
+        Raises:
+            ValueError: Raised if the dataset was exported by another version of the loader
+        """
+        with open(os.path.join(folderPath, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != LOADER_VERSION:
+            raise ValueError(f"Training data at {folderPath} has version {self.meta['version']}, expected {LOADER_VERSION}. Export it again.")
+        self.path = folderPath
+        self.columns = {column: np.load(os.path.join(folderPath, column + ".npy"), mmap_mode="r") for column in PAIR_ARRAYS}
+        self.argumentDebate = np.load(os.path.join(folderPath, "argumentDebate.npy"), mmap_mode="r")
+        self._textOffsets = np.load(os.path.join(folderPath, "textOffsets.npy"), mmap_mode="r")
+        self._texts = np.load(os.path.join(folderPath, "texts.npy"), mmap_mode="r")
+        embeddingsPath = os.path.join(folderPath, "embeddings.npy")
+        # Embedding of each argument, indexed by argument id, None if the export had no embeddings
+        self.embeddings = np.load(embeddingsPath, mmap_mode="r") if self.meta["embeddings"] is not None else None
+
+    def __len__(self):
+        return self.meta["pairs"]
+
+    def splitSize(self, split : str) -> int:
+        bounds = self.meta["splits"][split]
+        return bounds["end"] - bounds["start"]
+
+    def pairs(self, split : str) -> PairBatch:
+        """All the pairs of a split, as views of the columns."""
+        bounds = self.meta["splits"][split]
+        return PairBatch(*(self.columns[column][bounds["start"]:bounds["end"]] for column in PAIR_ARRAYS))
+
+    def text(self, argumentId : int) -> str:
+        """Text of an argument."""
+        return bytes(self._texts[self._textOffsets[argumentId]:self._textOffsets[argumentId + 1]]).decode("utf-8")
+
+    def texts(self, argumentIds) -> list[str]:
+        """Texts of several arguments, e.g. `data.texts(batch.srcId)`."""
+        return [self.text(argumentId) for argumentId in argumentIds]
+
+    def debate(self, argumentId : int) -> str:
+        """kialoUrlId of the debate of an argument."""
+        return self.meta["debates"][self.argumentDebate[argumentId]]
+
+    def iterBatches(self, split : str, batchSize : int, balanced : bool = True, shuffle : bool = True, seed : int = 0, epoch : int = 0):
+        """Iterate over the batches of a split, without copying any pair. Incomplete batches are dropped.
+
+        Args:
+            split (str): "train", "val" or "test"
+            batchSize (int): Number of pairs per batch
+            balanced (bool, optional): Whether each batch holds as many pairs of each relation, in which case `batchSize` must be a multiple of the number of relations. The pairs of the most frequent relations beyond the balanced part of the split are then never visited. Defaults to True.
+            shuffle (bool, optional): Whether to visit the batches in random order, from a random offset. Defaults to True.
+            seed (int, optional): Seed of the shuffling, combined with `epoch`. Defaults to 0.
+            epoch (int, optional): Epoch number, each epoch gets its own order. Defaults to 0.
+
+        Raises:
+            ValueError: Raised if `balanced` and `batchSize` is not a multiple of the number of relations
+
+        Yields:
+            PairBatch: Batch of pairs, each field a view of a memory-mapped column
+        """
+        bounds = self.meta["splits"][split]
+        start, end = bounds["start"], bounds["balancedEnd"] if balanced else bounds["end"]
+        step = len(RELATIONS) if balanced else 1
+        if balanced and batchSize % step:
+            raise ValueError(f"Balanced batches need a batch size multiple of {step}, got {batchSize}")
+
+        blocks = np.arange(start, end - batchSize + 1, batchSize)
+        if shuffle:
+            rng = np.random.default_rng([seed, epoch])
+            # A random offset (keeping the relations in turn) moves the boundaries of the batches from one epoch to the next
+            offset = int(rng.integers(batchSize // step)) * step
+            blocks = rng.permutation(np.arange(start + offset, end - batchSize + 1, batchSize))
+        for blockStart in blocks:
+            yield PairBatch(*(self.columns[column][blockStart:blockStart + batchSize] for column in PAIR_ARRAYS))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a columnar dataset written by processData.py (--format parquet or arrow) to memory-mappable arrays with debate-grouped splits.")
+    parser.add_argument("folder", help="folder of the columnar dataset, e.g. processedData")
+    parser.add_argument("--output", default=None, help="folder the arrays are written to, defaults to a `training` folder inside the dataset folder")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--name", default="kialoPairs", help="pairs table exported, kialoPairs or kialoPairsRaw")
+    parser.add_argument("--fractions", type=float, nargs=3, default=[0.8, 0.1, 0.1], metavar=("TRAIN", "VAL", "TEST"), help="share of the pairs of each split")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding-cache", default=None, help="folder of the embedding caches (e.g. processedData/embeddingCache) to export the embeddings of the arguments from")
+    parser.add_argument("--encoder", default="sentence-transformers/all-MiniLM-L6-v2", help="name of the encoder whose embeddings are exported, as named by `encoderName`")
+    args = parser.parse_args()
+
+    cache = None
+    if args.embedding_cache:
+        from tool.embeddingCache import EmbeddingCache
+        cache = EmbeddingCache(args.embedding_cache, args.encoder)
+    meta = exportTrainingData(args.folder, args.output or os.path.join(args.folder, "training"), args.format, args.name, tuple(args.fractions), args.seed, cache)
+    for split in SPLITS:
+        bounds = meta["splits"][split]
+        print(f"{split:>5}: {bounds['end'] - bounds['start']:>8} pairs ({bounds['balancedEnd'] - bounds['start']} balanced) from {bounds['debates']} debates, {bounds['relations']}")
+    print(f"{meta['crossSplitPairs']} pairs between debates of different splits left out")
+    if meta["embeddings"] is not None:
+        print(f"Embeddings of dimension {meta['embeddings']['dimension']}, {meta['embeddings']['missing']} arguments missing from the cache")